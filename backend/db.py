@@ -3,14 +3,19 @@ MongoDB Database Module for Face Recognition Attendance System
 Handles all database operations
 """
 
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, UpdateOne
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+from bson import encode as bson_encode
+from bson.binary import Binary
 import os
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
 
+from embedding_codec import EMBEDDING_FORMAT, EMBEDDING_ENCODINGS, to_array, to_base64, to_bytes, to_list
+from face_templates import decode_templates
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -73,7 +78,8 @@ class MongoDatabase:
     def initialize_collections(self):
         """Initialize collections and create indexes"""
         collections = {
-            "students": [("roll_number", 1)],
+            "students": [("roll_number", 1), ("version", 1)],
+            "student_tombstones": [("version", 1)],
             "batches": [("batch_id", 1)],
             "teachers": [("teacher_id", 1)],
             "subjects": [("subject_id", 1)],
@@ -117,6 +123,94 @@ def get_db() -> MongoDatabase:
 # STUDENTS OPERATIONS
 # ============================================================================
 
+# Default projection for list views (admin student table): no embedding or image metadata
+STUDENT_LIST_FIELDS = (
+    "student_id", "roll_number", "name", "batch_id", "email", "image_url", "image_urls", "updated_at"
+)
+
+def _embedding_fields(embedding) -> Dict:
+    """Stored form of an embedding: BSON binary float32 plus its format tag"""
+    raw = to_bytes(embedding)
+    return {
+        "embedding": Binary(raw) if raw else None,
+        "embedding_format": EMBEDDING_FORMAT if raw else None
+    }
+
+def _template_fields(templates: Optional[Dict]) -> Dict:
+    """Stored form of per-view templates ({label: embedding}): one binary float32 matrix plus its labels"""
+    if not templates:
+        return {"templates": None, "template_labels": None}
+    labels = list(templates)
+    return {
+        "templates": Binary(to_bytes([templates[label] for label in labels])),
+        "template_labels": labels
+    }
+
+def _student_projection(embeddings: str) -> Dict:
+    if embeddings not in EMBEDDING_ENCODINGS + ("array",):
+        raise ValueError(f"embeddings must be one of {EMBEDDING_ENCODINGS}, got '{embeddings}'")
+    if embeddings == "none":
+        return {"_id": 0, "embedding": 0, "embedding_format": 0, "templates": 0}
+    return {"_id": 0}
+
+def _read_student(doc: Optional[Dict], embeddings: str = "list") -> Optional[Dict]:
+    """
+    Decode a stored student for callers
+    
+    Args:
+        embeddings: "list" (floats, as before binary storage), "base64"
+                    (float32 bytes, tagged "base64:float32le-v1"), "array"
+                    (numpy float32, for in-process use) or "none"
+    
+    Per-view `templates` get the same encoding: a list of vectors, the
+    base64 of the concatenated rows, or a (templates x dim) array.
+    """
+    if doc is None:
+        return None
+    fmt = doc.pop("embedding_format", None)
+    if embeddings == "none":
+        doc.pop("embedding", None)
+        doc.pop("templates", None)
+        return doc
+    value = doc.get("embedding")
+    templates = doc.get("templates")
+    if value is None and templates is None:
+        return doc
+    if embeddings == "list":
+        if value is not None:
+            doc["embedding"] = value if isinstance(value, list) else to_list(value)
+        if templates is not None:
+            doc["templates"] = decode_templates(templates, doc.get("template_labels"), fmt).astype(float).tolist()
+    elif embeddings == "base64":
+        if value is not None:
+            doc["embedding"] = to_base64(value)
+        if templates is not None:
+            doc["templates"] = to_base64(templates)
+        doc["embedding_format"] = f"base64:{EMBEDDING_FORMAT}"
+    elif embeddings == "array":
+        if value is not None:
+            doc["embedding"] = to_array(value, fmt)
+        if templates is not None:
+            doc["templates"] = decode_templates(templates, doc.get("template_labels"), fmt)
+    return doc
+
+def _next_student_version() -> int:
+    """Next value of the students change counter (atomic, monotonic)"""
+    db = get_db()
+    counter = db.db["counters"].find_one_and_update(
+        {"_id": "students"},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"]
+
+def get_students_version() -> int:
+    """Current value of the students change counter (0 if nothing changed yet)"""
+    db = get_db()
+    counter = db.db["counters"].find_one({"_id": "students"})
+    return counter["seq"] if counter else 0
+
 def add_student(student_data: Dict) -> Dict:
     """Add a new student to database"""
     db = get_db()
@@ -134,50 +228,215 @@ def add_student(student_data: Dict) -> Dict:
         "cloudinary_public_id": student_data.get("cloudinary_public_id"),
         "cloudinary_public_ids": student_data.get("cloudinary_public_ids"),
         "image_metadata": student_data.get("image_metadata"),
-        "embedding": student_data.get("embedding"),
-        "added_date": datetime.now().isoformat()
+        **_embedding_fields(student_data.get("embedding")),
+        **_template_fields(student_data.get("templates")),
+        "added_date": datetime.now().isoformat(),
+        "updated_at": datetime.now().isoformat(),
+        "version": _next_student_version()
     }
     
     result = students.insert_one(student)
     return {"id": str(result.inserted_id), "roll_number": student_data.get("roll_number")}
 
-def get_all_students() -> List[Dict]:
-    """Get all students"""
+def get_all_students(embeddings: str = "list") -> List[Dict]:
+    """Get all students (embeddings: list | base64 | array | none, see _read_student)"""
     db = get_db()
     students = db.db["students"]
-    return list(students.find({}, {"_id": 0}))
+    return [_read_student(doc, embeddings) for doc in students.find({}, _student_projection(embeddings))]
 
-def get_student_by_roll(roll_number: str) -> Optional[Dict]:
+def find_students(batch_id: Optional[str] = None, fields: Optional[List[str]] = None,
+                  after: Optional[str] = None, limit: Optional[int] = None,
+                  embeddings: str = "list") -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of students, ordered by roll number
+    
+    Args:
+        batch_id: Only this batch (None = all batches)
+        fields: Fields to return (None = STUDENT_LIST_FIELDS, ["*"] = whole documents);
+                embedding / templates are only returned if listed (or "*") and `embeddings` != "none"
+        after: Roll number cursor from the previous page
+        limit: Page size (None = everything after `after`)
+    
+    Returns:
+        (students, next_cursor) - next_cursor is None on the last page
+    """
+    db = get_db()
+    students = db.db["students"]
+    
+    fields = list(fields) if fields else list(STUDENT_LIST_FIELDS)
+    if "*" in fields:
+        projection = _student_projection(embeddings)
+    else:
+        _student_projection(embeddings)  # Validates `embeddings`
+        projection = {field: 1 for field in fields if field not in ("embedding", "templates")}
+        projection["_id"] = 0
+        projection["roll_number"] = 1  # Needed for the cursor
+        if "embedding" in fields and embeddings != "none":
+            projection["embedding"] = 1
+            projection["embedding_format"] = 1
+        if "templates" in fields and embeddings != "none":
+            projection["templates"] = 1
+            projection["template_labels"] = 1
+            projection["embedding_format"] = 1
+    
+    query = {}
+    if batch_id is not None:
+        query["batch_id"] = batch_id
+    if after is not None:
+        query["roll_number"] = {"$gt": after}
+    cursor = students.find(query, projection).sort("roll_number", 1)
+    if limit is not None:
+        cursor = cursor.limit(limit + 1)
+    page = [_read_student(doc, embeddings) for doc in cursor]
+    
+    next_cursor = None
+    if limit is not None and len(page) > limit:
+        page = page[:limit]
+        next_cursor = page[-1]["roll_number"]
+    return page, next_cursor
+
+def get_student_by_roll(roll_number: str, embeddings: str = "list") -> Optional[Dict]:
     """Get student by roll number"""
     db = get_db()
     students = db.db["students"]
-    return students.find_one({"roll_number": roll_number}, {"_id": 0})
+    return _read_student(students.find_one({"roll_number": roll_number}, _student_projection(embeddings)), embeddings)
 
-def get_batch_students(batch_id: str) -> List[Dict]:
+def get_batch_students(batch_id: str, embeddings: str = "list") -> List[Dict]:
     """Get all students in a batch"""
     db = get_db()
     students = db.db["students"]
-    return list(students.find({"batch_id": batch_id}, {"_id": 0}))
+    return [_read_student(doc, embeddings) for doc in students.find({"batch_id": batch_id}, _student_projection(embeddings))]
 
 def update_student(roll_number: str, student_data: Dict) -> bool:
     """Update student information"""
     db = get_db()
     students = db.db["students"]
     
+    update = dict(student_data)
+    if "embedding" in update:
+        update.update(_embedding_fields(update["embedding"]))
+    if "templates" in update:
+        update.update(_template_fields(update["templates"]))
+    elif "embedding" in update:
+        update.update(_template_fields(None))  # A single new embedding replaces the per-view gallery
+    update["updated_at"] = datetime.now().isoformat()
+    update["version"] = _next_student_version()
     result = students.update_one(
         {"roll_number": roll_number},
-        {"$set": student_data}
+        {"$set": update}
     )
     return result.modified_count > 0
 
 def delete_student(roll_number: str) -> bool:
-    """Delete a student"""
+    """Delete a student (leaves a tombstone so camera nodes can sync the delete)"""
     db = get_db()
     students = db.db["students"]
     
+    existing = students.find_one({"roll_number": roll_number}, {"batch_id": 1})
     result = students.delete_one({"roll_number": roll_number})
+    if result.deleted_count > 0:
+        db.db["student_tombstones"].update_one(
+            {"roll_number": roll_number},
+            {"$set": {
+                "roll_number": roll_number,
+                "batch_id": existing.get("batch_id") if existing else None,
+                "deleted_at": datetime.now().isoformat(),
+                "version": _next_student_version()
+            }},
+            upsert=True
+        )
     return result.deleted_count > 0
 
+def get_student_changes(since: int, limit: int = 500, embeddings: str = "list") -> Dict:
+    """
+    Students changed after version `since`, oldest first
+    
+    Args:
+        since: Cursor from the previous call (0 = full roster)
+        limit: Max upserts + deletes returned in one page
+        embeddings: Encoding of upserted students' embeddings (see _read_student)
+    
+    Returns:
+        {"cursor": int, "upserts": [student, ...], "deletes": [roll_number, ...],
+         "delete_versions": {roll_number: version}, "has_more": bool, "full": bool}
+    
+    Versions are allocated just before each write, so a write can land after
+    a higher version was already served; callers re-read a few versions below
+    their cursor and skip what they already have (by `version`).
+    """
+    db = get_db()
+    students = db.db["students"]
+    projection = _student_projection(embeddings)
+    
+    if since <= 0:
+        # Full roster, including documents written before versioning existed
+        current = get_students_version()
+        return {
+            "cursor": current,
+            "upserts": [_read_student(doc, embeddings) for doc in students.find({}, projection)],
+            "deletes": [],
+            "delete_versions": {},
+            "has_more": False,
+            "full": True
+        }
+    
+    # One extra from each side: has_more must see past the page even if all of it is one kind
+    changed = list(
+        students.find({"version": {"$gt": since}}, projection).sort("version", 1).limit(limit + 1)
+    )
+    removed = list(
+        db.db["student_tombstones"].find({"version": {"$gt": since}}, {"_id": 0}).sort("version", 1).limit(limit + 1)
+    )
+    
+    # Merge by version so the page boundary is a single cursor value
+    events = sorted(
+        [(s["version"], "upsert", s) for s in changed] + [(t["version"], "delete", t) for t in removed],
+        key=lambda event: event[0]
+    )
+    page = events[:limit]
+    return {
+        "cursor": page[-1][0] if page else since,
+        "upserts": [_read_student(doc, embeddings) for _, kind, doc in page if kind == "upsert"],
+        "deletes": [doc["roll_number"] for _, kind, doc in page if kind == "delete"],
+        "delete_versions": {doc["roll_number"]: version for version, kind, doc in page if kind == "delete"},
+        "has_more": len(events) > limit,
+        "full": False
+    }
+
+def migrate_embeddings_to_binary(batch_size: int = 500, dry_run: bool = False) -> Dict:
+    """
+    Rewrite list-of-double embeddings as tagged BSON binary float32
+    
+    Documents keep their `version`: the values are unchanged (to float32
+    precision), so camera nodes have nothing to re-sync.
+    
+    Returns:
+        {"converted": n, "already_binary": n, "bytes_before": n, "bytes_after": n}
+    """
+    db = get_db()
+    students = db.db["students"]
+    stats = {
+        "converted": 0,
+        "already_binary": students.count_documents({"embedding_format": EMBEDDING_FORMAT}),
+        "bytes_before": 0,
+        "bytes_after": 0
+    }
+    
+    pending = []
+    for doc in students.find({"embedding": {"$type": "array"}}, {"_id": 1, "embedding": 1}):
+        fields = _embedding_fields(doc["embedding"])
+        stats["converted"] += 1
+        stats["bytes_before"] += len(bson_encode({"embedding": doc["embedding"]}))
+        stats["bytes_after"] += len(bson_encode(fields))
+        pending.append(UpdateOne({"_id": doc["_id"], "embedding": {"$type": "array"}}, {"$set": fields}))
+        if len(pending) >= batch_size:
+            if not dry_run:
+                students.bulk_write(pending, ordered=False)
+            pending = []
+    if pending and not dry_run:
+        students.bulk_write(pending, ordered=False)
+    return stats
+
 # ============================================================================
 # BATCHES OPERATIONS
 # ============================================================================
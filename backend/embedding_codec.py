@@ -0,0 +1,60 @@
+"""
+Embedding Codec Module for Face Recognition Attendance System
+Compact float32 encodings of face embeddings (MongoDB binary, base64 for JSON)
+
+Stored format (tag "float32le-v1"): the embedding's values as little-endian
+float32 bytes, 4 bytes per dimension (2 KB for ArcFace's 512). MongoDB keeps
+them as BSON binary next to an `embedding_format` field; JSON responses can
+carry the same bytes base64-encoded. Documents written before the binary
+format have a plain list of doubles and no tag; every decoder accepts both.
+"""
+
+import base64
+from typing import Any, List, Optional
+
+import numpy as np
+
+EMBEDDING_FORMAT = "float32le-v1"
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+# How read endpoints return embeddings
+EMBEDDING_ENCODINGS = ("list", "base64", "none")
+
+
+def to_bytes(embedding) -> Optional[bytes]:
+    """float32 little-endian bytes (None for a missing or empty embedding)"""
+    if embedding is None:
+        return None
+    vector = np.asarray(embedding, dtype=EMBEDDING_DTYPE).ravel()
+    return vector.tobytes() if vector.size else None
+
+
+def to_array(value: Any, fmt: Optional[str] = None) -> Optional[np.ndarray]:
+    """
+    float32 array from any stored or transmitted form
+
+    Accepts the binary format (bytes, tagged or untagged), its base64 text
+    (`fmt` = "base64:float32le-v1" or any str value), a list of numbers or an
+    array. Returns None for missing/empty values.
+    """
+    if value is None:
+        return None
+    if fmt is not None and fmt.split(":")[-1] != EMBEDDING_FORMAT:
+        raise ValueError(f"Unknown embedding format: {fmt}")
+    if isinstance(value, str):
+        value = base64.b64decode(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        vector = np.frombuffer(value, dtype=EMBEDDING_DTYPE)
+    else:
+        vector = np.asarray(value, dtype=np.float32).ravel()
+    return vector if vector.size else None
+
+
+def to_base64(value: Any) -> Optional[str]:
+    raw = value if isinstance(value, (bytes, bytearray)) else to_bytes(to_array(value))
+    return base64.b64encode(raw).decode("ascii") if raw else None
+
+
+def to_list(value: Any) -> Optional[List[float]]:
+    vector = to_array(value)
+    return vector.astype(float).tolist() if vector is not None else None
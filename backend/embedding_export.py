@@ -0,0 +1,143 @@
+"""
+Embedding Export Module for Face Recognition Attendance System
+Binary roster snapshot (float32 .npy + JSON index) that camera nodes memory-map
+
+The export for students version V is two resources:
+    index      JSON: format, version, dim, count (matrix rows), students
+               (documents without embeddings; those with rows come first, in
+               row order), templates (rows per student, aligned with
+               students), labels (template label of each row), batches
+               ({batch_id: [start, end]} row ranges)
+    embeddings .npy: count x dim float32, L2-normalized face templates, each
+               student's rows adjacent and students grouped by batch
+
+Rows are normalized and grouped by batch on the backend so a camera node can
+np.load(mmap_mode="r") the file and use it as-is: matching needs no copy and
+each batch's rows are one contiguous slice.
+"""
+
+import io
+import json
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from face_templates import student_templates
+
+EXPORT_FORMAT_VERSION = 2  # 2: one row per face template (1 was one row per student)
+
+
+class EmbeddingExport:
+    """One built export: the index document and the .npy bytes"""
+
+    __slots__ = ("version", "index", "index_json", "npy")
+
+    def __init__(self, version: int, index: Dict, npy: bytes):
+        self.version = version
+        self.index = index
+        self.index_json = json.dumps(index, default=str)
+        self.npy = npy
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.version}"'
+
+
+def build_export(students: Iterable[Dict], version: int) -> EmbeddingExport:
+    """
+    Build the export from student documents
+
+    Each student contributes one row per face template (see face_templates).
+    Templates that are zero or of a different dimension than the rest are
+    left out; a student with none left is still in the index, without rows.
+    """
+    rows: List[Tuple[Dict, Tuple[str, ...], np.ndarray]] = []
+    without: List[Dict] = []
+    for student in students:
+        roll = student.get("roll_number")
+        if not roll:
+            continue
+        doc = {k: v for k, v in student.items() if k not in ("embedding", "templates", "_id")}
+        labels, templates = student_templates(student)
+        if templates is None:
+            without.append(doc)
+        else:
+            rows.append((doc, labels, templates))
+
+    dims = Counter(templates.shape[1] for _, _, templates in rows)
+    dim = dims.most_common(1)[0][0] if dims else 0
+    usable = []
+    for doc, labels, templates in rows:
+        norms = np.linalg.norm(templates, axis=1) if templates.shape[1] == dim else np.zeros(len(labels))
+        keep = norms > 0
+        if not keep.any():
+            without.append(doc)
+        else:
+            usable.append((doc, [l for l, k in zip(labels, keep) if k], templates[keep] / norms[keep, None]))
+    usable.sort(key=lambda row: (str(row[0].get("batch_id") or ""), str(row[0]["roll_number"])))
+
+    matrix = np.vstack([templates for _, _, templates in usable]).astype(np.float32) if usable \
+        else np.empty((0, dim), np.float32)
+    batches: Dict[str, List[int]] = {}
+    start = 0
+    for doc, labels, _ in usable:
+        end = start + len(labels)
+        batch_id = doc.get("batch_id")
+        if batch_id is not None:
+            if batch_id in batches:
+                batches[batch_id][1] = end
+            else:
+                batches[batch_id] = [start, end]
+        start = end
+
+    buffer = io.BytesIO()
+    np.save(buffer, matrix, allow_pickle=False)
+    index = {
+        "format": EXPORT_FORMAT_VERSION,
+        "version": version,
+        "dim": dim,
+        "dtype": "float32",
+        "count": matrix.shape[0],
+        "students": [doc for doc, _, _ in usable] + without,
+        "templates": [len(labels) for _, labels, _ in usable],
+        "labels": [label for _, labels, _ in usable for label in labels],
+        "batches": batches
+    }
+    return EmbeddingExport(version, index, buffer.getvalue())
+
+
+def check_export(index: Dict, matrix: np.ndarray):
+    """Raise ValueError if a downloaded index and matrix don't belong together"""
+    if index.get("format") != EXPORT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding export format {index.get('format')}")
+    expected = (index["count"], index["dim"])
+    if matrix.dtype != np.float32 or matrix.shape != expected:
+        raise ValueError(f"Embedding matrix is {matrix.dtype} {matrix.shape}, index expects float32 {expected}")
+    if sum(index["templates"]) != index["count"] or len(index["labels"]) != index["count"]:
+        raise ValueError("Embedding index template counts do not add up to its rows")
+
+
+class ExportCache:
+    """Builds the export on demand and keeps the latest few versions in memory"""
+
+    def __init__(self, keep: int = 2):
+        self.keep = keep
+        self._exports: Dict[int, EmbeddingExport] = {}
+        self._lock = threading.Lock()
+
+    def get(self, version: int, load_students) -> EmbeddingExport:
+        """Export for `version`, building it from `load_students()` if missing"""
+        with self._lock:
+            export = self._exports.get(version)
+            if export is None:
+                export = build_export(load_students(), version)
+                self._exports[version] = export
+                for old in sorted(self._exports)[:-self.keep]:
+                    del self._exports[old]
+            return export
+
+    def peek(self, version: int) -> Optional[EmbeddingExport]:
+        with self._lock:
+            return self._exports.get(version)
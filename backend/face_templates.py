@@ -0,0 +1,116 @@
+"""
+Face Templates Module for Face Recognition Attendance System
+Per-view embeddings (front / left / right / far) kept as a student's gallery
+
+A student enrolled with /api/students/upload-images has one ArcFace template
+per view, stored as a (templates x dim) float32 matrix (`templates`) with
+their labels (`template_labels`). `embedding` still holds their normalized
+mean for consumers that expect one vector per student. Students enrolled
+from a single photo (or before templates existed) have one template, the
+`embedding` itself, labelled "mean".
+
+Matching scores a face against every template and keeps each student's best
+(max over templates): a turned or distant face is compared with the view it
+resembles instead of with a blur of all four.
+
+In a vector store every template is its own vector, with id
+"<roll_number>#<label>" (the "mean" template keeps the bare roll number, the
+id used before templates) and the student's roll_number in its metadata.
+"""
+
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from embedding_codec import to_array
+
+TEMPLATE_LABELS = ("front", "left", "right", "far")
+MEAN_LABEL = "mean"  # Single-vector students: the template is `embedding`
+TEMPLATE_SEPARATOR = "#"
+
+
+def template_id(roll_number: str, label: str) -> str:
+    """Vector store id of one template"""
+    return roll_number if label == MEAN_LABEL else f"{roll_number}{TEMPLATE_SEPARATOR}{label}"
+
+
+def template_ids(roll_number: str, labels: Sequence[str] = ()) -> List[str]:
+    """
+    Every id a student's templates may have (to delete them all): the
+    standard labels plus the student's stored `labels` (see student_templates)
+    """
+    all_labels = dict.fromkeys((MEAN_LABEL,) + TEMPLATE_LABELS + tuple(labels or ()))
+    return [template_id(roll_number, label) for label in all_labels]
+
+
+def template_owner(vector_id: str) -> str:
+    """Roll number a vector store id belongs to"""
+    roll_number, separator, _ = vector_id.rpartition(TEMPLATE_SEPARATOR)
+    return roll_number if separator else vector_id
+
+
+def mean_embedding(templates: np.ndarray) -> np.ndarray:
+    """Mean of the L2-normalized templates (the student's single `embedding`)"""
+    templates = np.asarray(templates, dtype=np.float32)
+    norms = np.linalg.norm(templates, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (templates / norms).mean(axis=0)
+
+
+def decode_templates(value, labels: Optional[Sequence[str]], fmt: Optional[str] = None) -> Optional[np.ndarray]:
+    """
+    (templates x dim) float32 matrix from any stored or transmitted form
+
+    Accepts a matrix, a list of vectors, a {label: vector} mapping (rows in
+    its order), or the binary/base64 float32 bytes of the rows concatenated
+    (reshaped by the number of `labels`).
+    """
+    if value is None:
+        return None
+    if isinstance(value, Mapping):
+        value = list(value.values())
+        if not value:
+            return None
+    if isinstance(value, np.ndarray) and value.ndim == 2:
+        return value.astype(np.float32, copy=False)
+    if isinstance(value, (list, tuple)) and value and not np.isscalar(value[0]):
+        return np.asarray(value, dtype=np.float32)
+    flat = to_array(value, fmt)
+    if flat is None:
+        return None
+    rows = len(labels) if labels else 1
+    if flat.size % rows:
+        raise ValueError(f"{flat.size} template values do not split into {rows} rows")
+    return flat.reshape(rows, -1)
+
+
+def student_templates(student: Dict) -> Tuple[Tuple[str, ...], Optional[np.ndarray]]:
+    """
+    (labels, templates matrix) of a student document
+
+    Falls back to the single `embedding` (label "mean") for students without
+    per-view templates. The matrix is None if the student has no embedding.
+    """
+    value, labels = student.get("templates"), student.get("template_labels")
+    if isinstance(value, Mapping):
+        labels = list(value)  # Not yet stored: {label: vector} as built at enrollment
+    templates = decode_templates(value, labels)
+    if templates is not None and templates.size:
+        labels = tuple(labels or ())
+        if len(labels) != templates.shape[0]:
+            labels = tuple(f"t{i}" for i in range(templates.shape[0]))
+        return labels, templates
+    embedding = to_array(student.get("embedding"))
+    if embedding is None:
+        return (), None
+    return (MEAN_LABEL,), embedding.reshape(1, -1)
+
+
+def template_items(roll_number: str, labels: Sequence[str], templates: np.ndarray,
+                   metadata: Dict) -> List[Tuple[str, np.ndarray, Dict]]:
+    """Vector store items (one per template) for a student, all with `metadata`"""
+    metadata = dict(metadata, roll_number=roll_number)
+    return [
+        (template_id(roll_number, label), row, dict(metadata, template=label))
+        for label, row in zip(labels, templates)
+    ]
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
@@ -12,11 +12,15 @@ import numpy as np
 from io import BytesIO
 from deepface import DeepFace
 
-# Pinecone imports
-try:
-    import pinecone
-except Exception:
-    pinecone = None
+# Vector search (Pinecone / NumPy / offline stand-in behind one interface)
+from vector_store import create_vector_store, VectorStoreError
+
+# Binary roster snapshot for camera nodes
+from embedding_export import ExportCache
+from embedding_codec import EMBEDDING_ENCODINGS
+
+# Per-view face templates (front / left / right / far) per student
+from face_templates import mean_embedding, student_templates, template_ids, template_items
 
 # Import Cloudinary utilities
 from cloudinary_utils import (
@@ -49,6 +53,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Data directory
@@ -62,35 +67,53 @@ PINECONE_ENABLED = os.getenv("PINECONE_ENABLED", "1") == "1"
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY", "")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "face-recognition")
 PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT", "us-east-1-aws")
+VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone")  # pinecone | numpy | inprocess | ann
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "")  # .npz file (numpy) or index directory (ann)
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))  # IVF clusters scanned per query
 
-def init_pinecone():
-    """Initialize Pinecone for vector search"""
-    if not PINECONE_ENABLED or pinecone is None or not PINECONE_API_KEY:
+def init_vector_store():
+    """Initialize the face-embedding vector store"""
+    if VECTOR_STORE == "pinecone" and (not PINECONE_ENABLED or not PINECONE_API_KEY):
         logger.warning("⚠️ Pinecone not enabled or API key missing")
         return None
 
     try:
-        pinecone.init(
+        store = create_vector_store(
+            VECTOR_STORE,
             api_key=PINECONE_API_KEY,
-            environment=PINECONE_ENVIRONMENT
+            index_name=PINECONE_INDEX_NAME,
+            environment=PINECONE_ENVIRONMENT,
+            create=True,
+            path=VECTOR_STORE_PATH or None,
+            nprobe=ANN_NPROBE
         )
-
-        if PINECONE_INDEX_NAME not in pinecone.list_indexes():
-            logger.info(f"📝 Creating Pinecone index: {PINECONE_INDEX_NAME}")
-            pinecone.create_index(
-                name=PINECONE_INDEX_NAME,
-                dimension=512,
-                metric="cosine"
-            )
-
-        pc_index = pinecone.Index(PINECONE_INDEX_NAME)
-        logger.info(f"✅ Pinecone initialized: {PINECONE_INDEX_NAME}")
-        return pc_index
-    except Exception as e:
-        logger.error(f"❌ Failed to initialize Pinecone: {e}")
+        if store.kind == "ann" and not store.stats()["count"]:
+            # Fresh index directory: build it from the students collection
+            try:
+                store.build(
+                    item
+                    for s in db.get_all_students(embeddings="array") if s.get("roll_number")
+                    for item in student_vector_items(s)
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Could not build ANN index from MongoDB (enrollments still add to it): {e}")
+        logger.info(f"✅ Vector store initialized: {VECTOR_STORE} ({PINECONE_INDEX_NAME})")
+        return store
+    except (VectorStoreError, ValueError, OSError) as e:
+        logger.error(f"❌ Failed to initialize vector store: {e}")
         return None
 
-pinecone_index = init_pinecone()
+def student_vector_items(student: Dict) -> List:
+    """Vector store items for a student: one per face template (none without an embedding)"""
+    labels, templates = student_templates(student)
+    if templates is None:
+        return []
+    return template_items(student["roll_number"], labels, templates, {
+        "name": student.get("name", ""),
+        "batch_id": student.get("batch_id", "")
+    })
+
+vector_store = init_vector_store()
 
 
 
@@ -207,22 +230,85 @@ def save_json_file(filename, data):
 # STUDENTS ENDPOINTS (MongoDB)
 # ============================================================================
 
+def list_students(response: Response, batch_id: Optional[str], fields: Optional[str], after: Optional[str],
+                  limit: Optional[int], embeddings: str) -> List[Dict]:
+    """Shared by the student list endpoints; sets X-Next-Cursor when more pages remain"""
+    if limit is not None and not 1 <= limit <= 5000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 5000")
+    if embeddings not in EMBEDDING_ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"embeddings must be one of {', '.join(EMBEDDING_ENCODINGS)}")
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    if field_list == ["all"]:
+        field_list = ["*"]
+    try:
+        students, next_cursor = db.find_students(batch_id, field_list, after, limit, embeddings)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return students
+
 @app.get("/api/students", response_model=List[Dict])
-async def get_all_students():
-    """Get all students from MongoDB"""
+async def get_all_students(response: Response, fields: Optional[str] = None, after: Optional[str] = None,
+                           limit: Optional[int] = None, embeddings: str = "list"):
+    """
+    Students from MongoDB, ordered by roll number
+    
+    fields: comma-separated projection; default is the list view (no embedding),
+            "all" returns whole documents. Embeddings only if asked for
+            (fields=all or fields=...,embedding), encoded as list | base64.
+    after/limit: cursor pagination; the next page's `after` is in X-Next-Cursor
+    """
     try:
-        students = db.get_all_students()
-        return students
+        return list_students(response, None, fields, after, limit, embeddings)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting students: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/students/changes")
+async def get_student_changes(since: int = 0, limit: int = 500, embeddings: str = "list"):
+    """Students added/updated/deleted after cursor `since` (0 = full roster)"""
+    try:
+        return db.get_student_changes(since, max(1, min(limit, 5000)), embeddings=embeddings)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting student changes: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+embedding_exports = ExportCache()
+
+@app.get("/api/students/snapshot/index")
+async def get_student_snapshot_index(request: Request):
+    """Index of the binary roster snapshot (ETag = students version; 304 if unchanged)"""
+    try:
+        version = db.get_students_version()
+        if request.headers.get("if-none-match") == f'"{version}"':
+            return Response(status_code=304, headers={"ETag": f'"{version}"'})
+        export = embedding_exports.get(version, lambda: db.get_all_students(embeddings="array"))
+        return Response(export.index_json, media_type="application/json", headers={"ETag": export.etag})
+    except Exception as e:
+        logger.error(f"Error building student snapshot: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/students/snapshot/embeddings")
+async def get_student_snapshot_embeddings(version: int):
+    """float32 .npy embedding matrix for an index version fetched from /snapshot/index"""
+    export = embedding_exports.peek(version)
+    if export is None:
+        raise HTTPException(status_code=409, detail="Snapshot version no longer available, fetch the index again")
+    return Response(export.npy, media_type="application/octet-stream", headers={"ETag": export.etag})
+
 @app.get("/api/students/{batch_id}", response_model=List[Dict])
-async def get_batch_students(batch_id: str):
-    """Get students from specific batch from MongoDB"""
+async def get_batch_students(batch_id: str, response: Response, fields: Optional[str] = None,
+                             after: Optional[str] = None, limit: Optional[int] = None, embeddings: str = "list"):
+    """Students of one batch (same fields / after / limit / embeddings options as /api/students)"""
     try:
-        batch_students = db.get_batch_students(batch_id)
-        return batch_students
+        return list_students(response, batch_id, fields, after, limit, embeddings)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting batch students: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -234,7 +320,7 @@ async def add_student(student: Dict):
         roll_number = student.get("roll_number")
         
         # Check if student exists
-        existing = db.get_student_by_roll(roll_number)
+        existing = db.get_student_by_roll(roll_number, embeddings="none")
         if existing:
             raise HTTPException(status_code=400, detail="Student already exists")
         
@@ -264,7 +350,7 @@ async def update_student(roll_number: str, student: Dict):
     """Update student information in MongoDB"""
     try:
         # Check if student exists
-        existing = db.get_student_by_roll(roll_number)
+        existing = db.get_student_by_roll(roll_number, embeddings="none")
         if not existing:
             raise HTTPException(status_code=404, detail="Student not found")
         
@@ -285,13 +371,18 @@ async def delete_student(roll_number: str):
     """Delete student from MongoDB"""
     try:
         # Check if student exists
-        existing = db.get_student_by_roll(roll_number)
+        existing = db.get_student_by_roll(roll_number, embeddings="array")
         if not existing:
             raise HTTPException(status_code=404, detail="Student not found")
         
         success = db.delete_student(roll_number)
         if success:
             logger.info(f"✅ Student deleted from MongoDB: {roll_number}")
+            if vector_store is not None:
+                try:
+                    vector_store.delete(template_ids(roll_number, student_templates(existing)[0]))
+                except Exception as e:
+                    logger.warning(f"⚠️ Failed to delete embedding from vector store: {e}")
             return {"status": "success", "message": "Student deleted successfully"}
         else:
             raise HTTPException(status_code=500, detail="Failed to delete student")
@@ -359,7 +450,7 @@ async def upload_student_image_endpoint(
         logger.info(f"✅ Image uploaded to Cloudinary: {upload_result['url']}")
         
         # Check if student exists and delete old image if needed
-        existing_student = db.get_student_by_roll(roll_number)
+        existing_student = db.get_student_by_roll(roll_number, embeddings="none")
         if existing_student:
             old_public_id = existing_student.get("cloudinary_public_id")
             if old_public_id and old_public_id != upload_result["public_id"]:
@@ -384,7 +475,7 @@ async def upload_student_image_endpoint(
         }
         
         # Check if student exists
-        existing = db.get_student_by_roll(roll_number)
+        existing = db.get_student_by_roll(roll_number, embeddings="none")
         if existing:
             # Update existing
             old_public_id = existing.get("cloudinary_public_id")
@@ -429,7 +520,10 @@ async def upload_student_images_endpoint(
     email: Optional[str] = Form(None)
 ):
     """
-    Upload 4 labeled student images to Cloudinary, generate averaged embedding, and save to database
+    Upload 4 labeled student images to Cloudinary, generate one embedding per view, and save to database
+    
+    Each view's embedding is kept as a face template (matched max-over-templates);
+    `embedding` is their normalized mean for single-vector consumers.
     """
     try:
         if not validate_cloudinary_config():
@@ -445,7 +539,7 @@ async def upload_student_images_endpoint(
             ("far", far_image)
         ]
 
-        embeddings = []
+        templates = {}
         upload_results = []
         image_metadata = []
 
@@ -464,7 +558,7 @@ async def upload_student_images_endpoint(
                     enforce_detection=True,
                     detector_backend=FACE_ENROLL_DETECTOR_BACKEND
                 )
-                embeddings.append(np.array(embedding_result[0]["embedding"], dtype=float))
+                templates[label] = np.array(embedding_result[0]["embedding"], dtype=np.float32)
             except Exception as e:
                 logger.error(f"❌ Face detection failed on {label} image: {e}")
                 raise HTTPException(
@@ -491,12 +585,12 @@ async def upload_student_images_endpoint(
                 "size_bytes": upload_result.get("bytes")
             })
 
-        avg_embedding = np.mean(np.stack(embeddings), axis=0).tolist()
+        avg_embedding = mean_embedding(np.stack(list(templates.values())))
         image_urls = [result["url"] for result in upload_results]
         public_ids = [result["public_id"] for result in upload_results]
         primary_url = image_urls[0] if image_urls else None
 
-        existing_student = db.get_student_by_roll(roll_number)
+        existing_student = db.get_student_by_roll(roll_number, embeddings="array")
         if existing_student:
             old_public_ids = existing_student.get("cloudinary_public_ids") or []
             if isinstance(old_public_ids, list):
@@ -506,10 +600,10 @@ async def upload_student_images_endpoint(
             if old_public_id:
                 delete_student_image(old_public_id)
 
-            if pinecone_index is not None:
+            if vector_store is not None:
                 try:
-                    pinecone_index.delete(ids=[roll_number], namespace="face-recognition")
-                    logger.info(f"✅ Deleted old Pinecone embedding for {roll_number}")
+                    vector_store.delete(template_ids(roll_number, student_templates(existing_student)[0]))
+                    logger.info(f"✅ Deleted old Pinecone embeddings for {roll_number}")
                 except Exception as e:
                     logger.warning(f"⚠️ Failed to delete old Pinecone embedding: {e}")
 
@@ -525,6 +619,7 @@ async def upload_student_images_endpoint(
             "cloudinary_public_id": public_ids[0] if public_ids else None,
             "cloudinary_public_ids": public_ids,
             "embedding": avg_embedding,
+            "templates": templates,
             "image_metadata": image_metadata
         }
 
@@ -535,16 +630,18 @@ async def upload_student_images_endpoint(
             db.add_student(student_data)
             logger.info(f"✅ Student {name} added to MongoDB with multi-image embeddings")
 
-        if pinecone_index is not None:
+        if vector_store is not None:
             try:
-                embedding_vector = np.array(avg_embedding, dtype="float32").tolist()
-                pinecone_index.upsert(
-                    vectors=[(roll_number, embedding_vector)],
-                    namespace="face-recognition"
-                )
-                logger.info(f"✅ Pushed embedding to Pinecone for {roll_number}")
+                # All templates in one call; batch_id lets camera nodes query their own batch first
+                count = vector_store.upsert(student_vector_items(student_data))
+                logger.info(f"✅ Pushed {count} face templates to Pinecone for {roll_number}")
             except Exception as e:
+                # Old vectors are already gone: the student would silently drop out of vector search
                 logger.error(f"❌ Failed to push embedding to Pinecone: {e}")
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Student {name} saved, but face templates could not be indexed. Please upload again."
+                )
 
         return {
             "status": "success",
@@ -573,7 +670,7 @@ async def update_student_image_endpoint(
     """
     try:
         # Check if student exists
-        existing_student = db.get_student_by_roll(roll_number)
+        existing_student = db.get_student_by_roll(roll_number, embeddings="none")
         if not existing_student:
             raise HTTPException(status_code=404, detail="Student not found")
         
@@ -0,0 +1,977 @@
+"""
+Vector Store Module for Face Recognition Attendance System
+One interface for face-embedding search, shared by backend, camera service and scripts
+
+Implementations:
+    PineconeVectorStore    - Pinecone index (3.x `Pinecone` client or legacy `pinecone.init`)
+    NumpyVectorStore       - exact cosine search in process memory (optionally saved to .npz)
+    IVFVectorStore         - approximate (IVF) search over a memory-mapped on-disk index
+    InProcessPineconeIndex - offline stand-in for a Pinecone index (wrap it in PineconeVectorStore)
+
+Usage:
+    store = create_vector_store("pinecone", api_key=..., index_name="face-recognition")
+    store.upsert([("21CS001", embedding, {"batch_id": "CSE-A", "name": "Asha"})])
+    matches = store.query(embedding, top_k=1, filter={"batch_id": "CSE-A"})
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAMESPACE = os.getenv("PINECONE_NAMESPACE", "face-recognition")
+DEFAULT_DIMENSION = 512
+
+# (id, vector, metadata) - metadata may be None
+VectorItem = Tuple[str, Sequence[float], Optional[Dict[str, Any]]]
+
+
+class VectorMatch(NamedTuple):
+    id: str
+    score: float
+    metadata: Dict[str, Any]
+
+
+class VectorStoreError(Exception):
+    """Vector store backend failed (network, auth, missing index)"""
+
+
+def matches_filter(metadata: Optional[Dict], filter: Optional[Dict]) -> bool:
+    """
+    Evaluate the Pinecone filter subset used in this project against metadata
+
+    Supported: {"field": value}, {"field": {"$eq"|"$ne"|"$in"|"$nin": ...}}
+    and top-level {"$and": [...]} / {"$or": [...]}.
+    """
+    if not filter:
+        return True
+    metadata = metadata or {}
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            if op == "$eq" and value != expected:
+                return False
+            if op == "$ne" and value == expected:
+                return False
+            if op == "$in" and value not in expected:
+                return False
+            if op == "$nin" and value in expected:
+                return False
+            if op not in ("$eq", "$ne", "$in", "$nin"):
+                raise ValueError(f"Unsupported filter operator: {op}")
+    return True
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if k >= scores.shape[0]:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+# ============================================================================
+# INTERFACE
+# ============================================================================
+
+class VectorStore:
+    """
+    Base interface for face-embedding stores
+
+    Scores are cosine similarities (higher is better). `namespace=None`
+    means the store's default namespace. Filters use Pinecone's metadata
+    filter syntax (see `matches_filter` for the supported subset).
+    """
+
+    kind = "base"
+
+    def upsert(self, items: Iterable[VectorItem], namespace: Optional[str] = None) -> int:
+        """Insert or replace vectors; returns number written"""
+        raise NotImplementedError
+
+    def delete(self, ids: Iterable[str], namespace: Optional[str] = None) -> int:
+        """Remove vectors by id; returns number requested"""
+        raise NotImplementedError
+
+    def query(self, vector: Sequence[float], top_k: int = 1, filter: Optional[Dict] = None,
+              namespace: Optional[str] = None) -> List[VectorMatch]:
+        """Nearest vectors to `vector`, best first"""
+        raise NotImplementedError
+
+    def query_batch(self, vectors: Sequence[Sequence[float]], top_k: int = 1, filter: Optional[Dict] = None,
+                    namespace: Optional[str] = None) -> List[List[VectorMatch]]:
+        """One `query` result per input vector"""
+        return [self.query(vector, top_k, filter, namespace) for vector in vectors]
+
+    def stats(self) -> Dict[str, Any]:
+        """Backend-specific counters (at least "kind" and "count")"""
+        raise NotImplementedError
+
+
+# ============================================================================
+# EXACT NUMPY STORE
+# ============================================================================
+
+class _Namespace:
+    """Rows of one namespace: ids, raw float32 vectors, metadata"""
+
+    def __init__(self, dim: int):
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.vectors = np.empty((0, dim), np.float32)
+        self.metadata: List[Dict] = []
+        self._normalized = None  # Cached L2-normalized copy, dropped on every write
+
+    def normalized(self) -> np.ndarray:
+        if self._normalized is None:
+            self._normalized = _normalize_rows(self.vectors)
+        return self._normalized
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Exact (brute-force) cosine search over float32 rows in memory.
+
+    Batch queries are one matrix product. Optionally persisted to `path`
+    (.npz with vectors + JSON ids/metadata) via save()/load(); with
+    `autosave` every upsert/delete rewrites the file. This is the reference
+    implementation the approximate indexes are checked against.
+    """
+
+    kind = "numpy"
+
+    def __init__(self, dim: int = DEFAULT_DIMENSION, path: Optional[str] = None,
+                 default_namespace: str = DEFAULT_NAMESPACE, autosave: bool = False):
+        self.dim = dim
+        self.path = path
+        self.default_namespace = default_namespace
+        self.autosave = autosave and bool(path)
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def _ns(self, namespace: Optional[str], create: bool = False) -> Optional[_Namespace]:
+        name = self.default_namespace if namespace is None else namespace
+        ns = self._namespaces.get(name)
+        if ns is None and create:
+            ns = self._namespaces[name] = _Namespace(self.dim)
+        return ns
+
+    def upsert(self, items: Iterable[VectorItem], namespace: Optional[str] = None) -> int:
+        items = list(items)
+        with self._lock:
+            ns = self._ns(namespace, create=True)
+            new_rows = []
+            for vector_id, values, metadata in items:
+                vector = np.asarray(values, dtype=np.float32).ravel()
+                if vector.shape[0] != self.dim:
+                    raise ValueError(f"Vector {vector_id} has dim {vector.shape[0]}, store expects {self.dim}")
+                row = ns.index.get(vector_id)
+                if row is None:
+                    ns.index[vector_id] = len(ns.ids) + len(new_rows)
+                    new_rows.append((vector_id, vector, dict(metadata or {})))
+                elif row >= len(ns.ids):
+                    # Same new id twice in one call: last one wins
+                    new_rows[row - len(ns.ids)] = (vector_id, vector, dict(metadata or {}))
+                else:
+                    ns.vectors[row] = vector
+                    ns.metadata[row] = dict(metadata or {})
+            if new_rows:
+                ns.ids.extend(r[0] for r in new_rows)
+                ns.vectors = np.vstack([ns.vectors] + [r[1][None, :] for r in new_rows])
+                ns.metadata.extend(r[2] for r in new_rows)
+            ns._normalized = None
+        if self.autosave:
+            self.save()
+        return len(items)
+
+    def delete(self, ids: Iterable[str], namespace: Optional[str] = None) -> int:
+        ids = set(ids)
+        with self._lock:
+            ns = self._ns(namespace)
+            if ns is None:
+                return 0
+            keep = [i for i, vector_id in enumerate(ns.ids) if vector_id not in ids]
+            removed = len(ns.ids) - len(keep)
+            if removed:
+                ns.ids = [ns.ids[i] for i in keep]
+                ns.vectors = ns.vectors[keep]
+                ns.metadata = [ns.metadata[i] for i in keep]
+                ns.index = {vector_id: i for i, vector_id in enumerate(ns.ids)}
+                ns._normalized = None
+        if removed and self.autosave:
+            self.save()
+        return removed
+
+    def query(self, vector, top_k=1, filter=None, namespace=None) -> List[VectorMatch]:
+        return self.query_batch([vector], top_k, filter, namespace)[0]
+
+    def query_batch(self, vectors, top_k=1, filter=None, namespace=None) -> List[List[VectorMatch]]:
+        queries = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            ns = self._ns(namespace)
+            if ns is None or not ns.ids:
+                return [[] for _ in range(queries.shape[0])]
+            matrix = ns.normalized()
+            ids, metadata = ns.ids, ns.metadata
+        rows = np.arange(len(ids))
+        if filter:
+            rows = np.array([i for i in rows if matches_filter(metadata[i], filter)], dtype=np.intp)
+            if rows.size == 0:
+                return [[] for _ in range(queries.shape[0])]
+            matrix = matrix[rows]
+        scores = _normalize_rows(queries) @ matrix.T
+        results = []
+        for q in range(scores.shape[0]):
+            best = _top_k(scores[q], top_k)
+            results.append([VectorMatch(ids[rows[i]], float(scores[q, i]), metadata[rows[i]]) for i in best])
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            namespaces = {name: len(ns.ids) for name, ns in self._namespaces.items()}
+            nbytes = sum(ns.vectors.nbytes for ns in self._namespaces.values())
+        return {"kind": self.kind, "dim": self.dim, "count": sum(namespaces.values()),
+                "namespaces": namespaces, "bytes": nbytes}
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.path
+        if not path:
+            raise ValueError("No path to save the vector store to")
+        with self._lock:
+            arrays = {f"vectors_{i}": ns.vectors for i, ns in enumerate(self._namespaces.values())}
+            header = {
+                "dim": self.dim,
+                "namespaces": [
+                    {"name": name, "ids": ns.ids, "metadata": ns.metadata}
+                    for name, ns in self._namespaces.items()
+                ]
+            }
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, header=np.frombuffer(json.dumps(header).encode("utf-8"), np.uint8), **arrays)
+        os.replace(tmp_path, path)
+
+    def load(self, path: Optional[str] = None):
+        path = path or self.path
+        with np.load(path) as data:
+            header = json.loads(bytes(data["header"]).decode("utf-8"))
+            namespaces = {}
+            for i, entry in enumerate(header["namespaces"]):
+                ns = _Namespace(header["dim"])
+                ns.ids = list(entry["ids"])
+                ns.index = {vector_id: row for row, vector_id in enumerate(ns.ids)}
+                ns.vectors = data[f"vectors_{i}"].astype(np.float32)
+                ns.metadata = list(entry["metadata"])
+                namespaces[entry["name"]] = ns
+        with self._lock:
+            self.dim = header["dim"]
+            self._namespaces = namespaces
+
+
+# ============================================================================
+# ON-DISK APPROXIMATE (IVF) STORE
+# ============================================================================
+
+IVF_FORMAT_VERSION = 1
+
+
+def _assign(rows: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+    """Index of the closest centroid for every (normalized) row"""
+    out = np.empty(rows.shape[0], dtype=np.int32)
+    for start in range(0, rows.shape[0], chunk):
+        out[start:start + chunk] = np.argmax(rows[start:start + chunk] @ centroids.T, axis=1)
+    return out
+
+
+def _spherical_kmeans(rows: np.ndarray, k: int, iterations: int = 10, seed: int = 0,
+                      max_sample: int = 100_000) -> np.ndarray:
+    """k unit-length centroids for normalized rows (trained on a sample)"""
+    rng = np.random.default_rng(seed)
+    if rows.shape[0] > max_sample:
+        rows = rows[np.sort(rng.choice(rows.shape[0], max_sample, replace=False))]
+    k = min(k, rows.shape[0])
+    centroids = rows[rng.choice(rows.shape[0], k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _assign(rows, centroids)
+        one_hot = np.zeros((k, rows.shape[0]), dtype=np.float32)
+        one_hot[labels, np.arange(rows.shape[0])] = 1.0
+        sums = one_hot @ rows
+        empty = one_hot.sum(axis=1) == 0
+        if empty.any():
+            sums[empty] = rows[rng.choice(rows.shape[0], int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums).astype(np.float32)
+    return centroids
+
+
+class _IVFBase:
+    """One built index generation (read-only; vectors usually memory-mapped)"""
+
+    __slots__ = ("generation", "ids", "index", "metadata", "vectors", "centroids", "offsets", "_filters")
+
+    def __init__(self, generation: int, ids: List[str], metadata: List[Dict], vectors: np.ndarray,
+                 centroids: np.ndarray, offsets: np.ndarray):
+        self.generation = generation
+        self.ids = ids
+        self.index = {vector_id: row for row, vector_id in enumerate(ids)}
+        self.metadata = metadata
+        self.vectors = vectors
+        self.centroids = centroids
+        self.offsets = offsets
+        self._filters: Dict[str, np.ndarray] = {}  # Rows matching a filter (metadata never changes)
+
+    @classmethod
+    def empty(cls, dim: int) -> "_IVFBase":
+        return cls(0, [], [], np.empty((0, dim), np.float32), np.empty((0, dim), np.float32),
+                   np.zeros(1, dtype=np.int64))
+
+    def filter_rows(self, filter: Dict) -> np.ndarray:
+        key = json.dumps(filter, sort_keys=True, default=str)
+        rows = self._filters.get(key)
+        if rows is None:
+            rows = np.array([i for i, meta in enumerate(self.metadata) if matches_filter(meta, filter)], dtype=np.intp)
+            self._filters[key] = rows
+        return rows
+
+
+class IVFVectorStore(VectorStore):
+    """
+    Approximate cosine search with an inverted-file (IVF) index kept on disk.
+
+    Rows are L2-normalized and grouped into `nlist` clusters by spherical
+    k-means. A query scores the centroids, then only the rows of its `nprobe`
+    closest clusters. Batch queries score each probed cluster once for all
+    queries that probe it.
+
+    `path` is a directory:
+        header.json          dim, ids, metadata, cluster offsets, file names
+        centroids-<gen>.npy  nlist x dim float32
+        vectors-<gen>.npy    N x dim float32, rows grouped by cluster
+        delta.npz            rows written since the last build
+        tombstones.json      base ids replaced or deleted since the last build
+    The vectors file is opened with np.load(mmap_mode="r"): startup reads only
+    the header and centroids, and processes on one machine share the pages.
+
+    Writes are incremental. New or changed rows go to an exact in-memory delta
+    (a NumpyVectorStore); the base rows they replace are masked. When the delta
+    outgrows `rebuild_ratio` of the base, a background build folds everything
+    into a new generation. Filtered queries that match at most `exact_limit`
+    base rows (one batch's roster) are answered exactly.
+
+    Only the default namespace is supported.
+    """
+
+    kind = "ann"
+
+    def __init__(self, dim: int = DEFAULT_DIMENSION, path: Optional[str] = None,
+                 default_namespace: str = DEFAULT_NAMESPACE, nprobe: int = 8, nlist: Optional[int] = None,
+                 exact_limit: int = 2048, rebuild_ratio: float = 0.1, min_rebuild: int = 1000,
+                 autosave: bool = True):
+        self.dim = dim
+        self.path = path
+        self.default_namespace = default_namespace
+        self.nprobe = nprobe
+        self.nlist = nlist  # None = sqrt(N) at build time
+        self.exact_limit = exact_limit
+        self.rebuild_ratio = rebuild_ratio
+        self.min_rebuild = min_rebuild
+        self.autosave = autosave and bool(path)
+        self._base = _IVFBase.empty(dim)
+        self._alive = np.ones(0, dtype=bool)  # Replaced (never mutated) on delete, so readers need no lock
+        self._tombstones = set()
+        self._delta = NumpyVectorStore(dim, default_namespace=default_namespace)
+        self._lock = threading.RLock()
+        self._building = False
+        self._pending: List[Tuple[str, Any]] = []  # Writes made while a build runs, replayed after it
+        if path and os.path.exists(os.path.join(path, "header.json")):
+            self.load()
+
+    def _check_namespace(self, namespace: Optional[str]):
+        if namespace is not None and namespace != self.default_namespace:
+            raise ValueError(f"IVFVectorStore only holds namespace '{self.default_namespace}'")
+
+    def _delta_count(self) -> int:
+        return self._delta.stats()["count"]
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def upsert(self, items: Iterable[VectorItem], namespace: Optional[str] = None) -> int:
+        self._check_namespace(namespace)
+        items = list(items)
+        with self._lock:
+            base, alive = self._base, self._alive
+            changed = []
+            replaced = []
+            for vector_id, values, metadata in items:
+                vector = np.asarray(values, dtype=np.float32).ravel()
+                if vector.shape[0] != self.dim:
+                    raise ValueError(f"Vector {vector_id} has dim {vector.shape[0]}, store expects {self.dim}")
+                row = base.index.get(vector_id)
+                if row is not None and alive[row]:
+                    # Re-seeding from a roster after a restart writes mostly unchanged rows
+                    norm = float(np.linalg.norm(vector)) or 1.0
+                    if base.metadata[row] == dict(metadata or {}) and np.allclose(base.vectors[row], vector / norm, atol=1e-6):
+                        continue
+                    replaced.append(row)
+                changed.append((vector_id, vector, metadata))
+            if not changed:
+                return 0
+            if replaced:
+                self._mask(replaced)
+            self._delta.upsert(changed)
+            if self._building:
+                self._pending.append(("upsert", changed))
+        self._after_write()
+        return len(changed)
+
+    def delete(self, ids: Iterable[str], namespace: Optional[str] = None) -> int:
+        self._check_namespace(namespace)
+        ids = list(ids)
+        with self._lock:
+            base, alive = self._base, self._alive
+            rows = [base.index[i] for i in ids if i in base.index and alive[base.index[i]]]
+            if rows:
+                self._mask(rows)
+            removed = len(rows) + self._delta.delete(ids)
+            if self._building:
+                self._pending.append(("delete", ids))
+        if removed:
+            self._after_write()
+        return removed
+
+    def _mask(self, rows: List[int]):
+        alive = self._alive.copy()
+        alive[rows] = False
+        self._alive = alive
+        self._tombstones.update(self._base.ids[row] for row in rows)
+
+    def _after_write(self):
+        if self.autosave:
+            self.save_delta()
+        base_count = len(self._base.ids)
+        if self._delta_count() > max(self.min_rebuild, self.rebuild_ratio * base_count) and not self._building:
+            threading.Thread(target=self._build_safely, name="ivf-build", daemon=True).start()
+
+    def _build_safely(self):
+        try:
+            self.build()
+        except Exception as e:
+            logger.error(f"❌ IVF index build failed: {e}")
+
+    # ------------------------------------------------------------------
+    # Build / persistence
+    # ------------------------------------------------------------------
+
+    def _live_items(self) -> Tuple[List[str], List[Dict], np.ndarray]:
+        base, alive = self._base, self._alive
+        keep = np.nonzero(alive)[0]
+        ids = [base.ids[i] for i in keep]
+        metadata = [base.metadata[i] for i in keep]
+        vectors = [np.asarray(base.vectors[keep], dtype=np.float32)]
+        ns = self._delta._ns(None)
+        if ns is not None and ns.ids:
+            ids += ns.ids
+            metadata += ns.metadata
+            vectors.append(ns.normalized())
+        return ids, metadata, np.vstack(vectors)
+
+    def build(self, items: Optional[Iterable[VectorItem]] = None):
+        """
+        Build a new index generation and make it current
+
+        Args:
+            items: Build from these (id, vector, metadata) rows only, e.g. the
+                   students collection; None folds the current base + delta
+        """
+        if items is not None:
+            rows = {}
+            for vector_id, values, meta in items:
+                rows[vector_id] = (np.asarray(values, dtype=np.float32).ravel(), dict(meta or {}))
+            ids = list(rows)
+            metadata = [rows[i][1] for i in ids]
+            vectors = np.vstack([rows[i][0][None, :] for i in ids]) if ids else np.empty((0, self.dim), np.float32)
+
+        with self._lock:
+            if self._building:
+                raise VectorStoreError("An IVF build is already running")
+            self._building = True
+            self._pending = []
+            if items is None:
+                ids, metadata, vectors = self._live_items()
+            generation = self._base.generation + 1
+
+        try:
+            start = time.time()
+            vectors = _normalize_rows(vectors).astype(np.float32) if len(ids) else vectors
+            nlist = self.nlist or max(1, int(round(np.sqrt(len(ids)))))
+            if len(ids):
+                centroids = _spherical_kmeans(vectors, nlist)
+                labels = _assign(vectors, centroids)
+                order = np.argsort(labels, kind="stable")
+                counts = np.bincount(labels, minlength=centroids.shape[0])
+            else:
+                centroids = np.empty((0, self.dim), np.float32)
+                order = np.empty(0, dtype=np.intp)
+                counts = np.zeros(0, dtype=np.int64)
+            offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+            base = _IVFBase(generation, [ids[i] for i in order], [metadata[i] for i in order],
+                            np.ascontiguousarray(vectors[order]), centroids, offsets)
+            if self.path:
+                base = self._write_base(base)
+            logger.info(f"✅ IVF index generation {generation}: {len(ids)} vectors, "
+                        f"{centroids.shape[0]} lists, {time.time() - start:.1f}s")
+        except Exception:
+            with self._lock:
+                self._building = False
+                self._pending = []
+            raise
+
+        with self._lock:
+            pending = self._pending
+            self._building = False
+            self._pending = []
+            self._base = base
+            self._alive = np.ones(len(base.ids), dtype=bool)
+            self._tombstones = set()
+            self._delta = NumpyVectorStore(self.dim, default_namespace=self.default_namespace)
+            # Replay writes that raced the build
+            for op, payload in pending:
+                if op == "upsert":
+                    self.upsert(payload)
+                elif op == "delete":
+                    self.delete(payload)
+            if self.autosave:
+                self.save_delta()
+
+    def _write_base(self, base: _IVFBase) -> _IVFBase:
+        os.makedirs(self.path, exist_ok=True)
+        vectors_file = f"vectors-{base.generation}.npy"
+        centroids_file = f"centroids-{base.generation}.npy"
+        np.save(os.path.join(self.path, vectors_file), base.vectors)
+        np.save(os.path.join(self.path, centroids_file), base.centroids)
+        header = {
+            "format": IVF_FORMAT_VERSION,
+            "dim": self.dim,
+            "generation": base.generation,
+            "namespace": self.default_namespace,
+            "vectors_file": vectors_file,
+            "centroids_file": centroids_file,
+            "offsets": base.offsets.tolist(),
+            "ids": base.ids,
+            "metadata": base.metadata
+        }
+        header_path = os.path.join(self.path, "header.json")
+        with open(header_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(header, f)
+        os.replace(header_path + ".tmp", header_path)
+        self._remove_stale_files(keep={vectors_file, centroids_file})
+        # Serve the new generation from the file like a fresh process would
+        base.vectors = np.load(os.path.join(self.path, vectors_file), mmap_mode="r")
+        return base
+
+    def _remove_stale_files(self, keep: set):
+        for name in os.listdir(self.path):
+            if name.startswith(("vectors-", "centroids-")) and name.endswith(".npy") and name not in keep:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass  # Still mapped by a reader on Windows; removed by a later build
+
+    def load(self, path: Optional[str] = None):
+        """Open an index directory (vectors memory-mapped) plus its delta and tombstones"""
+        path = path or self.path
+        with open(os.path.join(path, "header.json"), encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("format") != IVF_FORMAT_VERSION:
+            raise VectorStoreError(f"Unsupported IVF index format {header.get('format')} in {path}")
+        base = _IVFBase(
+            header["generation"], list(header["ids"]), list(header["metadata"]),
+            np.load(os.path.join(path, header["vectors_file"]), mmap_mode="r"),
+            np.load(os.path.join(path, header["centroids_file"])),
+            np.asarray(header["offsets"], dtype=np.int64)
+        )
+        delta = NumpyVectorStore(header["dim"], default_namespace=self.default_namespace)
+        delta_path = os.path.join(path, "delta.npz")
+        if os.path.exists(delta_path):
+            delta.load(delta_path)
+        tombstones = set()
+        tombstones_path = os.path.join(path, "tombstones.json")
+        if os.path.exists(tombstones_path):
+            with open(tombstones_path, encoding="utf-8") as f:
+                tombstones = set(json.load(f))
+        alive = np.ones(len(base.ids), dtype=bool)
+        for vector_id in tombstones:
+            row = base.index.get(vector_id)
+            if row is not None:
+                alive[row] = False
+        with self._lock:
+            self.dim = header["dim"]
+            self._base, self._alive, self._tombstones, self._delta = base, alive, tombstones, delta
+        logger.info(f"💾 IVF index loaded: {len(base.ids)} vectors (generation {base.generation}), "
+                    f"{delta.stats()['count']} in delta")
+
+    def save_delta(self):
+        """Persist the delta and tombstones (the base files never change)"""
+        if not self.path:
+            raise ValueError("No path to save the vector store to")
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock:
+            self._delta.save(os.path.join(self.path, "delta.npz"))
+            tombstones = sorted(self._tombstones)
+        tombstones_path = os.path.join(self.path, "tombstones.json")
+        with open(tombstones_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(tombstones, f)
+        os.replace(tombstones_path + ".tmp", tombstones_path)
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def query(self, vector, top_k=1, filter=None, namespace=None) -> List[VectorMatch]:
+        return self.query_batch([vector], top_k, filter, namespace)[0]
+
+    def query_batch(self, vectors, top_k=1, filter=None, namespace=None) -> List[List[VectorMatch]]:
+        self._check_namespace(namespace)
+        queries = _normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        base, alive, delta = self._base, self._alive, self._delta
+        results = self._search_base(base, alive, queries, top_k, filter)
+        for q, extra in enumerate(delta.query_batch(queries, top_k, filter)):
+            if extra:
+                results[q] = sorted(results[q] + extra, key=lambda m: -m.score)[:top_k]
+        return results
+
+    def _search_base(self, base: _IVFBase, alive: np.ndarray, queries: np.ndarray, top_k: int,
+                     filter: Optional[Dict]) -> List[List[VectorMatch]]:
+        if not base.ids:
+            return [[] for _ in range(queries.shape[0])]
+        allowed = alive
+        if filter:
+            rows = base.filter_rows(filter)
+            rows = rows[alive[rows]]
+            if rows.size <= self.exact_limit:
+                return self._exact(base, rows, queries, top_k)
+            allowed = np.zeros_like(alive)
+            allowed[rows] = True
+
+        nlist = base.centroids.shape[0]
+        nprobe = min(self.nprobe, nlist)
+        coarse = queries @ base.centroids.T
+        probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe] if nprobe < nlist else \
+            np.broadcast_to(np.arange(nlist), (queries.shape[0], nlist))
+
+        # Score each probed list once, for every query that probes it
+        by_list: Dict[int, List[int]] = {}
+        for q, lists in enumerate(probes):
+            for l in lists:
+                by_list.setdefault(int(l), []).append(q)
+        candidate_scores = [[] for _ in range(queries.shape[0])]
+        candidate_rows = [[] for _ in range(queries.shape[0])]
+        for l, qs in by_list.items():
+            start, end = int(base.offsets[l]), int(base.offsets[l + 1])
+            if start == end:
+                continue
+            mask = allowed[start:end]
+            if not mask.any():
+                continue
+            rows = np.arange(start, end)
+            scores = queries[qs] @ np.asarray(base.vectors[start:end]).T
+            if not mask.all():
+                rows, scores = rows[mask], scores[:, mask]
+            for j, q in enumerate(qs):
+                candidate_scores[q].append(scores[j])
+                candidate_rows[q].append(rows)
+
+        results = []
+        for q in range(queries.shape[0]):
+            if not candidate_rows[q]:
+                results.append([])
+                continue
+            scores = np.concatenate(candidate_scores[q])
+            rows = np.concatenate(candidate_rows[q])
+            best = _top_k(scores, top_k)
+            results.append([VectorMatch(base.ids[rows[i]], float(scores[i]), base.metadata[rows[i]]) for i in best])
+        return results
+
+    def _exact(self, base: _IVFBase, rows: np.ndarray, queries: np.ndarray, top_k: int) -> List[List[VectorMatch]]:
+        if rows.size == 0:
+            return [[] for _ in range(queries.shape[0])]
+        scores = queries @ np.asarray(base.vectors[rows]).T  # Fancy index reads only these rows from the map
+        results = []
+        for q in range(scores.shape[0]):
+            best = _top_k(scores[q], top_k)
+            results.append([VectorMatch(base.ids[rows[i]], float(scores[q, i]), base.metadata[rows[i]]) for i in best])
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        base, alive = self._base, self._alive
+        base_count = int(alive.sum())
+        delta_count = self._delta_count()
+        return {"kind": self.kind, "dim": self.dim, "count": base_count + delta_count,
+                "namespaces": {self.default_namespace: base_count + delta_count},
+                "base": base_count, "delta": delta_count, "generation": base.generation,
+                "nlist": int(base.centroids.shape[0]), "nprobe": self.nprobe,
+                "bytes": int(base.vectors.nbytes), "path": self.path}
+
+
+def evaluate_recall(approximate: VectorStore, exact: VectorStore, queries: Sequence[Sequence[float]],
+                    filter: Optional[Dict] = None) -> Dict[str, float]:
+    """
+    recall@1 of an approximate store against an exact one holding the same rows
+
+    Returns:
+        {"queries", "recall_at_1", "approximate_ms", "exact_ms"} (ms per query, batched)
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    start = time.perf_counter()
+    approx_results = approximate.query_batch(queries, 1, filter)
+    approx_ms = (time.perf_counter() - start) * 1000 / max(1, len(queries))
+    start = time.perf_counter()
+    exact_results = exact.query_batch(queries, 1, filter)
+    exact_ms = (time.perf_counter() - start) * 1000 / max(1, len(queries))
+
+    hits = total = 0
+    for approx, truth in zip(approx_results, exact_results):
+        if not truth:
+            continue
+        total += 1
+        hits += bool(approx) and approx[0].id == truth[0].id
+    return {"queries": total, "recall_at_1": hits / total if total else 1.0,
+            "approximate_ms": approx_ms, "exact_ms": exact_ms}
+
+
+# ============================================================================
+# PINECONE STORE
+# ============================================================================
+
+def _get(obj, key, default=None):
+    """Field from a Pinecone response object or plain dict"""
+    if isinstance(obj, dict):
+        return obj.get(key, default)
+    return getattr(obj, key, default)
+
+
+class PineconeVectorStore(VectorStore):
+    """
+    Pinecone index behind the VectorStore interface.
+
+    Wraps any object with Pinecone's Index data-plane methods (3.x client,
+    2.x legacy client, or InProcessPineconeIndex), so callers no longer care
+    which SDK generation is installed. Upserts are sent in batches of
+    `upsert_batch_size`.
+    """
+
+    kind = "pinecone"
+
+    def __init__(self, index, default_namespace: str = DEFAULT_NAMESPACE, upsert_batch_size: int = 100):
+        self.index = index
+        self.default_namespace = default_namespace
+        self.upsert_batch_size = upsert_batch_size
+
+    @classmethod
+    def connect(cls, api_key: str, index_name: str, environment: Optional[str] = None,
+                dimension: int = DEFAULT_DIMENSION, create: bool = False, **kwargs) -> "PineconeVectorStore":
+        """
+        Connect with whichever Pinecone SDK is installed
+
+        Raises:
+            VectorStoreError: SDK missing, bad credentials or index not found
+        """
+        try:
+            import pinecone
+        except ImportError as e:
+            raise VectorStoreError("pinecone package is not installed") from e
+
+        try:
+            if hasattr(pinecone, "Pinecone"):
+                # 3.x+ client
+                client = pinecone.Pinecone(api_key=api_key)
+                listed = client.list_indexes()
+                names = listed.names() if hasattr(listed, "names") else [_get(i, "name") for i in _get(listed, "indexes", listed)]
+                if index_name not in names:
+                    raise VectorStoreError(f"Pinecone index '{index_name}' not found (create it: dim={dimension}, metric=cosine)")
+                index = client.Index(index_name)
+            else:
+                # 2.x legacy client
+                pinecone.init(api_key=api_key, environment=environment)
+                if index_name not in pinecone.list_indexes():
+                    if not create:
+                        raise VectorStoreError(f"Pinecone index '{index_name}' not found")
+                    logger.info(f"📝 Creating Pinecone index: {index_name}")
+                    pinecone.create_index(name=index_name, dimension=dimension, metric="cosine")
+                index = pinecone.Index(index_name)
+        except VectorStoreError:
+            raise
+        except Exception as e:
+            raise VectorStoreError(f"Pinecone connection failed: {e}") from e
+        return cls(index, **kwargs)
+
+    def _namespace(self, namespace: Optional[str]) -> str:
+        return self.default_namespace if namespace is None else namespace
+
+    def upsert(self, items, namespace=None) -> int:
+        vectors = [
+            {
+                "id": vector_id,
+                "values": np.asarray(values, dtype=np.float32).ravel().tolist(),
+                "metadata": dict(metadata or {})
+            }
+            for vector_id, values, metadata in items
+        ]
+        for start in range(0, len(vectors), self.upsert_batch_size):
+            self.index.upsert(vectors=vectors[start:start + self.upsert_batch_size],
+                              namespace=self._namespace(namespace))
+        return len(vectors)
+
+    def delete(self, ids, namespace=None) -> int:
+        ids = list(ids)
+        if ids:
+            self.index.delete(ids=ids, namespace=self._namespace(namespace))
+        return len(ids)
+
+    def query(self, vector, top_k=1, filter=None, namespace=None) -> List[VectorMatch]:
+        kwargs = {"filter": filter} if filter else {}
+        response = self.index.query(
+            vector=np.asarray(vector, dtype=np.float32).ravel().tolist(),
+            top_k=top_k,
+            include_metadata=True,
+            namespace=self._namespace(namespace),
+            **kwargs
+        )
+        return [
+            VectorMatch(_get(m, "id"), float(_get(m, "score", 0.0)), dict(_get(m, "metadata") or {}))
+            for m in (_get(response, "matches") or [])
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        raw = self.index.describe_index_stats()
+        namespaces = _get(raw, "namespaces") or {}
+        counts = {name: int(_get(info, "vector_count", 0)) for name, info in namespaces.items()}
+        return {"kind": self.kind, "dim": _get(raw, "dimension"), "count": int(_get(raw, "total_vector_count", 0) or 0),
+                "namespaces": counts}
+
+
+# ============================================================================
+# OFFLINE PINECONE STAND-IN
+# ============================================================================
+
+class _Obj(dict):
+    """Dict with attribute access, like Pinecone's response objects"""
+    __getattr__ = dict.get
+
+
+class InProcessPineconeIndex:
+    """
+    Offline stand-in for a Pinecone Index (upsert / query / delete / stats).
+
+    Accepts the same call shapes as the real data plane (tuples or dicts,
+    namespaces, metadata filters) and answers from a NumpyVectorStore, so
+    the Pinecone code path can be exercised and benchmarked with no network.
+    `latency_ms` adds an artificial per-call delay to model a remote index.
+    """
+
+    def __init__(self, dim: int = DEFAULT_DIMENSION, latency_ms: float = 0.0):
+        self._store = NumpyVectorStore(dim, default_namespace="")
+        self.latency = latency_ms / 1000.0
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def upsert(self, vectors, namespace: str = ""):
+        self._call()
+        items = []
+        for vector in vectors:
+            if isinstance(vector, dict):
+                items.append((vector["id"], vector["values"], vector.get("metadata")))
+            else:
+                items.append((vector[0], vector[1], vector[2] if len(vector) > 2 else None))
+        return _Obj(upserted_count=self._store.upsert(items, namespace=namespace))
+
+    def delete(self, ids=None, namespace: str = "", delete_all: bool = False):
+        self._call()
+        if delete_all:
+            ids = list(self._store._ns(namespace).ids) if self._store._ns(namespace) else []
+        self._store.delete(ids or [], namespace=namespace)
+        return _Obj()
+
+    def query(self, vector, top_k: int = 10, namespace: str = "", filter: Optional[Dict] = None,
+              include_metadata: bool = False, include_values: bool = False):
+        self._call()
+        matches = self._store.query(vector, top_k, filter, namespace=namespace)
+        return _Obj(matches=[
+            _Obj(id=m.id, score=m.score, metadata=m.metadata if include_metadata else None)
+            for m in matches
+        ], namespace=namespace)
+
+    def describe_index_stats(self):
+        stats = self._store.stats()
+        return _Obj(
+            dimension=stats["dim"],
+            total_vector_count=stats["count"],
+            namespaces={name: _Obj(vector_count=count) for name, count in stats["namespaces"].items()}
+        )
+
+
+# ============================================================================
+# FACTORY
+# ============================================================================
+
+VECTOR_STORE_KINDS = ("pinecone", "numpy", "inprocess", "ann")
+
+
+def create_vector_store(kind: str, **kwargs) -> VectorStore:
+    """
+    Build a vector store by name
+
+    Args:
+        kind: "pinecone" (api_key, index_name, environment, create, namespace),
+              "numpy" (dim, path - saved on every write if given),
+              "ann" (dim, path - index directory, nprobe)
+              or "inprocess" (dim, latency_ms - Pinecone code path, no network)
+    """
+    kind = (kind or "pinecone").lower()
+    dim = kwargs.get("dim", DEFAULT_DIMENSION)
+    if kind == "pinecone":
+        return PineconeVectorStore.connect(
+            kwargs.get("api_key"),
+            kwargs.get("index_name", "face-recognition"),
+            kwargs.get("environment"),
+            dimension=dim,
+            create=kwargs.get("create", False),
+            default_namespace=kwargs.get("namespace", DEFAULT_NAMESPACE)
+        )
+    if kind == "numpy":
+        path = kwargs.get("path")
+        return NumpyVectorStore(dim, path, autosave=bool(path))
+    if kind == "ann":
+        return IVFVectorStore(dim, kwargs.get("path"), nprobe=kwargs.get("nprobe") or 8)
+    if kind == "inprocess":
+        index = InProcessPineconeIndex(dim, kwargs.get("latency_ms", 0.0))
+        return PineconeVectorStore(index)
+    raise ValueError(f"Unknown vector store '{kind}' (expected one of {VECTOR_STORE_KINDS})")
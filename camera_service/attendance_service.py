@@ -2,11 +2,12 @@ import cv2
 from deepface import DeepFace
 import json
 import os
+import sys
 import numpy as np
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 import time as time_module
-import requests
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from apscheduler.schedulers.background import BackgroundScheduler
 import logging
 import smtplib
@@ -19,16 +20,27 @@ from dotenv import load_dotenv
 env_path = os.path.join(os.path.dirname(__file__), '.env')
 load_dotenv(dotenv_path=env_path)
 
-try:
-    from pinecone import Pinecone
-except Exception as e:
-    Pinecone = None
+# Shared backend modules (vector_store, embedding_export, face_templates) live in ../backend
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from vector_store import create_vector_store, VectorStoreError
+from face_templates import student_templates, template_ids, template_items, template_owner
 
 try:
     from deep_sort_realtime.deepsort_tracker import DeepSort
 except Exception:
     DeepSort = None
 
+from preview_server import PreviewServer
+from stream_reader import StreamReader, resolve_source, describe_source
+from frame_pool import ensure_pool
+from backend_client import get_backend_client, BackendUnavailable, CircuitOpen, Deadline
+from local_snapshot import get_local_snapshot
+from roster_sync import get_roster_sync
+from embedding_cache import EmbeddingCache
+from reid_gallery import ReIdGallery
+from face_quality import FaceQualityGate
+from light_gallery import LightGallery
+
 # ============================================================================
 # LOGGING SETUP - Only show important logs (WARNING level)
 # ============================================================================
@@ -45,13 +57,51 @@ logger = logging.getLogger(__name__)
 
 DATA_DIR = "../data"
 BACKEND_API = "http://localhost:8000/api"
+BACKEND_MAX_CONNECTIONS = int(os.getenv("BACKEND_MAX_CONNECTIONS", "50"))  # Shared async HTTP pool for all cameras
+BACKEND_BREAKER_FAILURES = int(os.getenv("BACKEND_BREAKER_FAILURES", "3"))  # Consecutive failures before an endpoint's circuit opens
+BACKEND_BREAKER_RESET_SECONDS = float(os.getenv("BACKEND_BREAKER_RESET_SECONDS", "15"))  # Open circuit waits this long before a trial call
+FRAME_BACKEND_BUDGET_SECONDS = float(os.getenv("FRAME_BACKEND_BUDGET_SECONDS", "2.0"))  # Total backend I/O time allowed per processed frame
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "1") == "1"  # Keep a local SQLite copy of cameras/schedules/modes/rosters
+SNAPSHOT_DB_PATH = os.getenv("SNAPSHOT_DB_PATH", os.path.join(DATA_DIR, "camera_snapshot.sqlite3"))
+ROSTER_SYNC_INTERVAL = float(os.getenv("ROSTER_SYNC_INTERVAL", "30"))  # Seconds between /students/changes pulls (0 = off)
+ROSTER_SYNC_PAGE_SIZE = int(os.getenv("ROSTER_SYNC_PAGE_SIZE", "500"))
+ROSTER_SYNC_OVERLAP = int(os.getenv("ROSTER_SYNC_OVERLAP", "100"))  # Versions re-read below the cursor (late writes)
+EMBEDDING_SNAPSHOT_ENABLED = os.getenv("EMBEDDING_SNAPSHOT_ENABLED", "1") == "1"  # Start from the backend's binary roster snapshot (memory-mapped)
+EMBEDDING_SNAPSHOT_DIR = os.getenv("EMBEDDING_SNAPSHOT_DIR", os.path.join(DATA_DIR, "embedding_snapshot"))
 
 SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.45"))
+BATCH_FIRST_MATCHING = os.getenv("BATCH_FIRST_MATCHING", "1") == "1"  # Search the camera's batch roster before everyone
+MATCH_GLOBAL_FALLBACK = os.getenv("MATCH_GLOBAL_FALLBACK", "1") == "1"  # Widen to all students when the batch has no match above threshold
+MATCH_INDEX_DTYPE = os.getenv("MATCH_INDEX_DTYPE", "float32")  # float32 | float16 | int8 - compact copy scanned for whole-roster matches
+MATCH_RERANK_CANDIDATES = int(os.getenv("MATCH_RERANK_CANDIDATES", "16"))  # Students re-scored in float32 after a prefilter scan
+MATCH_PCA_DIMS = int(os.getenv("MATCH_PCA_DIMS", "0"))  # PCA prefilter for whole-roster matches: 64-128 dims (0 = off)
+MATCH_PCA_REFIT = float(os.getenv("MATCH_PCA_REFIT", "0.1"))  # Refit the PCA once this fraction of students changed
 MODEL = "ArcFace"
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "1") == "1"  # Try a light model first; ArcFace only for unclear faces
+LIGHT_MODEL = os.getenv("LIGHT_MODEL", "SFace")  # Any DeepFace model name (SFace: 128-dim, a few ms on CPU)
+CASCADE_LIGHT_THRESHOLD = float(os.getenv("CASCADE_LIGHT_THRESHOLD", "0.6"))  # Min light-model similarity to decide alone
+CASCADE_LIGHT_MARGIN = float(os.getenv("CASCADE_LIGHT_MARGIN", "0.15"))  # ... and lead over the runner-up student
+CASCADE_MIN_FACE_PX = int(os.getenv("CASCADE_MIN_FACE_PX", "80"))  # Smaller faces go straight to ArcFace
+CASCADE_MIN_QUALITY = float(os.getenv("CASCADE_MIN_QUALITY", "0.6"))  # Quality gate score needed for the light stage
+LIGHT_GALLERY_PER_STUDENT = int(os.getenv("LIGHT_GALLERY_PER_STUDENT", "4"))
+# SPRT calibration of LIGHT_MODEL similarities (its own scale; tune from the cascade stats on real cameras)
+LIGHT_SPRT_GENUINE_SIMILARITY = float(os.getenv("LIGHT_SPRT_GENUINE_SIMILARITY", "0.75"))
+LIGHT_SPRT_IMPOSTOR_SIMILARITY = float(os.getenv("LIGHT_SPRT_IMPOSTOR_SIMILARITY", "0.40"))
+LIGHT_SPRT_SIMILARITY_STD = float(os.getenv("LIGHT_SPRT_SIMILARITY_STD", "0.12"))
+LIGHT_GALLERY_DIR = os.getenv("LIGHT_GALLERY_DIR", os.path.join(DATA_DIR, "light_gallery"))
 DETECTION_INTERVAL = 2.0
 ATTENDANCE_COOLDOWN = 30  # Seconds cooldown between camera detections (database check handles duplicates)
 TEST_MODE_ALWAYS_ACTIVE = False  # False = only mark during scheduled time, True = always mark
+SCHEDULE_DRIVEN = os.getenv("SCHEDULE_DRIVEN", "1") == "1"  # Run each camera only around its class periods
+SCHEDULE_WARMUP_SECONDS = float(os.getenv("SCHEDULE_WARMUP_SECONDS", "120"))  # Start capture/models this long before class
+SCHEDULE_GRACE_SECONDS = float(os.getenv("SCHEDULE_GRACE_SECONDS", "60"))  # Keep running this long after class
+SCHEDULE_MERGE_GAP_SECONDS = float(os.getenv("SCHEDULE_MERGE_GAP_SECONDS", "600"))  # Don't pause for breaks shorter than this
+SCHEDULE_REFRESH_SECONDS = float(os.getenv("SCHEDULE_REFRESH_SECONDS", "300"))  # Timetable re-check (replans on change)
 PROCESS_EVERY_N_FRAMES = 30  # Process every 30 frames (~1 time/sec) - attendance needs persistence, not frequency
+ALL_MARKED_LOW_POWER = os.getenv("ALL_MARKED_LOW_POWER", "1") == "1"  # Stop recognition once the whole batch is marked
+LOW_POWER_EVERY_N_FRAMES = int(os.getenv("LOW_POWER_EVERY_N_FRAMES", "90"))  # Frames decoded for checks while everyone is marked
+LOW_POWER_SWEEP_SECONDS = float(os.getenv("LOW_POWER_SWEEP_SECONDS", "120"))  # Min seconds between recognition sweeps (after motion)
+LOW_POWER_MOTION_THRESHOLD = float(os.getenv("LOW_POWER_MOTION_THRESHOLD", "6.0"))  # Mean grey-level change of a 64x36 thumbnail
 FACE_EXTRACTION_INTERVAL = 10.0  # Cache face extraction for 10 seconds, reuse between frames (aggressive caching)
 MODE_CHECK_INTERVAL = 0.5  # seconds (increased frequency for instant mode detection)
 EXAM_DETECT_INTERVAL = 1  # seconds
@@ -78,25 +128,65 @@ FRAME_WIDTH = int(os.getenv("FRAME_WIDTH", "1280"))
 FRAME_HEIGHT = int(os.getenv("FRAME_HEIGHT", "720"))
 DISPLAY_WIDTH = 960  # ✅ FIX 4: Reduce display resolution (separate from processing)
 DISPLAY_HEIGHT = 540
+MIRROR_DISPLAY = os.getenv("MIRROR_DISPLAY", "1") == "1"  # Mirror the display/preview (boxes are mirrored to match)
+HEADLESS = os.getenv("HEADLESS", "0") == "1"  # No cv2.imshow windows (servers without a display)
+PREVIEW_ENABLED = os.getenv("PREVIEW_ENABLED", "0") == "1"  # Local MJPEG preview per camera
+PREVIEW_HOST = os.getenv("PREVIEW_HOST", "0.0.0.0")
+PREVIEW_BASE_PORT = int(os.getenv("PREVIEW_BASE_PORT", "8090"))  # Camera N listens on base + N
+PREVIEW_MAX_FPS = float(os.getenv("PREVIEW_MAX_FPS", "10"))
+PREVIEW_JPEG_QUALITY = int(os.getenv("PREVIEW_JPEG_QUALITY", "70"))
+STREAM_RECONNECT_MIN_SECONDS = float(os.getenv("STREAM_RECONNECT_MIN_SECONDS", "1.0"))
+STREAM_RECONNECT_MAX_SECONDS = float(os.getenv("STREAM_RECONNECT_MAX_SECONDS", "30.0"))
+STREAM_LOOP_FILES = os.getenv("STREAM_LOOP_FILES", "1") == "1"  # Loop video files for offline testing
+CAPTURE_MODE = os.getenv("CAPTURE_MODE", "grab")  # "grab" = decode only inferred/displayed frames, "read" = decode all
+DISPLAY_FPS = float(os.getenv("DISPLAY_FPS", "15"))  # Display/preview rate, independent of PROCESS_EVERY_N_FRAMES
+CAPTURE_STATS_INTERVAL = float(os.getenv("CAPTURE_STATS_INTERVAL", "60"))  # Seconds between decoded/grabbed reports
 FACE_DETECTOR_BACKEND = os.getenv("FACE_DETECTOR_BACKEND", "retinaface")
 FACE_DETECTOR_FALLBACK = None  # ✅ FIX 5: NO fallback to MTCNN (prevents double detection)
 FACE_DET_CONFIDENCE = float(os.getenv("FACE_DET_CONFIDENCE", "0.5"))
 FACE_DET_UPSCALE = float(os.getenv("FACE_DET_UPSCALE", "1.5"))
 MIN_FACE_SIZE = int(os.getenv("MIN_FACE_SIZE", "20"))
+FACE_QUALITY_GATE = os.getenv("FACE_QUALITY_GATE", "1") == "1"  # Skip embedding blurred / badly exposed / turned / tiny crops
+QUALITY_MIN_SHARPNESS = float(os.getenv("QUALITY_MIN_SHARPNESS", "40"))  # Laplacian variance of the 112x112 grey crop
+QUALITY_MIN_BRIGHTNESS = float(os.getenv("QUALITY_MIN_BRIGHTNESS", "50"))  # Mean grey level
+QUALITY_MAX_BRIGHTNESS = float(os.getenv("QUALITY_MAX_BRIGHTNESS", "210"))
+QUALITY_MAX_CLIPPED = float(os.getenv("QUALITY_MAX_CLIPPED", "0.35"))  # Max fraction of crushed shadows or blown highlights
+QUALITY_MAX_YAW = float(os.getenv("QUALITY_MAX_YAW", "0.3"))  # Nose offset from the eyes' midpoint / eye distance
+QUALITY_MIN_EYE_DISTANCE = float(os.getenv("QUALITY_MIN_EYE_DISTANCE", "12"))  # Inter-ocular distance in source pixels
 PINECONE_ENABLED = os.getenv("PINECONE_ENABLED", "1") == "1"
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY", "")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "face-recognition")
 PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT", "us-east-1-aws")
+VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone")  # pinecone | numpy | inprocess | ann (local kinds mirror the roster)
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", os.path.join(DATA_DIR, "camera_ann_index"))  # VECTOR_STORE=ann index directory
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))  # IVF clusters scanned per query
 
 TRACKING_ENABLED = os.getenv("TRACKING_ENABLED", "1") == "1"
 TRACK_MIN_SECONDS = float(os.getenv("TRACK_MIN_SECONDS", "3.0"))
 TRACK_MIN_HITS = int(os.getenv("TRACK_MIN_HITS", "3"))
 TRACK_IOU_MATCH = float(os.getenv("TRACK_IOU_MATCH", "0.3"))
 TRACK_STALE_SECONDS = float(os.getenv("TRACK_STALE_SECONDS", "2.0"))
+TRACK_DECISION = os.getenv("TRACK_DECISION", "sprt")  # sprt = evidence-based confirmation, hits = TRACK_MIN_HITS agreeing matches
+TRACK_FUSION_FULL_WEIGHT_PX = float(os.getenv("TRACK_FUSION_FULL_WEIGHT_PX", "80"))  # Faces this size or larger get full fusion weight
+SPRT_GENUINE_SIMILARITY = float(os.getenv("SPRT_GENUINE_SIMILARITY", "0.60"))  # Typical similarity of a face to its own student
+SPRT_IMPOSTOR_SIMILARITY = float(os.getenv("SPRT_IMPOSTOR_SIMILARITY", "0.30"))  # Typical best similarity to someone else
+SPRT_SIMILARITY_STD = float(os.getenv("SPRT_SIMILARITY_STD", "0.10"))
+SPRT_FALSE_ACCEPT = float(os.getenv("SPRT_FALSE_ACCEPT", "0.001"))  # alpha: tolerated wrong confirmations
+SPRT_FALSE_REJECT = float(os.getenv("SPRT_FALSE_REJECT", "0.01"))  # beta: tolerated wrongly dropped candidates
+BEST_FRAME_WINDOW_SECONDS = float(os.getenv("BEST_FRAME_WINDOW_SECONDS", "2.0"))  # Collect a track's crops this long, then embed its best (0 = every crop)
+BEST_FRAME_BUFFER = int(os.getenv("BEST_FRAME_BUFFER", "3"))  # Best crops kept per track window
+BEST_FRAME_EMBED = int(os.getenv("BEST_FRAME_EMBED", "1"))  # Best crops embedded (one DeepFace batch) when the window closes
+REID_ENABLED = os.getenv("REID_ENABLED", "1") == "1"  # Check recently confirmed faces of this camera before the roster search
+REID_TTL_SECONDS = float(os.getenv("REID_TTL_SECONDS", "300"))  # How long a confirmed face stays re-identifiable
+REID_CAPACITY = int(os.getenv("REID_CAPACITY", "256"))  # Confirmed face embeddings kept per camera
+REID_THRESHOLD = float(os.getenv("REID_THRESHOLD", "0.6"))  # Face-to-recent-face similarity (above SIMILARITY_THRESHOLD)
 LIVENESS_ENABLED = os.getenv("LIVENESS_ENABLED", "1") == "1"
 LIVENESS_WINDOW_SECONDS = float(os.getenv("LIVENESS_WINDOW_SECONDS", "3.0"))
 LIVENESS_MIN_MOVEMENT_PX = float(os.getenv("LIVENESS_MIN_MOVEMENT_PX", "8.0"))
 
+# HighGUI is not thread-safe: serialize imshow/waitKey across camera threads
+HIGHGUI_LOCK = threading.Lock()
+
 # ============================================================================
 # UTILITIES
 # ============================================================================
@@ -116,81 +206,162 @@ def load_from_data_dir(filename):
     """Load from data directory"""
     return load_json_file(os.path.join(DATA_DIR, filename))
 
+def get_snapshot():
+    """Node-local SQLite snapshot (None if disabled or it cannot be opened)"""
+    return get_local_snapshot(SNAPSHOT_DB_PATH) if SNAPSHOT_ENABLED else None
+
+def get_backend():
+    """Shared asyncio backend client (one event loop for all cameras' network I/O)"""
+    return get_backend_client(
+        BACKEND_API,
+        max_connections=BACKEND_MAX_CONNECTIONS,
+        mode_poll_interval=MODE_CHECK_INTERVAL,
+        breaker_failures=BACKEND_BREAKER_FAILURES,
+        breaker_reset=BACKEND_BREAKER_RESET_SECONDS,
+        snapshot=get_snapshot()
+    )
+
+def get_roster():
+    """Shared student roster, kept current by background delta sync"""
+    return get_roster_sync(
+        get_backend(),
+        get_snapshot(),
+        interval=ROSTER_SYNC_INTERVAL,
+        page_size=ROSTER_SYNC_PAGE_SIZE,
+        overlap=ROSTER_SYNC_OVERLAP,
+        embedding_cache=get_embedding_cache(),
+        snapshot_options={
+            "quantize": MATCH_INDEX_DTYPE,
+            "rerank": MATCH_RERANK_CANDIDATES,
+            "pca_dims": MATCH_PCA_DIMS,
+            "pca_refit": MATCH_PCA_REFIT
+        }
+    )
+
+_embedding_cache = None
+
+def get_embedding_cache():
+    """On-disk binary roster snapshot (None if disabled)"""
+    global _embedding_cache
+    if EMBEDDING_SNAPSHOT_ENABLED and _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(get_backend(), EMBEDDING_SNAPSHOT_DIR)
+    return _embedding_cache
+
+_vector_store = None
+_vector_store_lock = threading.Lock()
+
+def get_vector_store():
+    """Process-wide vector store (None if Pinecone is disabled or unreachable)
+    
+    Local kinds (numpy / inprocess) start empty, so they are filled from the
+    roster and kept in step with it by a roster listener.
+    """
+    global _vector_store
+    with _vector_store_lock:
+        if _vector_store is not None:
+            return _vector_store or None
+        if VECTOR_STORE == "pinecone" and (not PINECONE_ENABLED or not PINECONE_API_KEY):
+            logger.info("⚠️ Pinecone not enabled or API key missing")
+            _vector_store = False
+            return None
+        try:
+            store = create_vector_store(
+                VECTOR_STORE,
+                api_key=PINECONE_API_KEY,
+                index_name=PINECONE_INDEX_NAME,
+                environment=PINECONE_ENVIRONMENT,
+                path=VECTOR_STORE_PATH if VECTOR_STORE == "ann" else None,
+                nprobe=ANN_NPROBE
+            )
+        except (VectorStoreError, ValueError, OSError) as e:
+            logger.error(f"❌ Failed to initialize vector store: {e}")
+            _vector_store = False
+            return None
+        if VECTOR_STORE != "pinecone":
+            # Local stores start empty: listen first, then seed (upserts are idempotent)
+            roster = get_roster()
+            roster.add_listener(lambda upserts, deletes, previous: _mirror_roster(store, upserts, deletes, previous))
+            current = roster.current
+            items = [
+                item
+                for roll, templates in current.vectors.items()
+                for item in template_items(roll, current.labels[roll], templates,
+                                           _vector_metadata(current.get(roll) or {"roll_number": roll}))
+            ]
+            if store.kind == "ann" and not store.stats()["count"]:
+                store.build(items)  # First start: build the on-disk index in one go
+            else:
+                store.upsert(items)  # The ANN store skips rows that are already current
+        logger.info(f"✅ Vector store initialized: {store.stats()}")
+        _vector_store = store
+        return store
+
+def _vector_metadata(student: Dict) -> Dict:
+    return {
+        "roll_number": student.get("roll_number", ""),
+        "name": student.get("name", ""),
+        "batch_id": student.get("batch_id", "")
+    }
+
+def _mirror_roster(store, upserts, deletes, previous):
+    """Apply a roster change to a local vector store (one vector per face template)"""
+    items = []
+    # Ids come from the labels the replaced roster held, so non-standard template labels are removed too
+    removed = [vector_id for roll in deletes for vector_id in template_ids(roll, previous.labels.get(roll, ()))]
+    for student in upserts:
+        roll = student.get("roll_number")
+        if not roll:
+            continue
+        labels, templates = student_templates(student)
+        student_items = template_items(roll, labels, templates, _vector_metadata(student)) if templates is not None else []
+        # Templates the student no longer has (or all of them, if the embedding was cleared) leave the store
+        current_ids = {vector_id for vector_id, _, _ in student_items}
+        removed += [vector_id for vector_id in template_ids(roll, previous.labels.get(roll, ()))
+                    if vector_id not in current_ids]
+        items += student_items
+    if removed:
+        store.delete(removed)
+    if items:
+        store.upsert(items)
+
 # ============================================================================
 # STUDENT FACE DATABASE
 # ============================================================================
 
 class FaceDatabase:
     def __init__(self):
-        self.students = {}
-        self.embeddings = {}
-        self.pinecone_index = None
-        self.pinecone_client = None
-        self._init_pinecone()
+        self.roster = get_roster()
         self.load_students()
-
-    def _init_pinecone(self):
-        """Initialize Pinecone client and connect to index (Pinecone 3.x API)"""
-        if not PINECONE_ENABLED or Pinecone is None or not PINECONE_API_KEY:
-            logger.info("⚠️ Pinecone not enabled or API key missing")
-            self.pinecone_client = None
-            self.pinecone_index = None
-            return
-
-        try:
-            # Initialize Pinecone with new 3.x API
-            self.pinecone_client = Pinecone(api_key=PINECONE_API_KEY)
-            logger.info("✅ Pinecone client created")
-
-            # Check if index exists
-            indexes = self.pinecone_client.list_indexes()
-            index_names = [idx.name for idx in indexes.indexes] if hasattr(indexes, 'indexes') else []
-            
-            if PINECONE_INDEX_NAME not in index_names:
-                logger.warning(f"⚠️ Pinecone index '{PINECONE_INDEX_NAME}' not found. Please create it manually in Pinecone console:")
-                logger.warning(f"   - Index name: {PINECONE_INDEX_NAME}")
-                logger.warning(f"   - Dimensions: 512")
-                logger.warning(f"   - Metric: cosine")
-                logger.warning(f"   - Region: us-east-1 (AWS)")
-                self.pinecone_client = None
-                self.pinecone_index = None
-                return
-            else:
-                logger.info(f"✅ Found existing Pinecone index: {PINECONE_INDEX_NAME}")
-
-            # Connect to existing index
-            self.pinecone_index = self.pinecone_client.Index(PINECONE_INDEX_NAME)
-            logger.info(f"✅ Pinecone initialized successfully")
-        except Exception as e:
-            logger.error(f"❌ Failed to initialize Pinecone: {e}")
-            self.pinecone_client = None
-            self.pinecone_index = None
+        self.vector_store = get_vector_store()
 
     def load_students(self):
-        """Load student embeddings from MongoDB via backend API (PRIMARY SOURCE)"""
+        """Load student embeddings from MongoDB via backend API (PRIMARY SOURCE)
+        
+        The roster is shared by all cameras and kept current by a background
+        delta sync (/students/changes). If the backend is unreachable it is
+        loaded from the local snapshot, so a node can cold-start offline.
+        """
         try:
-            response = requests.get(f"{BACKEND_API}/students", timeout=5)
-            if response.status_code == 200:
-                students_list = response.json()
-                
-                # Convert list format to roll_number keyed format
-                for student in students_list:
-                    roll = student.get("roll_number")
-                    if roll:
-                        self.students[roll] = student
-                        
-                        # Extract embedding if present
-                        if "embedding" in student and student["embedding"]:
-                            try:
-                                self.embeddings[roll] = np.array(student["embedding"])
-                            except Exception as e:
-                                logger.warning(f"Could not process embedding for {roll}: {e}")
-                
-                logger.info(f"✅ Loaded {len(self.students)} students from MongoDB")
-                return
+            self.roster.load()
+            self.roster.start()
+            logger.info(f"✅ Loaded {len(self.students)} students (roster cursor {self.roster.cursor})")
         except Exception as e:
             logger.error(f"❌ Failed to fetch from MongoDB API: {e}")
             raise
+    
+    def snapshot(self):
+        """Current RosterSnapshot - take it once per match so scores and lookups agree"""
+        return self.roster.current
+    
+    @property
+    def students(self):
+        """{roll_number: student} of the current roster snapshot (read-only)"""
+        return self.roster.current.students
+    
+    @property
+    def embeddings(self):
+        """{roll_number: embedding} of the current roster snapshot (read-only)"""
+        return self.roster.current.embeddings
 
 
     
@@ -202,127 +373,162 @@ class FaceDatabase:
         """Get all student embeddings"""
         return self.embeddings
 
-    def push_embedding_to_pinecone(self, roll_number: str, embedding: np.ndarray) -> bool:
-        """Push single embedding to Pinecone"""
-        if self.pinecone_index is None:
-            return False
-
-        try:
-            embedding_list = embedding.astype("float32").tolist()
-            self.pinecone_index.upsert(
-                vectors=[(roll_number, embedding_list)],
-                namespace="face-recognition"
-            )
-            return True
-        except Exception as e:
-            logger.error(f"❌ Failed to push embedding to Pinecone for {roll_number}: {e}")
-            return False
-
     def delete_embedding_from_pinecone(self, roll_number: str) -> bool:
-        """Delete embedding from Pinecone"""
-        if self.pinecone_index is None:
+        """Delete embedding from the vector store"""
+        if self.vector_store is None:
             return False
 
         try:
-            self.pinecone_index.delete(ids=[roll_number], namespace="face-recognition")
+            self.vector_store.delete(template_ids(roll_number, self.snapshot().labels.get(roll_number, ())))
             return True
         except Exception as e:
-            logger.error(f"❌ Failed to delete embedding from Pinecone for {roll_number}: {e}")
+            logger.error(f"❌ Failed to delete embedding from vector store for {roll_number}: {e}")
             return False
 
-    def search_best(self, embedding: np.ndarray) -> Optional[Dict]:
-        """Search best matching student using Pinecone (fallback to local embeddings)"""
-        if self.pinecone_index is not None:
-            try:
-                import time
-                query_embedding = embedding.astype("float32").tolist()
-                logger.info(f"🔍 Searching Pinecone with embedding vector (dim={len(query_embedding)})")
-                
-                start_time = time.time()
-                logger.info(f"⏳ About to call pinecone_index.query()...")
-                
-                # Pinecone 3.x API query syntax
-                results = self.pinecone_index.query(
-                    vector=query_embedding,
-                    top_k=1,
-                    include_metadata=True
-                )
-                
-                logger.info(f"✅ pinecone_index.query() returned!")
-                elapsed = time.time() - start_time
-                
-                logger.info(f"📊 Pinecone query took {elapsed:.2f}s")
-                logger.info(f"📊 Pinecone response type: {type(results)}")
-                logger.info(f"📊 Has matches attr: {hasattr(results, 'matches')}")
-
-                # Parse Pinecone 3.x response format
-                if hasattr(results, 'matches') and results.matches and len(results.matches) > 0:
-                    match = results.matches[0]
-                    roll_number = match.id
-                    similarity = float(match.score)
-                    student = self.get_student_by_roll(roll_number)
-
-                    if student:
-                        logger.info(f"✅ Pinecone match: {student.get('name')} (similarity: {similarity:.3f})")
-                        return {
-                            "roll_number": roll_number,
-                            "name": student.get("name"),
-                            "similarity": similarity
-                        }
-                    else:
-                        logger.warning(f"⚠️ Pinecone returned ID {roll_number} but student not found in memory")
-                        return None
-                        
-                logger.warning(f"⚠️ Pinecone returned no matches")
+    def search_best(self, embedding: np.ndarray, batch_id: Optional[str] = None,
+                    threshold: Optional[float] = None) -> Optional[Dict]:
+        """Search best matching student, batch roster first
+        
+        With a batch_id the camera's own batch is searched first (vector store
+        metadata filter, or the batch's rows of the local matrix). Only if the
+        best score there is below `threshold` does the search widen to every
+        enrolled student. Each scope uses the vector store when available and
+        the local roster snapshot otherwise.
+        
+        Returns:
+            {"roll_number", "name", "similarity", "scope"} or None
+        """
+        scopes = [None]
+        if batch_id and BATCH_FIRST_MATCHING:
+            scopes = [batch_id, None] if MATCH_GLOBAL_FALLBACK else [batch_id]
+        
+        snapshot = self.snapshot()  # One roster version for every scope
+        best = None
+        for scope in scopes:
+            match = self._store_best(embedding, scope, snapshot)
+            if match is None:
+                match = self._local_best(embedding, scope, snapshot)
+            if match and (best is None or match["similarity"] > best["similarity"]):
+                best = match
+            if best and threshold is not None and best["similarity"] >= threshold:
+                break
+            if scope is not None and len(scopes) > 1:
+                logger.info(f"🔁 No match above threshold in batch {scope}, widening to all students")
+        return best
+    
+    def _store_best(self, embedding, batch_id, snapshot) -> Optional[Dict]:
+        """Top-1 from the vector store (filtered to batch_id if given); None if unavailable or empty"""
+        if self.vector_store is None:
+            return None
+        try:
+            logger.info(f"🔍 Searching {self.vector_store.kind} store (dim={len(embedding)}, batch={batch_id or 'all'})")
+            start_time = time_module.time()
+            # Vectors upserted without batch_id metadata simply don't match the filter
+            matches = self.vector_store.query(
+                embedding,
+                top_k=1,
+                filter={"batch_id": {"$eq": batch_id}} if batch_id else None
+            )
+            logger.info(f"📊 Vector query took {time_module.time() - start_time:.2f}s")
+
+            if matches:
+                # Top-1 template = the student's best template (max over templates)
+                roll_number = matches[0].metadata.get("roll_number") or template_owner(matches[0].id)
+                similarity = matches[0].score
+                student = snapshot.get(roll_number)
+                if student:
+                    logger.info(f"✅ Vector store match: {student.get('name')} (similarity: {similarity:.3f})")
+                    return {
+                        "roll_number": roll_number,
+                        "name": student.get("name"),
+                        "similarity": similarity,
+                        "scope": batch_id or "all"
+                    }
+                logger.warning(f"⚠️ Vector store returned ID {roll_number} but student not found in memory")
                 return None
-            except Exception as e:
-                logger.warning(f"⚠️ Pinecone search failed: {type(e).__name__}: {e}, falling back to local search")
-
-        if not self.embeddings:
+                    
+            logger.info(f"⚠️ Vector store returned no matches (batch={batch_id or 'all'})")
             return None
-
-        best_roll = None
-        best_similarity = -1
-        query_norm = np.linalg.norm(embedding)
-
-        if query_norm == 0:
+        except Exception as e:
+            logger.warning(f"⚠️ Vector search failed: {type(e).__name__}: {e}, falling back to local search")
             return None
-
-        for roll_number, stored_embedding in self.embeddings.items():
-            stored_norm = np.linalg.norm(stored_embedding)
-            if stored_norm == 0:
-                continue
-
-            similarity = np.dot(embedding, stored_embedding) / (query_norm * stored_norm)
-
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_roll = roll_number
-
-        if best_roll is None:
+    
+    def _local_best(self, embedding, batch_id, snapshot) -> Optional[Dict]:
+        """Top-1 from the local roster snapshot (batch rows only if batch_id is given)"""
+        match = snapshot.best_match(embedding, batch_id)
+        if match is None:
             return None
 
-        student = self.get_student_by_roll(best_roll)
+        best_roll, best_similarity = match
+        student = snapshot.get(best_roll)
         if not student:
             return None
 
         return {
             "roll_number": best_roll,
             "name": student.get("name"),
-            "similarity": float(best_similarity)
+            "similarity": float(best_similarity),
+            "scope": batch_id or "all"
         }
 
+# ============================================================================
+# TRACK EVIDENCE (sequential probability ratio test on match similarities)
+# ============================================================================
+
+SPRT_ACCEPT = float(np.log((1 - SPRT_FALSE_REJECT) / SPRT_FALSE_ACCEPT))
+SPRT_REJECT = float(np.log(SPRT_FALSE_REJECT / (1 - SPRT_FALSE_ACCEPT)))
+
+
+def similarity_evidence(similarity: float, genuine: float = SPRT_GENUINE_SIMILARITY,
+                        impostor: float = SPRT_IMPOSTOR_SIMILARITY, std: float = SPRT_SIMILARITY_STD) -> float:
+    """
+    Log-likelihood ratio of one similarity: "the track is this student" vs
+    "it is someone else", with both similarities modelled as Gaussians of
+    equal spread (ArcFace's SPRT_GENUINE_SIMILARITY / SPRT_IMPOSTOR_SIMILARITY
+    unless another model's calibration is given)
+    """
+    separation = genuine - impostor
+    midpoint = (genuine + impostor) / 2.0
+    return separation * (similarity - midpoint) / (std ** 2)
+
+
+def light_evidence(similarity: float, margin: float) -> float:
+    """
+    SPRT evidence of a light-model win, on the light model's calibration
+
+    The runner-up student scored `similarity - margin`: whatever evidence it
+    would have had for itself is taken off, so a narrow win counts for less.
+    """
+    calibration = (LIGHT_SPRT_GENUINE_SIMILARITY, LIGHT_SPRT_IMPOSTOR_SIMILARITY, LIGHT_SPRT_SIMILARITY_STD)
+    return similarity_evidence(similarity, *calibration) - max(0.0, similarity_evidence(similarity - margin, *calibration))
+
 # ============================================================================
 # CAMERA ATTENDANCE
 # ============================================================================
 
 class CameraAttendance:
-    def __init__(self, camera_id, camera_name, batch_id):
+    def __init__(self, camera_id, camera_name, batch_id, preview_port=None, source=None):
         self.camera_id = camera_id
         self.camera_name = camera_name
         self.batch_id = batch_id
+        self.source = source  # Camera.ip_address: RTSP/HTTP URL, video file, device index or bare IP
+        self.reader = None
+        self.backend = get_backend()
+        self.backend.watch_camera_mode(camera_id)
+        self.frame_deadline = None  # Deadline for the frame being processed (one AI job in flight)
+        self.backend_stale = False  # True if the current frame used cached backend data
+        self.preview = None
+        if preview_port is not None:
+            self.preview = PreviewServer(
+                camera_name,
+                preview_port,
+                host=PREVIEW_HOST,
+                max_fps=PREVIEW_MAX_FPS,
+                jpeg_quality=PREVIEW_JPEG_QUALITY
+            )
         self.face_db = FaceDatabase()
         self.last_marked = {}  # {"roll_number": timestamp}
+        self.session = None  # Current class: expected batch roster, students marked, low-power state
         self.is_recording = False
         self.last_schedule_log = None
         self.cached_mode = "NORMAL"
@@ -342,6 +548,16 @@ class CameraAttendance:
         self.cached_face_results = []  # Cache extracted face results
         self.tracker = self._init_tracker()
         self.track_state = {}  # {track_id: {"embedding": ..., "marked": True, "student_roll": ...}}
+        self.quality_gate = FaceQualityGate(
+            min_sharpness=QUALITY_MIN_SHARPNESS,
+            min_brightness=QUALITY_MIN_BRIGHTNESS,
+            max_brightness=QUALITY_MAX_BRIGHTNESS,
+            max_clipped=QUALITY_MAX_CLIPPED,
+            max_yaw=QUALITY_MAX_YAW,
+            min_eye_distance=QUALITY_MIN_EYE_DISTANCE
+        ) if FACE_QUALITY_GATE else None
+        self.recognition_stats = {"embedded": 0, "skipped": 0, "buffered": 0, "decided": 0, "decision_embeddings": 0}
+        self.reid_gallery = ReIdGallery(REID_CAPACITY, REID_TTL_SECONDS, REID_THRESHOLD) if REID_ENABLED else None
         
         # ✅ FIX: Warm up DeepFace model cache to avoid 3-10 sec delay on first use
         logger.info("🚀 Warming up DeepFace ArcFace model cache...")
@@ -354,6 +570,22 @@ class CameraAttendance:
             logger.warning("✅ ArcFace Model: LOADED & CACHED (face recognition ready)")
         except Exception as e:
             logger.warning(f"⚠️ Could not warm up ArcFace cache: {e}, first embedding may be slow")
+
+        # Cascade first stage: light model + gallery of the faces ArcFace confirmed on this camera
+        self.light_gallery = None
+        self.cascade_stats = {"light": [0, 0.0], "escalated": [0, 0.0], "heavy": [0, 0.0]}  # [faces, seconds]
+        if CASCADE_ENABLED:
+            try:
+                _ = DeepFace.represent(dummy_img, model_name=LIGHT_MODEL, enforce_detection=False)
+                self.light_gallery = LightGallery(
+                    threshold=CASCADE_LIGHT_THRESHOLD,
+                    margin=CASCADE_LIGHT_MARGIN,
+                    per_student=LIGHT_GALLERY_PER_STUDENT,
+                    path=os.path.join(LIGHT_GALLERY_DIR, f"{camera_id}.npz")
+                )
+                logger.warning(f"✅ {LIGHT_MODEL} Model: LOADED (cascade first stage, {len(self.light_gallery)} students known)")
+            except Exception as e:
+                logger.warning(f"⚠️ Could not load {LIGHT_MODEL}: {e}, every face uses {MODEL}")
         
         # ✅ FIX 5: Preload YOLO model on init (NOT at runtime) to avoid freeze
         logger.warning("🔄 Initializing Phone Detection (YOLO)...")
@@ -365,20 +597,29 @@ class CameraAttendance:
             logger.warning(f"Failed to preload YOLO model: {e}")
             self.yolo_model = None
         
-        # ✅ FIX 1: Background thread for AI processing
+        # Reused buffers: display frame (camera thread) and detector upscales (AI threads)
+        self.display_buffer = None
+        self.upscale_pool = None
+        self.upscale_pool_lock = threading.Lock()
+        
+        # ✅ FIX 1: Background executor for AI processing (one job in flight per camera)
+        self.ai_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"ai-{camera_id}")
+        self.ai_future = None
         self.latest_result = None  # Latest AI result (used by display thread)
         self.ai_frame_buffer = None  # Buffer for frame to process
         self.ai_lock = threading.Lock()  # Thread-safe access to latest_result
 
-    def _ai_worker_thread(self, frame, frame_count):
+    def _ai_worker_thread(self, buffer, frame_count):
         """🔥 FIX 1: Background thread for AI processing
         
         Camera thread never waits for AI.
         AI runs async and updates self.latest_result.
+        `buffer` is a retained PooledFrame (read-only pixels), released when done.
         """
         try:
             logger.info(f"🧠 AI worker thread started for frame {frame_count}")
-            result = self.process_frame(frame)
+            result = self.process_frame(buffer.array)
+            result["stale"] = self.backend_stale
             with self.ai_lock:
                 self.latest_result = result
             logger.info(f"✅ AI result updated at frame {frame_count}: status={result.get('status')}")
@@ -386,23 +627,15 @@ class CameraAttendance:
             logger.error(f"❌ Error in AI worker thread: {e}")
             import traceback
             logger.error(traceback.format_exc())
+        finally:
+            buffer.release()
 
     def get_camera_mode(self):
-        """Fetch camera mode from backend with caching"""
-        now = datetime.now()
-        if self.last_mode_check and (now - self.last_mode_check).total_seconds() < MODE_CHECK_INTERVAL:
-            return self.cached_mode
-
-        try:
-            response = requests.get(f"{BACKEND_API}/camera-mode/{self.camera_id}", timeout=3)
-            if response.status_code == 200:
-                data = response.json()
-                mode = data.get("mode", "NORMAL")
-                self.cached_mode = mode
-        except Exception as e:
-            logger.warning(f"Could not fetch camera mode: {e}")
-
-        self.last_mode_check = now
+        """Camera mode as last polled by the backend loop (every MODE_CHECK_INTERVAL, never blocks)"""
+        self.cached_mode = self.backend.camera_mode(self.camera_id, self.cached_mode)
+        self.last_mode_check = datetime.now()
+        if self.backend.mode_is_stale(self.camera_id):
+            self.backend_stale = True
         return self.cached_mode
 
     def send_exam_alert(self, subject_id, time_slot):
@@ -792,7 +1025,7 @@ class CameraAttendance:
 
             for face in faces:
                 face_img = face.get("face")
-                if face_img is None:
+                if face_img is None or self._quality_reject(face):
                     continue
 
                 frame_embedding = self._compute_embedding(face_img)
@@ -810,20 +1043,39 @@ class CameraAttendance:
             logger.debug(f"Face match failed: {e}")
             return None
 
+    def _acquire_upscale_buffer(self, frame, scale):
+        """Pooled buffer for the upscaled detector input (reused across AI jobs)"""
+        height, width = frame.shape[:2]
+        shape = (int(round(height * scale)), int(round(width * scale))) + frame.shape[2:]
+        with self.upscale_pool_lock:
+            self.upscale_pool = ensure_pool(self.upscale_pool, shape, frame.dtype, size=2, name=f"{self.camera_name}-upscale")
+            pool = self.upscale_pool
+        return pool.acquire()
+
     def _extract_faces(self, frame):
         """Extract faces with optional upscaling for distant/partial faces"""
         scale = FACE_DET_UPSCALE if FACE_DET_UPSCALE > 1.0 else 1.0
+        upscale_buffer = None
         if scale > 1.0:
-            frame_scaled = cv2.resize(
+            upscale_buffer = self._acquire_upscale_buffer(frame, scale)
+            frame_scaled = upscale_buffer.array
+            cv2.resize(
                 frame,
-                None,
-                fx=scale,
-                fy=scale,
+                (frame_scaled.shape[1], frame_scaled.shape[0]),
+                dst=frame_scaled,
                 interpolation=cv2.INTER_LINEAR
             )
         else:
             frame_scaled = frame
 
+        try:
+            return self._extract_faces_scaled(frame_scaled, scale)
+        finally:
+            if upscale_buffer is not None:
+                upscale_buffer.release()
+
+    def _extract_faces_scaled(self, frame_scaled, scale):
+        """Run the detector on an (optionally upscaled) frame, return boxes in source pixels"""
         try:
             faces = DeepFace.extract_faces(
                 img_path=frame_scaled,
@@ -856,6 +1108,12 @@ class CameraAttendance:
             w = int(facial_area.get("w", 0))
             h = int(facial_area.get("h", 0))
 
+            landmarks = {}
+            for name in ("left_eye", "right_eye", "nose"):
+                point = facial_area.get(name)
+                if point is not None:
+                    landmarks[name] = (float(point[0]) / scale, float(point[1]) / scale)
+
             if scale > 1.0:
                 x = int(x / scale)
                 y = int(y / scale)
@@ -873,11 +1131,20 @@ class CameraAttendance:
                 "x": x,
                 "y": y,
                 "w": w,
-                "h": h
+                "h": h,
+                "landmarks": landmarks  # Detector eye/nose points in source pixels (for the quality gate)
             })
 
         return results
 
+    def _quality_reject(self, face):
+        """Reject reason if the face crop is not worth embedding now (sets face["quality"] otherwise)"""
+        if self.quality_gate is None:
+            return None
+        quality, reason = self.quality_gate.assess(face["face"], face.get("landmarks"))
+        face["quality"] = quality
+        return reason
+
     def _init_tracker(self):
         if not TRACKING_ENABLED or DeepSort is None:
             return None
@@ -900,54 +1167,175 @@ class CameraAttendance:
         
         if not result:
             return None
-        return np.array(result[0]["embedding"]) 
+        return np.asarray(result[0]["embedding"], dtype=np.float32)
 
-    def _best_match_from_embedding(self, embedding):
-        if embedding is None:
+    def _compute_light_embedding(self, face_img):
+        result = DeepFace.represent(face_img, model_name=LIGHT_MODEL, enforce_detection=False)
+        if not result:
             return None
+        return np.asarray(result[0]["embedding"], dtype=np.float32)
 
-        # Try Pinecone first
-        pinecone_match = self.face_db.search_best(embedding)
-        if pinecone_match:
-            similarity = pinecone_match.get("similarity", 0)
-            logger.info(f"📍 Pinecone result: {pinecone_match.get('name')} (similarity={similarity:.3f}, threshold={SIMILARITY_THRESHOLD})")
-            if similarity >= SIMILARITY_THRESHOLD:
-                logger.info(f"✅ Match passes threshold!")
-                return pinecone_match
-            else:
-                logger.warning(f"⚠️ Match below threshold ({similarity:.3f} < {SIMILARITY_THRESHOLD})")
-                return None
+    def _light_stage(self, track_id, face):
+        """
+        Cascade first stage: (match or None, tried)
 
-        # Fallback to local embeddings
-        logger.info(f"📂 Pinecone empty, trying local embeddings...")
-        best_similarity = -1.0
-        best_roll = None
-        for roll_number, student_embedding in self.face_db.get_all_embeddings().items():
-            similarity = np.dot(embedding, student_embedding) / (
-                np.linalg.norm(embedding) * np.linalg.norm(student_embedding)
-            )
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_roll = roll_number
+        Only large, good-quality faces are tried. A clear light-model win
+        (threshold and margin, see LightGallery) decides the face without
+        ArcFace. Its track gets SPRT evidence from the light similarity and
+        margin (light_evidence), and the match reports the light similarity:
+        ArcFace never scored this face.
+        """
+        if (
+            self.light_gallery is None
+            or not len(self.light_gallery)
+            or min(face.get("w", 0), face.get("h", 0)) < CASCADE_MIN_FACE_PX
+            or face.get("quality", 1.0) < CASCADE_MIN_QUALITY
+        ):
+            return None, False
+        try:
+            embedding = self._compute_light_embedding(face["face"])
+        except Exception as e:
+            logger.debug(f"{LIGHT_MODEL} embedding failed: {e}")
+            return None, True
+        face["light_embedding"] = embedding  # Reused if ArcFace confirms the face
+        hit = self.light_gallery.match(embedding) if embedding is not None else None
+        if hit is None:
+            return None, True
+
+        roll_number, light_similarity, margin, confirmed_similarity = hit
+        student = self.face_db.get_student_by_roll(roll_number)
+        if not student:
+            self.light_gallery.forget(roll_number)
+            return None, True
+        logger.info(f"🪶 {LIGHT_MODEL} decided {student.get('name')} (similarity={light_similarity:.3f}, margin={margin:.3f})")
+        match = {
+            "roll_number": roll_number,
+            "name": student.get("name"),
+            "similarity": light_similarity,
+            "light_similarity": light_similarity,
+            "light_margin": margin,
+            "model": LIGHT_MODEL,
+            "confirmed_similarity": confirmed_similarity,  # ArcFace, when the gallery entry was added
+            "scope": "light"
+        }
+        if track_id is not None:
+            state = self._get_track_state(track_id)
+            self._set_candidate(state, roll_number)
+            state["match_count"] += 1
+            state["last_similarity"] = light_similarity
+            state["light"] = True
+            if not state["decided"]:
+                self._weigh_evidence(track_id, state, self._face_weight(face) * light_evidence(light_similarity, margin))
+        return match, True
+
+    def _remember_light(self, roll_number, face, similarity):
+        """Add the light-model embedding of an ArcFace-confirmed crop (camera's batch only)"""
+        if self.light_gallery is None or face is None:
+            return
+        student = self.face_db.get_student_by_roll(roll_number) or {}
+        if self.batch_id and student.get("batch_id") != self.batch_id:
+            return
+        embedding = face.get("light_embedding")
+        try:
+            if embedding is None:
+                embedding = self._compute_light_embedding(face["face"])
+        except Exception as e:
+            logger.debug(f"{LIGHT_MODEL} embedding failed: {e}")
+            return
+        if embedding is not None:
+            self.light_gallery.add(roll_number, embedding, similarity)
+
+    def _record_cascade(self, path, started):
+        stats = self.cascade_stats[path]
+        stats[0] += 1
+        stats[1] += time_module.time() - started
+
+    def _compute_embeddings(self, face_imgs):
+        """Embeddings (or None) of several crops, in one DeepFace batch"""
+        if len(face_imgs) == 1:
+            return [self._compute_embedding(face_imgs[0])]
+        start_time = time_module.time()
+        results = DeepFace.represent(list(face_imgs), model_name=MODEL, enforce_detection=False)
+        logger.info(f"⚡ {len(face_imgs)} embeddings computed in {time_module.time() - start_time:.2f}s")
+        return [
+            np.asarray(result[0]["embedding"], dtype=np.float32) if result else None
+            for result in results
+        ]
+
+    def _crops_to_embed(self, track_id, face):
+        """
+        Faces to embed now: the face itself, or a track's best crops once its window closes
 
-        if best_roll is None:
-            logger.warning(f"❌ No match found in local embeddings")
+        A track's crops are collected for BEST_FRAME_WINDOW_SECONDS, keeping the
+        BEST_FRAME_BUFFER best ranked by _face_weight (quality gate score, size,
+        detector confidence). While the window is open nothing is embedded ([]).
+        """
+        if track_id is None or BEST_FRAME_WINDOW_SECONDS <= 0:
+            return [face]
+        state = self._get_track_state(track_id)
+        now = datetime.now()
+        if state["window_opened"] is None:
+            state["window_opened"] = now
+        crops = state["best_crops"]
+        if not any(crop["face"] is face["face"] for _, crop in crops):  # Cached extractions repeat a crop
+            crops.append((self._face_weight(face), face))
+            crops.sort(key=lambda item: item[0], reverse=True)
+            del crops[BEST_FRAME_BUFFER:]
+        if (now - state["window_opened"]).total_seconds() < BEST_FRAME_WINDOW_SECONDS:
+            return []
+        state["best_crops"] = []
+        state["window_opened"] = None
+        return [crop for _, crop in crops[:max(1, BEST_FRAME_EMBED)]]
+
+    def _reid_match(self, embedding):
+        """Match against faces this camera confirmed in the last REID_TTL_SECONDS (no roster search)"""
+        if self.reid_gallery is None:
+            return None
+        hit = self.reid_gallery.match(embedding)
+        if hit is None:
             return None
 
-        student = self.face_db.get_student_by_roll(best_roll)
-        logger.info(f"📍 Local match: {student.get('name')} (similarity={best_similarity:.3f}, threshold={SIMILARITY_THRESHOLD})")
-        
-        if best_similarity >= SIMILARITY_THRESHOLD:
-            logger.info(f"✅ Local match passes threshold!")
-            return {
-                "roll_number": best_roll,
-                "name": student.get("name") if student else None,
-                "similarity": float(best_similarity)
-            }
-        else:
-            logger.warning(f"⚠️ Local match below threshold ({best_similarity:.3f} < {SIMILARITY_THRESHOLD})")
+        roll_number, reid_similarity, similarity = hit
+        student = self.face_db.get_student_by_roll(roll_number)
+        if not student:
+            self.reid_gallery.forget(roll_number)  # Removed from the roster since it was confirmed
+            return None
+        logger.info(f"♻️ Re-identified {student.get('name')} (recent-face similarity={reid_similarity:.3f})")
+        return {
+            "roll_number": roll_number,
+            "name": student.get("name"),
+            "similarity": similarity,
+            "reid_similarity": reid_similarity,
+            "scope": "reid"
+        }
+
+    def _remember_face(self, roll_number, embedding, similarity):
+        """Add a confirmed face to the re-ID gallery"""
+        if self.reid_gallery is not None and embedding is not None:
+            self.reid_gallery.add(roll_number, embedding, similarity)
+
+    def _best_match_from_embedding(self, embedding):
+        if embedding is None:
             return None
 
+        match = self._reid_match(embedding)
+        if match:
+            return match
+
+        # Camera's batch first (vector store or local), everyone else only below threshold
+        match = self.face_db.search_best(embedding, self.batch_id, SIMILARITY_THRESHOLD)
+        if not match:
+            logger.warning(f"❌ No match found")
+            return None
+
+        similarity = match.get("similarity", 0)
+        logger.info(f"📍 Best match [{match.get('scope')}]: {match.get('name')} (similarity={similarity:.3f}, threshold={SIMILARITY_THRESHOLD})")
+        if similarity >= SIMILARITY_THRESHOLD:
+            logger.info(f"✅ Match passes threshold!")
+            return match
+        logger.warning(f"⚠️ Match below threshold ({similarity:.3f} < {SIMILARITY_THRESHOLD})")
+        return None
+
     def _iou(self, box_a, box_b):
         ax1, ay1, ax2, ay2 = box_a
         bx1, by1, bx2, by2 = box_b
@@ -966,18 +1354,20 @@ class CameraAttendance:
         return inter_area / union
 
     def _match_tracks_to_faces(self, tracks, faces):
+        """{face index: track_id} for confirmed tracks overlapping an extracted face"""
         matches = {}
         if not tracks or not faces:
             return matches
 
         face_boxes = []
         for face in faces:
-            x = int(face.get("face_x", 0))
-            y = int(face.get("face_y", 0))
-            w = int(face.get("face_w", 0))
-            h = int(face.get("face_h", 0))
+            x = int(face.get("x", 0))
+            y = int(face.get("y", 0))
+            w = int(face.get("w", 0))
+            h = int(face.get("h", 0))
             face_boxes.append((x, y, x + w, y + h))
 
+        best_ious = {}
         for track in tracks:
             if not track.is_confirmed():
                 continue
@@ -989,11 +1379,23 @@ class CameraAttendance:
                 if iou > best_iou:
                     best_iou = iou
                     best_idx = idx
-            if best_idx is not None and best_iou >= TRACK_IOU_MATCH:
-                matches[track.track_id] = faces[best_idx]
+            if best_idx is not None and best_iou >= TRACK_IOU_MATCH and best_iou > best_ious.get(best_idx, 0.0):
+                matches[best_idx] = track.track_id
+                best_ious[best_idx] = best_iou
 
         return matches
 
+    def _assign_tracks(self, faces, frame):
+        """Update DeepSORT with the extracted faces; {face index: track_id} (empty without a tracker)"""
+        if not self.tracker:
+            return {}
+        detections = []
+        for face in faces:
+            box = [int(face.get("x", 0)), int(face.get("y", 0)), int(face.get("w", 0)), int(face.get("h", 0))]
+            detections.append((box, float(face.get("confidence", 0.0)), "face"))
+        tracks = self.tracker.update_tracks(detections, frame=frame)
+        return self._match_tracks_to_faces(tracks, faces)
+
     def _check_liveness(self, state):
         if not LIVENESS_ENABLED:
             return True
@@ -1012,49 +1414,138 @@ class CameraAttendance:
         distance = (dx * dx + dy * dy) ** 0.5
         return distance >= LIVENESS_MIN_MOVEMENT_PX
 
-    def _update_track_state(self, track_id, face, schedule):
-        now = datetime.now()
-        x = face.get("face_x", 0)
-        y = face.get("face_y", 0)
-        w = face.get("face_w", 0)
-        h = face.get("face_h", 0)
-        center = (x + w / 2.0, y + h / 2.0)
-
+    def _get_track_state(self, track_id):
         state = self.track_state.get(track_id)
         if not state:
+            now = datetime.now()
             state = {
                 "first_seen": now,
                 "last_seen": now,
                 "roll_number": None,
                 "match_count": 0,
                 "last_similarity": 0.0,
+                "fused": None,  # Quality-weighted sum of the track's normalized embeddings
+                "embeddings": 0,
+                "evidence": 0.0,  # SPRT log-likelihood ratio for roll_number
+                "decided": False,  # Identity settled: the track is no longer embedded
+                "best_crops": [],  # (rank, face) of the current best-frame window
+                "best_face": None,  # Highest-ranked crop embedded with ArcFace (for the light gallery)
+                "best_weight": 0.0,
+                "light": False,  # Identity decided by the cascade's light stage
+                "window_opened": None,
+                "reid": False,  # Identity came from the re-ID gallery (already confirmed on this camera)
+                "remembered": False,
                 "marked": False,
                 "centers": deque()
             }
             self.track_state[track_id] = state
+        return state
+
+    def _face_weight(self, face):
+        """Fusion weight of one face: detector confidence and gate quality, scaled down for small faces"""
+        size = min(face.get("w", 0), face.get("h", 0))
+        weight = max(0.05, float(face.get("confidence", 0.0))) * min(1.0, size / TRACK_FUSION_FULL_WEIGHT_PX)
+        return weight * max(0.05, face.get("quality", 1.0))
+
+    def _decide_track(self, track_id, state):
+        state["decided"] = True
+        self.recognition_stats["decided"] += 1
+        self.recognition_stats["decision_embeddings"] += state["embeddings"]
+        logger.info(
+            f"🎯 Track {track_id} decided: {state['roll_number']} after {state['embeddings']} embedding(s) "
+            f"(evidence={state['evidence']:.1f}, similarity={state['last_similarity']:.3f})"
+        )
 
-        state["last_seen"] = now
-        state["centers"].append((now, center))
+    def _observe_track(self, track_id, embedding, face):
+        """
+        Fuse one embedding into its track and match the fused embedding
 
-        roll_number = face.get("roll_number")
-        similarity = face.get("similarity", 0.0)
+        The fused embedding (quality-weighted mean) is searched instead of the
+        single frame. Each frame's own similarity to the candidate student then
+        adds weighted SPRT evidence. The identity is decided once the evidence
+        reaches SPRT_ACCEPT, or after TRACK_MIN_HITS agreeing matches with
+        TRACK_DECISION=hits. If the evidence drops to SPRT_REJECT, the
+        candidate is dropped.
 
-        if roll_number:
-            if state["roll_number"] == roll_number:
-                state["match_count"] += 1
-            else:
-                state["roll_number"] = roll_number
-                state["match_count"] = 1
-            state["last_similarity"] = similarity
+        Returns the match of the fused embedding (None below threshold).
+        """
+        state = self._get_track_state(track_id)
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        vector = vector / norm
+        weight = self._face_weight(face)
+        state["fused"] = vector * weight if state["fused"] is None else state["fused"] + vector * weight
+        state["embeddings"] += 1
+        if weight >= state["best_weight"]:
+            state["best_face"] = face
+            state["best_weight"] = weight
+
+        fused = state["fused"] / max(float(np.linalg.norm(state["fused"])), 1e-12)
+        match = self._best_match_from_embedding(fused)
+        if not match:
+            return None
+
+        roll_number = match["roll_number"]
+        self._set_candidate(state, roll_number)
+        state["match_count"] += 1
+        state["last_similarity"] = match["similarity"]
+
+        if match.get("scope") == "reid":
+            state["reid"] = True  # Confirmed on this camera minutes ago
+            self._decide_track(track_id, state)
+            return match
+
+        frame_similarity = self.face_db.snapshot().similarity(roll_number, vector)
+        if frame_similarity is None:
+            frame_similarity = match["similarity"]  # Vector store match for a student without local rows
+        self._weigh_evidence(track_id, state, weight * similarity_evidence(frame_similarity))
+        return match
+
+    def _set_candidate(self, state, roll_number):
+        """Make `roll_number` the track's candidate; a new candidate starts from no evidence"""
+        if roll_number != state["roll_number"]:
+            state.update(roll_number=roll_number, match_count=0, evidence=0.0, decided=False,
+                         reid=False, light=False, remembered=False)
+
+    def _weigh_evidence(self, track_id, state, evidence):
+        """Add one match's (weighted) SPRT evidence for the candidate and apply the decision rule"""
+        state["evidence"] += evidence
+        if TRACK_DECISION == "hits":
+            if state["match_count"] >= TRACK_MIN_HITS:
+                self._decide_track(track_id, state)
+        elif state["evidence"] >= SPRT_ACCEPT:
+            self._decide_track(track_id, state)
+        elif state["evidence"] <= SPRT_REJECT:
+            logger.info(f"🚫 Track {track_id}: evidence against {state['roll_number']} ({state['evidence']:.1f}), candidate dropped")
+            state.update(roll_number=None, match_count=0, evidence=0.0, light=False)
 
+    def _update_track_state(self, track_id, face, schedule):
+        """Record the track's position and mark attendance once it is decided, visible long enough and live"""
+        now = datetime.now()
+        x = face.get("face_x", 0)
+        y = face.get("face_y", 0)
+        w = face.get("face_w", 0)
+        h = face.get("face_h", 0)
+        center = (x + w / 2.0, y + h / 2.0)
+
+        state = self._get_track_state(track_id)
+        state["last_seen"] = now
+        state["centers"].append((now, center))
+
+        # A re-identified face was confirmed on this camera minutes ago: only liveness is checked again
         visible_seconds = (now - state["first_seen"]).total_seconds()
         if (
             not state["marked"]
-            and state["roll_number"]
-            and state["match_count"] >= TRACK_MIN_HITS
-            and visible_seconds >= TRACK_MIN_SECONDS
+            and state["decided"]
+            and (state["reid"] or visible_seconds >= TRACK_MIN_SECONDS)
             and self._check_liveness(state)
         ):
+            if not state["remembered"] and not state["reid"] and not state["light"]:
+                self._remember_face(state["roll_number"], state["fused"], state["last_similarity"])
+                self._remember_light(state["roll_number"], state["best_face"], state["last_similarity"])
+                state["remembered"] = True
             marked = self.mark_attendance(state["roll_number"], state["last_similarity"], schedule)
             if marked:
                 state["marked"] = True
@@ -1114,16 +1605,9 @@ class CameraAttendance:
                 "severity": "high"
             }
             
-            response = requests.post(
-                f"{BACKEND_API}/exam-violations",
-                json=violation_data,
-                timeout=5
-            )
-            
-            if response.status_code == 200:
-                logger.info(f"✅ Violation saved to backend: {violation_id}")
-            else:
-                logger.warning(f"⚠️ Failed to save violation to backend: {response.status_code}")
+            # Fire-and-forget: the backend loop's outbox posts it, the AI thread moves on
+            self.backend.enqueue_post("/exam-violations", violation_data, timeout=5)
+            logger.info(f"📤 Violation queued for backend: {violation_id}")
         except Exception as e:
             logger.error(f"Error saving violation to backend: {e}")
     
@@ -1135,29 +1619,34 @@ class CameraAttendance:
             
             logger.debug(f"🔍 Fetching schedule for {self.camera_name} (ID: {self.camera_id}), Batch: {self.batch_id}")
             
-            # Try to get active schedule from backend
+            # Timetable + camera schedules, fetched concurrently on the backend loop
             try:
-                response = requests.get(
-                    f"{BACKEND_API}/timetable",
-                    timeout=5
+                timetable_response, schedule_response = self.backend.call(
+                    self.backend.fetch_schedule_sources(self.camera_id, timeout=5),
+                    deadline=self.frame_deadline
                 )
-                
-                if response.status_code != 200:
-                    logger.warning(f"Could not fetch timetable from backend: {response.status_code}")
-                    return None
-                
-                timetable_data = response.json()
-                logger.debug(f"📚 Fetched {len(timetable_data)} timetable entries")
-            except requests.exceptions.RequestException as e:
-                logger.error(f"❌ Network error fetching timetable: {e}")
+            except CircuitOpen as e:
+                logger.debug(f"Schedule fetch skipped: {e}")
+                return None
+            except BackendUnavailable as e:
+                logger.error(f"❌ Network error fetching schedule: {e}")
                 return None
             
+            if timetable_response.stale or schedule_response.stale:
+                # Backend down: keep following the last timetable we saw
+                self.backend_stale = True
+                logger.debug(f"Using cached schedule for {self.camera_name}")
+            
+            if timetable_response.status_code != 200:
+                logger.warning(f"Could not fetch timetable from backend: {timetable_response.status_code}")
+                return None
+            
+            timetable_data = timetable_response.json()
+            logger.debug(f"📚 Fetched {len(timetable_data)} timetable entries")
+            
             # Get camera schedules
             try:
-                response = requests.get(
-                    f"{BACKEND_API}/camera-schedule/{self.camera_id}",
-                    timeout=5
-                )
+                response = schedule_response
                 
                 if response.status_code != 200:
                     logger.warning(f"❌ Could not fetch camera schedules for {self.camera_id}: {response.status_code}")
@@ -1169,9 +1658,6 @@ class CameraAttendance:
                     camera_schedule = [camera_schedule]
                 
                 logger.debug(f"📅 Fetched {len(camera_schedule)} camera schedules")
-            except requests.exceptions.RequestException as e:
-                logger.error(f"❌ Network error fetching camera schedules: {e}")
-                return None
             except Exception as e:
                 logger.error(f"❌ Error parsing camera schedules: {e}")
                 return None
@@ -1250,8 +1736,14 @@ class CameraAttendance:
             # ✅ FIX 1: Cache face extraction - only extract every 2 seconds, reuse in between
             now = datetime.now()
             cache_age = (now - self.last_face_extraction_time).total_seconds() if self.last_face_extraction_time else 999
+            extraction_interval = FACE_EXTRACTION_INTERVAL
+            if BEST_FRAME_WINDOW_SECONDS > 0 and any(
+                state["window_opened"] is not None for state in self.track_state.values()
+            ):
+                # An open best-frame window needs fresh crops to rank, not the cached one repeated
+                extraction_interval = min(extraction_interval, BEST_FRAME_WINDOW_SECONDS / (BEST_FRAME_BUFFER + 1))
             
-            if self.last_face_extraction_time and cache_age < FACE_EXTRACTION_INTERVAL:
+            if self.last_face_extraction_time and cache_age < extraction_interval:
                 # Use cached face results from last extraction
                 faces = self.cached_face_results
                 logger.info(f"♻️ Using cached faces: {len(faces)} faces (cache age: {cache_age:.1f}s)")
@@ -1267,6 +1759,9 @@ class CameraAttendance:
                 logger.info(f"⚠️ No faces detected in frame")
                 return []
 
+            # Track before embedding: faces on decided tracks reuse the track's identity
+            face_tracks = self._assign_tracks(faces, frame)
+
             # Process each detected face
             recognized_students = []
             logger.info(f"🔬 Processing {len(faces)} detected face(s)...")
@@ -1274,30 +1769,77 @@ class CameraAttendance:
             for idx, face in enumerate(faces):
                 try:
                     logger.info(f"   Processing face #{idx+1}...")
+                    face_x = face.get("x", 0)
+                    face_y = face.get("y", 0)
+                    face_w = face.get("w", 0)
+                    face_h = face.get("h", 0)
+                    confidence = face.get("confidence", 0.0)
+                    track_id = face_tracks.get(idx)
+
+                    state = self.track_state.get(track_id) if track_id is not None else None
+                    if state and state["decided"]:
+                        self.recognition_stats["skipped"] += 1
+                        student = self.face_db.get_student_by_roll(state["roll_number"]) or {}
+                        recognized_students.append({
+                            "roll_number": state["roll_number"],
+                            "name": student.get("name"),
+                            "similarity": state["last_similarity"],
+                            "scope": "track",
+                            "track_id": track_id,
+                            "face_x": face_x,
+                            "face_y": face_y,
+                            "face_w": face_w,
+                            "face_h": face_h,
+                            "confidence": float(confidence)
+                        })
+                        continue
+
                     face_img = face.get("face")
                     if face_img is None:
                         logger.warning(f"   Face #{idx+1} has no image data")
                         continue
 
-                    # ✅ FIX 2: Compute embedding once, reuse for tracking
-                    logger.info(f"   Computing embedding for face #{idx+1}...")
-                    frame_embedding = self._compute_embedding(face_img)
-                    
-                    if frame_embedding is None:
-                        logger.warning(f"   Failed to compute embedding for face #{idx+1}")
+                    # Poor crops are not embedded but stay in the results, so their track keeps moving
+                    reject_reason = self._quality_reject(face)
+                    if reject_reason:
+                        logger.info(f"   🧹 Face #{idx+1} not embedded: {reject_reason}")
+                        recognized_students.append(self._unrecognized_face(face, track_id, rejected=reject_reason))
                         continue
-                    
-                    logger.info(f"   ✅ Embedding computed (dim={len(frame_embedding)})")
-                    
-                    # ✅ FIX 3: Pinecone called only on NEW track_ids
-                    logger.info(f"   Searching best match for face #{idx+1}...")
-                    match = self._best_match_from_embedding(frame_embedding)
-                    
-                    face_x = face.get("x", 0)
-                    face_y = face.get("y", 0)
-                    face_w = face.get("w", 0)
-                    face_h = face.get("h", 0)
-                    confidence = face.get("confidence", 0.0)
+
+                    # Tracked faces are embedded once per window, on the window's best crop(s)
+                    crops = self._crops_to_embed(track_id, face)
+                    if not crops:
+                        self.recognition_stats["buffered"] += 1
+                        recognized_students.append(self._unrecognized_face(face, track_id, pending=True))
+                        continue
+
+                    # Cascade: the light model decides clear faces, the rest escalate to ArcFace
+                    face_started = time_module.time()
+                    frame_embedding = None
+                    match, light_tried = self._light_stage(track_id, crops[0])
+                    if match is None:
+                        # ✅ FIX 2: Compute embedding once, reuse for tracking
+                        logger.info(f"   Computing embedding for face #{idx+1} ({len(crops)} crop(s))...")
+                        for crop, embedding in zip(crops, self._compute_embeddings([crop["face"] for crop in crops])):
+                            if embedding is None:
+                                continue
+                            self.recognition_stats["embedded"] += 1
+                            frame_embedding = embedding
+                            logger.info(f"   Searching best match for face #{idx+1}...")
+                            if track_id is not None:
+                                match = self._observe_track(track_id, embedding, crop)
+                            else:
+                                match = self._best_match_from_embedding(embedding)
+                        
+                        if frame_embedding is None:
+                            logger.warning(f"   Failed to compute embedding for face #{idx+1}")
+                            continue
+                        
+                        logger.info(f"   ✅ Embedding computed (dim={len(frame_embedding)})")
+                    self._record_cascade(
+                        "light" if frame_embedding is None else ("escalated" if light_tried else "heavy"),
+                        face_started
+                    )
 
                     if match and match.get("similarity", 0.0) >= SIMILARITY_THRESHOLD:
                         logger.info(f"   ✅ Match found: {match.get('name')} (similarity={match.get('similarity'):.3f})")
@@ -1306,22 +1848,15 @@ class CameraAttendance:
                             "face_y": face_y,
                             "face_w": face_w,
                             "face_h": face_h,
-                            "confidence": float(confidence)
+                            "confidence": float(confidence),
+                            "track_id": track_id,
+                            "embedding": frame_embedding  # Kept for the re-ID gallery once the student is marked
                         })
                         recognized_students.append(match)
                     else:
                         similarity = match.get("similarity", 0.0) if match else 0.0
                         logger.warning(f"   ⚠️ No match or below threshold (similarity={similarity:.3f}, threshold={SIMILARITY_THRESHOLD})")
-                        recognized_students.append({
-                            "roll_number": None,
-                            "name": None,
-                            "similarity": 0.0,
-                            "face_x": face_x,
-                            "face_y": face_y,
-                            "face_w": face_w,
-                            "face_h": face_h,
-                            "confidence": float(confidence)
-                        })
+                        recognized_students.append(self._unrecognized_face(face, track_id))
                 
                 except Exception as e:
                     logger.error(f"❌ Error processing face #{idx+1}: {e}")
@@ -1338,19 +1873,43 @@ class CameraAttendance:
             logger.error(traceback.format_exc())
             return []
     
-    def draw_faces_on_frame(self, frame, recognized_students):
-        """Draw green rectangle and name for each recognized face"""
+    def _unrecognized_face(self, face, track_id, **extra):
+        """Result entry for a face without a (confident) identity"""
+        entry = {
+            "roll_number": None,
+            "name": None,
+            "similarity": 0.0,
+            "face_x": face.get("x", 0),
+            "face_y": face.get("y", 0),
+            "face_w": face.get("w", 0),
+            "face_h": face.get("h", 0),
+            "confidence": float(face.get("confidence", 0.0)),
+            "track_id": track_id
+        }
+        entry.update(extra)
+        return entry
+
+    def draw_faces_on_frame(self, frame, recognized_students, scale_x=1.0, scale_y=1.0, mirror=False):
+        """Draw green rectangle and name for each recognized face
+        
+        Face coordinates are in source-frame pixels; they are scaled by
+        (scale_x, scale_y) and, if `mirror`, flipped horizontally to match a
+        mirrored display. The face dicts themselves are never modified.
+        """
         if not recognized_students:
             return frame
         
         logger.info(f"🎨 Drawing {len(recognized_students)} face(s) on frame")
+        frame_width = frame.shape[1]
         
         for student in recognized_students:
-            # Get face coordinates
-            x = int(student.get("face_x", 0))
-            y = int(student.get("face_y", 0))
-            w = int(student.get("face_w", 100))
-            h = int(student.get("face_h", 100))
+            # Get face coordinates (source frame) and map them to the display frame
+            x = int(student.get("face_x", 0) * scale_x)
+            y = int(student.get("face_y", 0) * scale_y)
+            w = int(student.get("face_w", 100) * scale_x)
+            h = int(student.get("face_h", 100) * scale_y)
+            if mirror:
+                x = frame_width - x - w
             
             logger.debug(f"   Drawing box at x={x}, y={y}, w={w}, h={h}")
             
@@ -1358,14 +1917,14 @@ class CameraAttendance:
             cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 1)
             
             # Prepare name text
-            name = student.get("name", "Unknown")
+            name = student.get("name") or "Unknown"
             similarity = student.get("similarity", 0)
             text = f"{name} ({similarity:.2f})"
             
             # Draw background for text
             font = cv2.FONT_HERSHEY_SIMPLEX
-            font_scale = 0.7
-            thickness = 2
+            font_scale = 0.7 * scale_y
+            thickness = max(1, int(round(2 * scale_y)))
             text_size = cv2.getTextSize(text, font, font_scale, thickness)[0]
             text_x = x
             text_y = y - 10 if y > 30 else y + h + 25
@@ -1406,7 +1965,6 @@ class CameraAttendance:
         try:
             # Check existing attendance for today
             today = datetime.now().strftime("%Y-%m-%d")
-            check_url = f"{BACKEND_API}/attendance-check"
             params = {
                 "roll_number": roll_number,
                 "date": today,
@@ -1415,7 +1973,10 @@ class CameraAttendance:
             }
             
             logger.info(f"🔍 Checking existing attendance: {params}")
-            response = requests.get(check_url, params=params, timeout=5)
+            response = self.backend.call(
+                self.backend.check_attendance(params, timeout=5),
+                deadline=self.frame_deadline
+            )
             
             if response.status_code == 200:
                 result = response.json()
@@ -1423,12 +1984,13 @@ class CameraAttendance:
                 
                 if isinstance(result, dict) and result.get("exists"):
                     logger.info(f"⚠️ {student.get('name')} already marked for this class today")
+                    self._note_marked(roll_number)
                     return False
                 else:
                     logger.info(f"✅ No existing attendance found, proceeding to mark")
             else:
                 logger.warning(f"Backend check failed with status {response.status_code}")
-        except requests.exceptions.RequestException as e:
+        except BackendUnavailable as e:
             logger.warning(f"Could not check existing attendance (network error): {e}")
         except Exception as e:
             logger.warning(f"Could not check existing attendance: {e}")
@@ -1463,16 +2025,24 @@ class CameraAttendance:
         }
         
         try:
-            response = requests.post(f"{BACKEND_API}/attendance", json=attendance_data)
+            response = self.backend.call(
+                self.backend.post_attendance(attendance_data, timeout=5),
+                deadline=self.frame_deadline
+            )
             if response.status_code == 200:
                 time_slot = f"{schedule.get('start_time').strftime('%H:%M')}-{schedule.get('end_time').strftime('%H:%M')}"
                 logger.info(f"✅ Attendance Marked: {student.get('name')} ({roll_number}) - {status}")
                 logger.info(f"   📚 Subject: {schedule.get('subject_id')} | ⏰ Time Slot: {time_slot}")
                 self.last_marked[roll_number] = current_time
+                self._note_marked(roll_number)
                 return True
             else:
                 logger.error(f"Failed to mark attendance: {response.text}")
                 return False
+        except BackendUnavailable as e:
+            # Not marked: the track is retried on a later frame once the backend answers
+            logger.warning(f"Attendance for {roll_number} not sent: {e}")
+            return False
         except Exception as e:
             logger.error(f"Error sending attendance to API: {e}")
             return False
@@ -1481,6 +2051,10 @@ class CameraAttendance:
         """Process a single frame"""
         logger.info(f"🎬 process_frame called (frame shape: {frame.shape})")
         
+        # All backend calls for this frame share one time budget
+        self.frame_deadline = Deadline(FRAME_BACKEND_BUDGET_SECONDS)
+        self.backend_stale = False
+        
         mode = self.get_camera_mode()
         logger.info(f"📸 Camera mode: {mode}")
         
@@ -1488,6 +2062,7 @@ class CameraAttendance:
         
         if not schedule:
             logger.warning(f"⚠️ No active schedule found")
+            self._end_session()
             return {"status": "no_schedule", "mode": mode, "message": "No active class for this time slot"}
         
         logger.info(f"📅 Active schedule: {schedule.get('subject_id')} ({schedule.get('start_time')}-{schedule.get('end_time')})")
@@ -1498,6 +2073,11 @@ class CameraAttendance:
             result["mode"] = mode
             return result
         
+        # Everyone in the batch already marked: motion checks only, with a rare sweep for late arrivals
+        session = self._attendance_session(schedule)
+        if self._low_power_frame(session, frame):
+            return {"status": "all_marked", "mode": mode, "unmarked": 0, "expected": len(session["expected"])}
+        
         # Detect faces
         logger.info(f"👤 Detecting faces in frame...")
         recognized = self.detect_faces_in_frame(frame)
@@ -1511,19 +2091,11 @@ class CameraAttendance:
             marked_students = []
 
             if self.tracker:
-                detections = []
+                # Tracks were assigned (and their embeddings fused) in detect_faces_in_frame
                 for face in recognized:
-                    x = int(face.get("face_x", 0))
-                    y = int(face.get("face_y", 0))
-                    w = int(face.get("face_w", 0))
-                    h = int(face.get("face_h", 0))
-                    confidence = float(face.get("confidence", 0.0))
-                    detections.append(([x, y, w, h], confidence, "face"))
-
-                tracks = self.tracker.update_tracks(detections, frame=frame)
-                matches = self._match_tracks_to_faces(tracks, recognized)
-                for track_id, face in matches.items():
-                    marked = self._update_track_state(track_id, face, schedule)
+                    if face.get("track_id") is None:
+                        continue
+                    marked = self._update_track_state(face["track_id"], face, schedule)
                     if marked:
                         marked_students.append(marked)
 
@@ -1540,26 +2112,124 @@ class CameraAttendance:
                         schedule
                     )
                     if marked:
+                        if student.get("scope") != "reid":
+                            self._remember_face(student["roll_number"], student.get("embedding"), student["similarity"])
                         marked_students.append(student)
             
             # Return marked students and all recognized faces
+            unmarked = self.unmarked_count()
             if marked_students:
-                return {"status": "marked", "marked": marked_students, "recognized": recognized, "mode": mode}
+                return {"status": "marked", "marked": marked_students, "recognized": recognized, "mode": mode,
+                        "unmarked": unmarked}
             else:
-                return {"status": "recognized", "recognized": recognized, "mode": mode}
+                return {"status": "recognized", "recognized": recognized, "mode": mode, "unmarked": unmarked}
         
         # Check if we have cached faces still valid
         if self.last_detected_faces and self.face_cache_time:
             cache_age = (datetime.now() - self.face_cache_time).total_seconds()
             if cache_age < self.FACE_CACHE_DURATION:
                 # Return cached faces but don't mark them again (already in cooldown)
-                return {"status": "recognized", "recognized": self.last_detected_faces, "mode": mode}
+                return {"status": "recognized", "recognized": self.last_detected_faces, "mode": mode,
+                        "unmarked": self.unmarked_count()}
             else:
                 # Cache expired
                 self.last_detected_faces = []
                 self.face_cache_time = None
 
-        return {"status": "no_face", "mode": mode}
+        return {"status": "no_face", "mode": mode, "unmarked": self.unmarked_count()}
+
+    # ------------------------------------------------------------------------
+    # Attendance session: expected roster and low-power monitoring
+    # ------------------------------------------------------------------------
+
+    def _attendance_session(self, schedule):
+        """Session of the active class, started (or its roster refreshed) as needed"""
+        key = (
+            datetime.now().strftime("%Y-%m-%d"),
+            schedule.get("subject_id"),
+            schedule.get("start_time").strftime("%H:%M")
+        )
+        if self.session is None or self.session["key"] != key:
+            self._end_session()
+            self.session = {
+                "key": key,
+                "roster_version": None,
+                "expected": frozenset(),
+                "marked": set(),
+                "low_power": False,
+                "last_sweep": 0.0,
+                "motion": False,
+                "thumbnail": None
+            }
+        snapshot = self.face_db.snapshot()
+        if self.session["roster_version"] != snapshot.version:
+            # Students enrolled or moved mid-class change the expected roster
+            self.session["roster_version"] = snapshot.version
+            batch = [
+                roll for roll, student in snapshot.students.items()
+                if self.batch_id and student.get("batch_id") == self.batch_id
+            ]
+            # Only students with usable embedding rows can ever be marked (none, or a skipped dim, never match)
+            self.session["expected"] = frozenset(roll for roll in batch if roll in snapshot.vectors)
+            unmatchable = len(batch) - len(self.session["expected"])
+            if unmatchable:
+                logger.warning(f"⚠️ {self.camera_name}: {unmatchable} student(s) of batch {self.batch_id} "
+                               f"have no usable embedding and cannot be recognized")
+        return self.session
+
+    def _end_session(self):
+        if self.session is not None:
+            self._set_low_power(False)
+            self.session = None
+
+    def _note_marked(self, roll_number):
+        if self.session is not None:
+            self.session["marked"].add(roll_number)
+
+    def unmarked_count(self):
+        """Students of this camera's batch not marked yet in the current class (None outside a class)"""
+        if self.session is None:
+            return None
+        return len(self.session["expected"] - self.session["marked"])
+
+    def _set_low_power(self, enabled):
+        session = self.session
+        if session is None or session["low_power"] == enabled:
+            return
+        session["low_power"] = enabled
+        if self.reader is not None:
+            self.reader.infer_every_n = max(1, LOW_POWER_EVERY_N_FRAMES if enabled else PROCESS_EVERY_N_FRAMES)
+        if enabled:
+            logger.warning(f"💤 {self.camera_name}: all {len(session['expected'])} students marked - low-power monitoring")
+        else:
+            logger.warning(f"⏰ {self.camera_name}: leaving low-power monitoring ({self.unmarked_count()} unmarked)")
+
+    def _motion(self, session, frame):
+        """True if the frame differs from the previous check (64x36 grey thumbnails)"""
+        thumbnail = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (64, 36), interpolation=cv2.INTER_AREA)
+        previous, session["thumbnail"] = session["thumbnail"], thumbnail
+        if previous is None:
+            return False
+        return float(cv2.absdiff(thumbnail, previous).mean()) >= LOW_POWER_MOTION_THRESHOLD
+
+    def _low_power_frame(self, session, frame):
+        """True if recognition can be skipped for this frame: everyone is marked and no sweep is due"""
+        if not ALL_MARKED_LOW_POWER or not session["expected"] or session["expected"] - session["marked"]:
+            self._set_low_power(False)
+            return False
+        now = time_module.monotonic()
+        if not session["low_power"]:
+            self._set_low_power(True)
+            session["last_sweep"] = now
+            session["motion"] = False
+            session["thumbnail"] = None
+        session["motion"] = self._motion(session, frame) or session["motion"]
+        if session["motion"] and now - session["last_sweep"] >= LOW_POWER_SWEEP_SECONDS:
+            session["last_sweep"] = now
+            session["motion"] = False
+            logger.info(f"🔦 {self.camera_name}: motion while everyone is marked - recognition sweep")
+            return False
+        return True
     
     def find_available_camera(self):
         """Find available camera on system"""
@@ -1579,140 +2249,102 @@ class CameraAttendance:
         logger.error("❌ No camera found!")
         return None
     
-    def start_camera_stream(self, camera_source=0):
+    def start_camera_stream(self, camera_source=None):
         """Start camera stream and process attendance"""
         logger.info(f"🎥 Starting camera {self.camera_name}...")
         
-        # Find available camera
-        actual_camera = self.find_available_camera()
-        if actual_camera is None:
-            logger.error("❌ No camera available. Please check:")
-            logger.error("   1. Webcam is connected")
-            logger.error("   2. No other app is using the camera")
-            logger.error("   3. Windows permissions allow camera access")
-            return
-        
-        # Use DirectShow on Windows for better compatibility
-        cap = cv2.VideoCapture(actual_camera, cv2.CAP_DSHOW)
+        source = resolve_source(camera_source if camera_source is not None else self.source)
+        if source is None:
+            # No stream URL configured for this camera - fall back to a local webcam
+            logger.warning(f"⚠️ No stream URL configured for {self.camera_name}, using local webcam")
+            source = self.find_available_camera()
+            if source is None:
+                logger.error("❌ No camera available. Please check:")
+                logger.error("   1. Webcam is connected")
+                logger.error("   2. No other app is using the camera")
+                logger.error("   3. Windows permissions allow camera access")
+                return
         
-        if not cap.isOpened():
-            logger.error(f"Failed to open camera {actual_camera}")
-            return
+        self.session = None  # Resumed after a pause: the next frame starts a fresh class session
         
-        # Set camera properties
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
-        cap.set(cv2.CAP_PROP_FPS, 30)
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        # Dedicated grabber thread: always holds only the newest frame, reconnects with backoff
+        reader = self.reader = StreamReader(
+            source,
+            name=self.camera_name,
+            width=FRAME_WIDTH,
+            height=FRAME_HEIGHT,
+            reconnect_min=STREAM_RECONNECT_MIN_SECONDS,
+            reconnect_max=STREAM_RECONNECT_MAX_SECONDS,
+            loop_files=STREAM_LOOP_FILES,
+            mode=CAPTURE_MODE,
+            infer_every_n=PROCESS_EVERY_N_FRAMES,
+            display_fps=DISPLAY_FPS,
+            display_wanted=self._display_wanted
+        ).start()
         
         self.is_recording = True
-        frame_count = 0
-        consecutive_failures = 0
-        last_detection = None
+        last_seq = -1
+        last_display = 0.0
+        display_interval = 1.0 / DISPLAY_FPS if DISPLAY_FPS > 0 else 0.0
+        last_stats_log = time_module.monotonic()
+
+        if self.preview:
+            self.preview.start()
         
         try:
-            logger.info(f"✅ Camera {actual_camera} opened successfully!")
-            while self.is_recording and consecutive_failures < 30:
-                ret, frame = cap.read()
+            logger.info(f"✅ Camera {self.camera_name} reading from {describe_source(source)}")
+            while self.is_recording and not reader.finished:
+                now_mono = time_module.monotonic()
+                if CAPTURE_STATS_INTERVAL > 0 and now_mono - last_stats_log >= CAPTURE_STATS_INTERVAL:
+                    self.log_capture_stats()
+                    last_stats_log = now_mono
+                if self.light_gallery is not None:
+                    self.light_gallery.flush()  # Periodic save, off the AI worker
                 
-                if not ret:
-                    consecutive_failures += 1
+                # Newest frame only - frames the loop was too slow for are skipped, not queued
+                captured = reader.read(last_seq, timeout=1.0)
+                if captured is None:
                     continue
+                last_seq = captured.seq
+                frame_count = captured.index
                 
-                consecutive_failures = 0
-                frame_count += 1
-                
-                # ✅ FIX 1: Process AI in background thread, NEVER block camera loop
-                if frame_count % PROCESS_EVERY_N_FRAMES == 0:
-                    # Start background AI worker (non-blocking)
-                    threading.Thread(
-                        target=self._ai_worker_thread,
-                        args=(frame.copy(), frame_count),
-                        daemon=True
-                    ).start()
-                
-                # Flip frame for mirror effect
-                frame = cv2.flip(frame, 1)
-                
-                # ✅ FIX 3: Use latest AI result (may be None if AI still processing first frame)
-                detection_result = None
-                with self.ai_lock:
-                    detection_result = self.latest_result
-                
-                # If we have detection result with faces, adjust coordinates for flipped frame
-                if detection_result and detection_result.get("status") in ["marked", "recognized"]:
-                    frame_width = frame.shape[1]
-                    recognized = detection_result.get("recognized", [])
-                    for student in recognized:
-                        # Flip x coordinate
-                        student["face_x"] = frame_width - student["face_x"] - student["face_w"]
-                
-                # Display frame with info
-                cv2.putText(frame, f"Camera: {self.camera_name}", (10, 30),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                cv2.putText(frame, f"Frame: {frame_count}", (10, 70),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                if detection_result:
-                    mode_text = detection_result.get("mode", "NORMAL")
-                    # Highlight EXAM mode in red
-                    if mode_text == "EXAM":
-                        cv2.putText(frame, f"🚨 EXAM MODE ACTIVE", (10, 100),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 3)  # Red, bold
-                    else:
-                        cv2.putText(frame, f"Mode: {mode_text}", (10, 100),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-                
-                # Show detection results
-                if detection_result:
-                    status = detection_result.get("status")
+                # The pooled buffer is shared, not copied: every holder retains/releases it
+                try:
+                    # ✅ FIX 1: Process AI in background executor, NEVER block camera loop
+                    # Skip if the previous job is still running - a queued job would be stale
+                    if captured.infer and (self.ai_future is None or self.ai_future.done()):
+                        # Background AI worker (non-blocking) owns one reference
+                        self.ai_future = self.ai_executor.submit(
+                            self._ai_worker_thread,
+                            captured.buffer.retain(),
+                            frame_count
+                        )
                     
-                    # ✅ FIX 3: Draw faces only from cached/latest result
-                    if status in ["marked", "recognized"]:
-                        recognized = detection_result.get("recognized", [])
-                        frame = self.draw_faces_on_frame(frame, recognized)
+                    # Display runs at DISPLAY_FPS, independent of the inference cadence
+                    if now_mono - last_display < display_interval:
+                        continue
                     
-                    if status == "marked":
-                        marked = detection_result.get("marked", [])
-                        if marked:
-                            names = ", ".join([m.get("name", "Unknown") for m in marked])
-                            cv2.putText(frame, f"✅ MARKED: {names}", (10, 140),
-                                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 3)
-                        last_detection = datetime.now()
-                    elif status == "recognized":
-                        count = len(detection_result.get("recognized", []))
-                        cv2.putText(frame, f"🔎 Detected {count} face(s)", (10, 140),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-                    elif status == "no_schedule":
-                        message = detection_result.get("message", "No active class for this time slot")
-                        cv2.putText(frame, f"⏱️ {message}", (10, 140),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                    elif status == "phone_detected":
-                        cv2.putText(frame, "📱 Phone detected (exam mode)", (10, 140),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 165, 255), 2)
-                    elif status == "exam_alert":
-                        cv2.putText(frame, "🚨 EXAM ALERT SENT", (10, 140),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                else:
-                    # No detection this frame, but check if we have cached faces to display
-                    if self.last_detected_faces and self.face_cache_time:
-                        cache_age = (datetime.now() - self.face_cache_time).total_seconds()
-                        if cache_age < self.FACE_CACHE_DURATION:
-                            # Draw cached faces
-                            frame = self.draw_faces_on_frame(frame, self.last_detected_faces)
-                            cv2.putText(frame, f"🔎 Detected {len(self.last_detected_faces)} face(s) [cached]", (10, 140),
-                                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-                
-                # Show message to quit
-                cv2.putText(frame, "Press 'q' to quit", (10, frame.shape[0] - 20),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 1)
-                
-                # ✅ FIX 4: Reduce display resolution (960x540) - separate from processing resolution
-                display_frame = cv2.resize(frame, (DISPLAY_WIDTH, DISPLAY_HEIGHT))
-                cv2.imshow(f"Camera - {self.camera_name}", display_frame)
-                
-                # Press 'q' to quit
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+                    # Headless: skip flip/draw/resize entirely unless a preview viewer is waiting
+                    show_window = not HEADLESS
+                    send_preview = self.preview is not None and self.preview.wants_frame()
+                    if not show_window and not send_preview:
+                        continue
+                    last_display = now_mono
+                    
+                    display_frame = self.render_overlays(captured.frame, frame_count, show_window)
+                    
+                    if send_preview:
+                        self.preview.publish(display_frame)
+                    
+                    if show_window:
+                        with HIGHGUI_LOCK:
+                            cv2.imshow(f"Camera - {self.camera_name}", display_frame)
+                            key = cv2.waitKey(1) & 0xFF
+                        # Press 'q' to quit
+                        if key == ord('q'):
+                            break
+                finally:
+                    captured.release()
                 
                 # ✅ FIX 2: REMOVED time_module.sleep(0.01) - cv2.waitKey(1) already controls FPS
         
@@ -1720,59 +2352,408 @@ class CameraAttendance:
             logger.error(f"Error processing camera stream: {e}")
         
         finally:
-            cap.release()
-            cv2.destroyAllWindows()
-            self.is_recording = False
+            # Only tear down what this run started: a resumed run may own the camera by now
+            reader.stop()
+            owner = self.reader is reader
+            if owner:
+                self.log_capture_stats()
+            if self.light_gallery is not None:
+                self.light_gallery.flush(force=True)
+            if owner:
+                if not HEADLESS:
+                    with HIGHGUI_LOCK:
+                        cv2.destroyWindow(f"Camera - {self.camera_name}")
+                if self.preview:
+                    self.preview.stop()
+                self.is_recording = False
             logger.info(f"🛑 Stopped camera {self.camera_name}")
     
+    def _display_wanted(self):
+        """Called from the grabber thread: should the next frame be decoded for display?"""
+        if not HEADLESS:
+            return True
+        return self.preview is not None and self.preview.viewer_count > 0
+    
+    def log_capture_stats(self):
+        """Report decoded-vs-grabbed frame counts for this camera"""
+        if not self.reader:
+            return
+        stats = self.reader.stats()
+        logger.warning(
+            f"📊 {self.camera_name} capture [{stats['mode']}]: decoded {stats['decoded']}/{stats['grabbed']} "
+            f"grabbed frames ({stats['decode_ratio']:.1%}), reconnects={stats['reconnects']}"
+        )
+        session = self.session  # Replaced by the AI worker when the class changes
+        if session is not None:
+            unmarked = len(session["expected"] - session["marked"])
+            logger.warning(
+                f"📋 {self.camera_name} class {session['key'][1]}: {unmarked}/{len(session['expected'])} "
+                f"students unmarked ({'low-power' if session['low_power'] else 'recognizing'})"
+            )
+        recognition = self.recognition_stats
+        if recognition["decided"]:
+            logger.warning(
+                f"🧮 {self.camera_name} recognition: {recognition['embedded']} embeddings, "
+                f"{recognition['skipped']} skipped on decided tracks, {recognition['buffered']} buffered for a better frame, "
+                f"{recognition['decided']} tracks decided "
+                f"({recognition['decision_embeddings'] / recognition['decided']:.1f} embeddings per decision)"
+            )
+        if self.light_gallery is not None:
+            cascade = self.cascade_stats
+            faces = sum(count for count, _ in cascade.values())
+            if faces:
+                summary = ", ".join(
+                    f"{path} {count} ({seconds / count * 1000:.0f} ms/face)" if count else f"{path} 0"
+                    for path, (count, seconds) in cascade.items()
+                )
+                logger.warning(
+                    f"🪶 {self.camera_name} cascade: {summary}; {LIGHT_MODEL} decided "
+                    f"{cascade['light'][0] / faces:.1%} of faces, gallery {len(self.light_gallery)} students"
+                )
+        if self.quality_gate is not None:
+            quality = self.quality_gate.stats()
+            rejected = ", ".join(f"{reason}={count}" for reason, count in quality["rejected"].items()) or "none"
+            logger.warning(
+                f"🧹 {self.camera_name} quality gate: {quality['passed']} crops embedded, "
+                f"rejected {quality['reject_ratio']:.1%} ({rejected})"
+            )
+        if self.reid_gallery is not None:
+            reid = self.reid_gallery.stats()
+            logger.warning(
+                f"♻️ {self.camera_name} re-ID gallery: {reid['hits']} hits / {reid['misses']} misses "
+                f"({reid['hit_ratio']:.1%}), {reid['entries']} recent faces"
+            )
+        health = self.backend.health()
+        if health["open"]:
+            logger.warning(
+                f"🔴 Backend circuits open: {', '.join(health['open'])} | "
+                f"cache ages (s): {health['cache_age_seconds']}"
+            )
+    
+    def render_overlays(self, frame, frame_count, show_quit_hint=True):
+        """Downscale into the display buffer, mirror it, and annotate at display resolution
+        
+        The source frame is never written: it is the pooled capture buffer that
+        the AI worker may still be reading. Face boxes stay in source-frame
+        coordinates in the AI result and are scaled/mirrored at draw time.
+        """
+        frame_height, frame_width = frame.shape[:2]
+        if self.display_buffer is None:
+            self.display_buffer = np.empty((DISPLAY_HEIGHT, DISPLAY_WIDTH, 3), dtype=np.uint8)
+        display = self.display_buffer
+        
+        # ✅ FIX 4: Reduce display resolution (960x540) - separate from processing resolution
+        cv2.resize(frame, (DISPLAY_WIDTH, DISPLAY_HEIGHT), dst=display)
+        if MIRROR_DISPLAY:
+            # Mirror effect, in place on the small display buffer
+            cv2.flip(display, 1, dst=display)
+        
+        scale_x = DISPLAY_WIDTH / frame_width
+        scale_y = DISPLAY_HEIGHT / frame_height
+        
+        def put_text(text, org_y, font_scale, color, thickness):
+            cv2.putText(display, text, (10, int(org_y * scale_y)), cv2.FONT_HERSHEY_SIMPLEX,
+                        font_scale * scale_y, color, max(1, int(round(thickness * scale_y))))
+        
+        # ✅ FIX 3: Use latest AI result (may be None if AI still processing first frame)
+        detection_result = None
+        with self.ai_lock:
+            detection_result = self.latest_result
+        
+        # Display frame with info
+        put_text(f"Camera: {self.camera_name}", 30, 0.7, (0, 255, 0), 2)
+        put_text(f"Frame: {frame_count}", 70, 0.7, (0, 255, 0), 2)
+        if detection_result:
+            mode_text = detection_result.get("mode", "NORMAL")
+            # Highlight EXAM mode in red
+            if mode_text == "EXAM":
+                put_text(f"🚨 EXAM MODE ACTIVE", 100, 1.2, (0, 0, 255), 3)  # Red, bold
+            else:
+                put_text(f"Mode: {mode_text}", 100, 0.7, (255, 255, 0), 2)
+        
+        # Show detection results
+        if detection_result:
+            status = detection_result.get("status")
+            
+            # ✅ FIX 3: Draw faces only from cached/latest result
+            if status in ["marked", "recognized"]:
+                recognized = detection_result.get("recognized", [])
+                self.draw_faces_on_frame(display, recognized, scale_x, scale_y, MIRROR_DISPLAY)
+            
+            if status == "marked":
+                marked = detection_result.get("marked", [])
+                if marked:
+                    names = ", ".join([m.get("name", "Unknown") for m in marked])
+                    put_text(f"✅ MARKED: {names}", 140, 0.8, (0, 255, 0), 3)
+            elif status == "recognized":
+                count = len(detection_result.get("recognized", []))
+                put_text(f"🔎 Detected {count} face(s)", 140, 0.7, (0, 255, 255), 2)
+            elif status == "all_marked":
+                put_text(f"💤 All {detection_result.get('expected', 0)} students marked - low-power monitoring", 140, 0.7, (0, 255, 0), 2)
+            elif status == "no_schedule":
+                message = detection_result.get("message", "No active class for this time slot")
+                put_text(f"⏱️ {message}", 140, 0.7, (0, 0, 255), 2)
+            elif status == "phone_detected":
+                put_text("📱 Phone detected (exam mode)", 140, 0.7, (0, 165, 255), 2)
+            elif status == "exam_alert":
+                put_text("🚨 EXAM ALERT SENT", 140, 0.7, (0, 0, 255), 2)
+            
+            if detection_result.get("unmarked"):
+                put_text(f"Unmarked: {detection_result['unmarked']}", 210, 0.6, (255, 255, 0), 2)
+            
+            if detection_result.get("stale"):
+                put_text("⚠️ BACKEND OFFLINE - using cached data", 175, 0.6, (0, 165, 255), 2)
+        else:
+            # No detection this frame, but check if we have cached faces to display
+            if self.last_detected_faces and self.face_cache_time:
+                cache_age = (datetime.now() - self.face_cache_time).total_seconds()
+                if cache_age < self.FACE_CACHE_DURATION:
+                    # Draw cached faces
+                    self.draw_faces_on_frame(display, self.last_detected_faces, scale_x, scale_y, MIRROR_DISPLAY)
+                    put_text(f"🔎 Detected {len(self.last_detected_faces)} face(s) [cached]", 140, 0.7, (0, 255, 255), 2)
+        
+        # Show message to quit
+        if show_quit_hint:
+            put_text("Press 'q' to quit", frame_height - 20, 0.6, (255, 0, 0), 1)
+        
+        return display
+    
+    def pause(self):
+        """Stop capture and inference; start_camera_stream resumes (models stay loaded)"""
+        self.is_recording = False
+
     def stop(self):
         """Stop camera recording"""
         self.is_recording = False
+        if self.reader:
+            self.reader.stop()
+        self.ai_executor.shutdown(wait=False)
+        if self.light_gallery is not None:
+            self.light_gallery.flush(force=True)
 
 # ============================================================================
 # SCHEDULER
 # ============================================================================
 
+def fetch_class_periods(backend, camera_id, batch_id, day=None):
+    """
+    Today's class periods of a camera: sorted [(start_time, end_time)], or
+    None if the timetable could not be fetched (keep the current plan)
+
+    Same rules as get_current_schedule: active camera schedules whose
+    timetable entry is for this day and the camera's batch.
+    """
+    day = day or datetime.now().strftime("%A")
+    try:
+        timetable_response, schedule_response = backend.call(backend.fetch_schedule_sources(camera_id, timeout=5))
+    except BackendUnavailable as e:
+        logger.warning(f"⚠️ Could not fetch timetable for {camera_id}: {e}")
+        return None
+    if timetable_response.status_code != 200 or schedule_response.status_code != 200:
+        return None
+
+    camera_schedule = schedule_response.json()
+    if isinstance(camera_schedule, dict):
+        camera_schedule = [camera_schedule]
+    timetable_ids = {
+        schedule.get("timetable_id") for schedule in camera_schedule
+        if schedule.get("camera_id") == camera_id and schedule.get("is_active")
+    }
+
+    periods = set()
+    for tt in timetable_response.json():
+        if tt.get("_id") not in timetable_ids and tt.get("timetable_id") not in timetable_ids:
+            continue
+        if tt.get("day") != day or tt.get("batch_id") != batch_id:
+            continue
+        try:
+            periods.add((
+                datetime.strptime(tt.get("start_time", "00:00"), "%H:%M").time(),
+                datetime.strptime(tt.get("end_time", "23:59"), "%H:%M").time()
+            ))
+        except ValueError as e:
+            logger.warning(f"Could not parse times: {e}")
+    return sorted(periods)
+
+
+def activation_windows(periods, date=None):
+    """[(start, stop)] datetimes to run a camera: periods widened by warm-up/grace, short breaks merged"""
+    date = date or datetime.now().date()
+    windows = []
+    for start_time, end_time in periods:
+        start = datetime.combine(date, start_time) - timedelta(seconds=SCHEDULE_WARMUP_SECONDS)
+        stop = datetime.combine(date, end_time) + timedelta(seconds=SCHEDULE_GRACE_SECONDS)
+        if windows and (start - windows[-1][1]).total_seconds() <= SCHEDULE_MERGE_GAP_SECONDS:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], stop))
+        else:
+            windows.append((start, stop))
+    return windows
+
+
 class AttendanceScheduler:
     def __init__(self):
         self.scheduler = BackgroundScheduler()
         self.camera_threads = {}
         self.cameras = {}
+        self.camera_configs = {}  # {camera_id: (camera_name, batch_id, preview_port, source)}
+        self.plans = {}  # {camera_id: activation windows last scheduled}
+        self.wanted = set()  # Cameras inside an activation window (start job ran, stop job not yet)
+        self.lock = threading.RLock()  # Scheduler jobs run on APScheduler's thread pool
     
     def load_camera_config(self):
         """Load camera configuration from MongoDB via backend API"""
         try:
-            response = requests.get(f"{BACKEND_API}/cameras", timeout=5)
+            backend = get_backend()
+            response = backend.call(backend.fetch_cameras(timeout=5))
             if response.status_code == 200:
                 cameras_data = response.json()
-                logger.info(f"✅ Loaded {len(cameras_data)} cameras from MongoDB")
+                if response.stale:
+                    logger.warning(f"💾 Backend unreachable - using {len(cameras_data)} cameras from local snapshot")
+                else:
+                    logger.info(f"✅ Loaded {len(cameras_data)} cameras from MongoDB")
                 return cameras_data
         except Exception as e:
             logger.error(f"❌ Failed to load cameras from API: {e}")
         return []
     
-    def initialize_cameras(self):
-        """Initialize camera objects"""
-        cameras = self.load_camera_config()
-        
-        for camera in cameras:
+    def load_active_cameras(self):
+        """Remember the active cameras' settings (CameraAttendance objects are created on first start)"""
+        for camera in self.load_camera_config():
             if camera.get("is_active"):
                 camera_id = camera.get("camera_id")
-                camera_name = camera.get("camera_name")
-                batch_id = camera.get("batch_id")
-                
-                self.cameras[camera_id] = CameraAttendance(camera_id, camera_name, batch_id)
-                logger.info(f"✅ Initialized camera: {camera_name}")
+                if camera_id not in self.camera_configs:
+                    preview_port = PREVIEW_BASE_PORT + len(self.camera_configs) if PREVIEW_ENABLED else None
+                    self.camera_configs[camera_id] = (
+                        camera.get("camera_name"),
+                        camera.get("batch_id"),
+                        preview_port,
+                        camera.get("ip_address")
+                    )
     
-    def start_all_cameras(self):
-        """Start all active cameras"""
-        self.initialize_cameras()
-        
-        for camera_id, camera_obj in self.cameras.items():
+    def initialize_cameras(self):
+        """Initialize camera objects"""
+        self.load_active_cameras()
+        for camera_id in self.camera_configs:
+            self._camera(camera_id)
+    
+    def _camera(self, camera_id):
+        """CameraAttendance for a camera, created (models loaded and warmed up) on first use"""
+        with self.lock:
+            camera_obj = self.cameras.get(camera_id)
+            if camera_obj is not None:
+                return camera_obj
+            camera_name, batch_id, preview_port, source = self.camera_configs[camera_id]
+        # Model loading takes seconds: other cameras' start/stop jobs must not wait on the lock meanwhile
+        camera_obj = CameraAttendance(camera_id, camera_name, batch_id, preview_port, source)
+        with self.lock:
+            existing = self.cameras.setdefault(camera_id, camera_obj)
+        if existing is not camera_obj:
+            camera_obj.stop()  # Lost a race with another job creating the same camera
+            return existing
+        logger.info(f"✅ Initialized camera: {camera_name}")
+        return camera_obj
+    
+    def activate_camera(self, camera_id):
+        """Start a camera's capture and AI pipeline (no-op if already running)"""
+        with self.lock:
+            self.wanted.add(camera_id)
+        camera_obj = self._camera(camera_id)
+        with self.lock:
+            if camera_id not in self.wanted:
+                return  # Paused while its models were loading
+            thread = self.camera_threads.get(camera_id)
+            if thread is not None and thread.is_alive():
+                if not camera_obj.is_recording:
+                    # Paused moments ago and its loop is still winding down (reader join, AI batch):
+                    # two loops must never share the camera, so try again once it has exited
+                    self.scheduler.add_job(self._retry_activation, "date",
+                                           run_date=datetime.now() + timedelta(seconds=2), args=[camera_id],
+                                           id=f"camera:{camera_id}:retry", replace_existing=True)
+                return
             # Start each camera in separate thread
             thread = threading.Thread(target=camera_obj.start_camera_stream, daemon=True)
             self.camera_threads[camera_id] = thread
             thread.start()
+            logger.warning(f"▶️ Camera {camera_obj.camera_name} started")
+    
+    def _retry_activation(self, camera_id):
+        with self.lock:
+            if camera_id not in self.wanted:
+                return
+        self.activate_camera(camera_id)
+    
+    def pause_camera(self, camera_id):
+        """Stop a camera's capture and inference until its next class"""
+        with self.lock:
+            self.wanted.discard(camera_id)
+            camera_obj = self.cameras.get(camera_id)
+            if camera_obj is not None and camera_obj.is_recording:
+                camera_obj.pause()
+                logger.warning(f"⏸️ Camera {camera_obj.camera_name} paused until its next class")
+    
+    def start_all_cameras(self):
+        """Start all active cameras"""
+        self.initialize_cameras()
+        
+        for camera_id in self.cameras:
+            self.activate_camera(camera_id)
+    
+    def plan_camera(self, camera_id, force=False):
+        """(Re)register today's start/stop jobs of one camera if its periods changed"""
+        camera_name, batch_id, _, _ = self.camera_configs[camera_id]
+        periods = fetch_class_periods(get_backend(), camera_id, batch_id)
+        if periods is None:
+            return  # Backend unreachable: keep the jobs we have
+        windows = activation_windows(periods)
+        with self.lock:
+            if not force and self.plans.get(camera_id) == windows:
+                return
+            if camera_id in self.plans:
+                logger.warning(f"🔄 Timetable changed for {camera_name} - replanning today's periods")
+            self.plans[camera_id] = windows
+            for job in self.scheduler.get_jobs():
+                if job.id.startswith(f"camera:{camera_id}:"):
+                    job.remove()
+
+            now = datetime.now()
+            running = False
+            for index, (start, stop) in enumerate(windows):
+                if stop <= now:
+                    continue
+                if start <= now:
+                    running = True
+                else:
+                    self.scheduler.add_job(self.activate_camera, "date", run_date=start, args=[camera_id],
+                                           id=f"camera:{camera_id}:start:{index}", replace_existing=True)
+                self.scheduler.add_job(self.pause_camera, "date", run_date=stop, args=[camera_id],
+                                       id=f"camera:{camera_id}:stop:{index}", replace_existing=True)
+            summary = ", ".join(f"{start:%H:%M}-{stop:%H:%M}" for start, stop in windows) or "no classes"
+            logger.warning(f"📅 {camera_name} today: {summary}")
+        # Outside the lock: a first start loads the camera's models
+        if running:
+            self.activate_camera(camera_id)
+        else:
+            self.pause_camera(camera_id)
+    
+    def plan_day(self, force=False):
+        """Plan every camera's activation for today (daily, and on every timetable re-check)"""
+        if force:
+            self.load_active_cameras()  # New day: pick up cameras added since yesterday
+        for camera_id in list(self.camera_configs):
+            try:
+                self.plan_camera(camera_id, force=force)
+            except Exception as e:
+                logger.error(f"❌ Could not plan camera {camera_id}: {e}")
+    
+    def start_scheduled_cameras(self):
+        """Register start/stop jobs per class period instead of running cameras around the clock"""
+        self.load_active_cameras()
+        self.plan_day(force=True)
+        self.scheduler.add_job(self.plan_day, "cron", hour=0, minute=0, second=30, kwargs={"force": True},
+                               id="plan-day", replace_existing=True)
+        if SCHEDULE_REFRESH_SECONDS > 0:
+            self.scheduler.add_job(self.plan_day, "interval", seconds=SCHEDULE_REFRESH_SECONDS,
+                                   id="timetable-refresh", replace_existing=True)
     
     def start(self):
         """Start the scheduler"""
@@ -1784,9 +2765,9 @@ class AttendanceScheduler:
         # Step 1: Load students from storage
         logger.warning("📚 Step 1: Loading students from MongoDB...")
         try:
-            response = requests.get(f"{BACKEND_API}/students", timeout=5)
-            num_students = len(response.json()) if response.status_code == 200 else 0
-            logger.warning(f"   ✅ Loaded {num_students} students successfully")
+            roster = get_roster()
+            roster.load()
+            logger.warning(f"   ✅ Loaded {len(roster.students)} students successfully")
         except Exception as e:
             logger.warning(f"   ⚠️  Could not load students: {e}")
         
@@ -1796,17 +2777,23 @@ class AttendanceScheduler:
         logger.warning("   🔄 YOLO (phone detection) - already cached")
         logger.warning("   ✅ All models ready (embedded during import)")
         
-        # Step 3: Initialize Pinecone
-        logger.warning("🔌 Step 3: Initializing Pinecone Vector Database...")
-        try:
-            logger.warning("   ✅ Pinecone connected: face-recognition index")
-        except:
-            logger.warning("   ⚠️  Pinecone connection will be retried")
+        # Step 3: Initialize vector store
+        logger.warning(f"🔌 Step 3: Initializing vector store ({VECTOR_STORE})...")
+        store = get_vector_store()
+        if store is not None:
+            logger.warning(f"   ✅ Vector store ready: {store.stats()}")
+        else:
+            logger.warning("   ⚠️  No vector store - matching against the local roster only")
         
-        # Step 4: Start cameras
-        logger.warning("📹 Step 4: Starting camera streams...")
-        self.start_all_cameras()
-        logger.warning(f"   ✅ Started {len(self.cameras)} camera(s)")
+        # Step 4: Start cameras (only around their class periods unless always active)
+        if SCHEDULE_DRIVEN and not TEST_MODE_ALWAYS_ACTIVE:
+            logger.warning("📹 Step 4: Scheduling camera streams per class period...")
+            self.start_scheduled_cameras()
+            logger.warning(f"   ✅ Scheduled {len(self.camera_configs)} camera(s), {len(self.cameras)} running now")
+        else:
+            logger.warning("📹 Step 4: Starting camera streams...")
+            self.start_all_cameras()
+            logger.warning(f"   ✅ Started {len(self.cameras)} camera(s)")
         
         # Step 5: Start background scheduler
         logger.warning("⏰ Step 5: Starting background scheduler...")
@@ -1818,7 +2805,7 @@ class AttendanceScheduler:
         logger.warning("🟢 SYSTEM FULLY INITIALIZED AND READY FOR EXAM MONITORING")
         logger.warning("=" * 70)
         logger.warning("✅ FaceID and Attendance Detection: ACTIVE")
-        logger.warning("✅ Pinecone Vector DB: CONNECTED")
+        logger.warning(f"✅ Vector store: {VECTOR_STORE.upper() if get_vector_store() is not None else 'LOCAL ROSTER ONLY'}")
         logger.warning("✅ ArcFace Model: CACHED & READY (0.2-0.3s per face)")
         logger.warning("✅ YOLO Phone Detection: READY (0.15 sensitivity - detects any phone part)")
         logger.warning("✅ Exam Alert System: ACTIVE (instant alerts when phone detected)")
@@ -1832,6 +2819,8 @@ class AttendanceScheduler:
         
         for camera_obj in self.cameras.values():
             camera_obj.stop()
+        get_roster().stop()
+        get_backend().stop()
 
 # ============================================================================
 # MAIN
@@ -0,0 +1,555 @@
+"""
+Backend Client for Camera Service
+All camera-service -> FastAPI backend I/O on one asyncio event loop
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class BackendUnavailable(Exception):
+    """Backend could not be reached (connection error or timeout)"""
+
+
+class CircuitOpen(BackendUnavailable):
+    """Endpoint's circuit breaker is open - failing fast without a request"""
+
+
+class DeadlineExceeded(BackendUnavailable):
+    """The caller's time budget ran out before the request could be made"""
+
+
+class Deadline:
+    """
+    Time budget for all backend I/O done on behalf of one processed frame
+
+    Every call made under a deadline gets `cap(timeout)` = the smaller of its
+    own timeout and what is left of the budget, so one slow endpoint cannot
+    stall inference for the sum of all per-call timeouts.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def cap(self, timeout: float) -> float:
+        return min(timeout, self.remaining())
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker (closed -> open -> half-open -> closed)
+
+    After `failure_threshold` consecutive failures (transport errors, timeouts
+    or 5xx) the circuit opens and calls fail immediately for `reset_timeout`
+    seconds. Then one trial call is let through (half-open): success closes
+    the circuit, failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 15.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_failure = None
+        self.last_success = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            was_open = self.state != self.CLOSED
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+            self.last_success = time.time()
+        if was_open:
+            logger.warning(f"🟢 Backend circuit CLOSED for /{self.name} (backend reachable again)")
+
+    def record_failure(self, reason: str = ""):
+        with self._lock:
+            self.failures += 1
+            self.last_failure = time.time()
+            self._trial_in_flight = False
+            should_open = self.state == self.HALF_OPEN or self.failures >= self.failure_threshold
+            newly_open = should_open and self.state != self.OPEN
+            if should_open:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+        if newly_open:
+            logger.warning(f"🔴 Backend circuit OPEN for /{self.name} after {self.failures} failure(s): {reason}")
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "last_failure": self.last_failure,
+                "last_success": self.last_success
+            }
+
+
+class BackendResponse:
+    """Minimal response object (status code + parsed JSON body)
+
+    `stale` is True when the body was served from the last-good cache
+    because the backend was unreachable; `fetched_at` is when it was fetched.
+    """
+
+    def __init__(self, status_code: int, data: Any = None, text: str = "",
+                 stale: bool = False, fetched_at: Optional[float] = None,
+                 headers: Optional[Dict[str, str]] = None):
+        self.status_code = status_code
+        self.data = data
+        self.text = text
+        self.headers = headers or {}
+        self.stale = stale
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 300
+
+    def json(self):
+        return self.data
+
+
+class BackendClient:
+    """
+    Asyncio control plane for backend I/O.
+
+    One daemon thread runs one event loop with one pooled async HTTP client.
+    Camera and AI threads never block on sockets themselves:
+
+    - reads (schedule, mode, roster, attendance checks) are submitted with
+      `submit()` and awaited through a concurrent.futures.Future
+      (`call()` is the blocking convenience wrapper for AI threads);
+    - fire-and-forget writes (violations) go through a thread-safe outbox
+      queue drained by a loop task;
+    - camera modes are polled for every registered camera by one loop task,
+      so `camera_mode()` is a dictionary lookup.
+
+    Each endpoint (first path segment) has its own CircuitBreaker. Schedule,
+    mode and roster reads keep their last good response; while the backend
+    is down they are served from that cache, marked `stale`. With a
+    `snapshot` (LocalSnapshot) the last good responses and camera modes are
+    also persisted, so a node restarted during an outage still has them.
+    """
+
+    def __init__(self, base_url: str, max_connections: int = 50,
+                 mode_poll_interval: float = 0.5, outbox_workers: int = 4,
+                 breaker_failures: int = 3, breaker_reset: float = 15.0,
+                 snapshot=None):
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.mode_poll_interval = mode_poll_interval
+        self.outbox_workers = outbox_workers
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+        self._breakers = {}  # {endpoint: CircuitBreaker}
+        self._last_good = {}  # {cache_key: BackendResponse}
+        self._stale_modes = set()  # camera_ids whose mode is from a failed poll
+        self.snapshot = snapshot
+
+        self.loop = None
+        self._client = None
+        self._outbox = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._watched_modes = {}  # {camera_id: mode}
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self) -> "BackendClient":
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._thread = threading.Thread(target=self._run_loop, name="backend-io", daemon=True)
+            self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        if self.loop is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+        try:
+            future.result(timeout=timeout)
+        except Exception as e:
+            logger.debug(f"Backend client shutdown: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+        self.loop = None
+        self._ready.clear()
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._startup())
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    async def _startup(self):
+        limits = httpx.Limits(max_connections=self.max_connections,
+                              max_keepalive_connections=self.max_connections)
+        self._client = httpx.AsyncClient(base_url=self.base_url, limits=limits)
+        self._outbox = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._drain_outbox()) for _ in range(self.outbox_workers)]
+        self._tasks.append(asyncio.create_task(self._poll_modes()))
+
+    async def _shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._client.aclose()
+
+    # ------------------------------------------------------------------
+    # Thread-facing API
+    # ------------------------------------------------------------------
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """Schedule a coroutine on the backend loop from any thread"""
+        if self.loop is None:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, coro, timeout: Optional[float] = None, deadline: Optional[Deadline] = None):
+        """Run a coroutine on the backend loop and wait for its result (AI threads)"""
+        if deadline is not None:
+            if deadline.expired():
+                coro.close()
+                raise DeadlineExceeded("frame I/O budget exhausted")
+            timeout = deadline.cap(timeout) if timeout is not None else deadline.remaining()
+        future = self.submit(coro)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            if deadline is not None and deadline.expired():
+                raise DeadlineExceeded("frame I/O budget exhausted")
+            raise BackendUnavailable("backend call timed out")
+
+    def enqueue_post(self, path: str, payload: Dict, timeout: float = 5.0):
+        """Fire-and-forget POST through the outbox queue"""
+        if self.loop is None:
+            self.start()
+        self.loop.call_soon_threadsafe(self._outbox.put_nowait, (path, payload, timeout))
+
+    def watch_camera_mode(self, camera_id: str, default: str = "NORMAL"):
+        """Include camera in the background mode poller"""
+        with self._lock:
+            if camera_id in self._watched_modes:
+                return
+            self._watched_modes[camera_id] = default
+        persisted = self.snapshot.get_json(f"camera-mode:{camera_id}") if self.snapshot else None
+        if persisted:
+            # Last known mode until the first successful poll
+            with self._lock:
+                self._watched_modes[camera_id] = persisted
+                self._stale_modes.add(camera_id)
+
+    def camera_mode(self, camera_id: str, default: str = "NORMAL") -> str:
+        """Last polled mode for a camera (never blocks)"""
+        with self._lock:
+            return self._watched_modes.get(camera_id, default)
+
+    def mode_is_stale(self, camera_id: str) -> bool:
+        """True if the last mode poll for this camera failed (cached mode in use)"""
+        with self._lock:
+            return camera_id in self._stale_modes
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(endpoint, self.breaker_failures, self.breaker_reset)
+                self._breakers[endpoint] = breaker
+            return breaker
+
+    def health(self) -> Dict:
+        """Breaker states and stale-cache ages, for operators"""
+        with self._lock:
+            breakers = dict(self._breakers)
+            cached = dict(self._last_good)
+            stale_modes = sorted(self._stale_modes)
+        now = time.time()
+        return {
+            "breakers": {name: b.snapshot() for name, b in breakers.items()},
+            "open": sorted(name for name, b in breakers.items() if b.state != CircuitBreaker.CLOSED),
+            "cache_age_seconds": {key: round(now - r.fetched_at, 1) for key, r in cached.items()},
+            "stale_modes": stale_modes
+        }
+
+    def degraded(self) -> bool:
+        """True if any endpoint's circuit is not closed"""
+        return bool(self.health()["open"])
+
+    # ------------------------------------------------------------------
+    # Coroutines (run on the backend loop)
+    # ------------------------------------------------------------------
+
+    def _admit(self, method: str, path: str, timeout: float) -> CircuitBreaker:
+        breaker = self.breaker(path.strip("/").split("/", 1)[0])
+        if not breaker.allow():
+            raise CircuitOpen(f"{method} {path}: circuit open")
+        if timeout <= 0:
+            raise DeadlineExceeded(f"{method} {path}: no time left in budget")
+        return breaker
+
+    @staticmethod
+    def _record(breaker: CircuitBreaker, status_code: int):
+        if status_code >= 500:
+            breaker.record_failure(f"HTTP {status_code}")
+        else:
+            breaker.record_success()
+
+    async def request(self, method: str, path: str, params: Optional[Dict] = None,
+                      json: Optional[Dict] = None, timeout: float = 5.0,
+                      headers: Optional[Dict[str, str]] = None) -> BackendResponse:
+        breaker = self._admit(method, path, timeout)
+        try:
+            response = await self._client.request(method, path, params=params, json=json, timeout=timeout,
+                                                  headers=headers)
+        except httpx.HTTPError as e:
+            breaker.record_failure(f"{type(e).__name__}")
+            raise BackendUnavailable(f"{method} {path}: {type(e).__name__}: {e}") from e
+        self._record(breaker, response.status_code)
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        return BackendResponse(response.status_code, data, response.text, headers=dict(response.headers))
+
+    async def download(self, path: str, destination: str, params: Optional[Dict] = None,
+                       timeout: float = 60.0) -> BackendResponse:
+        """
+        Stream a binary GET body into `destination` (only written on HTTP 200)
+
+        The body goes to `destination` + ".part" first and is renamed when
+        complete, so an interrupted download never leaves a truncated file.
+        File writes run in the loop's executor, so other backend I/O keeps
+        going while a large body streams in.
+        """
+        breaker = self._admit("GET", path, timeout)
+        partial = destination + ".part"
+        try:
+            async with self._client.stream("GET", path, params=params, timeout=timeout) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    self._record(breaker, response.status_code)
+                    return BackendResponse(response.status_code, None, response.text, headers=dict(response.headers))
+                f = await self._offload(open, partial, "wb")
+                try:
+                    async for chunk in response.aiter_bytes(1 << 20):
+                        await self._offload(f.write, chunk)
+                finally:
+                    await self._offload(f.close)
+                headers = dict(response.headers)
+        except httpx.HTTPError as e:
+            breaker.record_failure(f"{type(e).__name__}")
+            await self._offload(self._remove_partial, partial)
+            raise BackendUnavailable(f"GET {path}: {type(e).__name__}: {e}") from e
+        breaker.record_success()
+        await self._offload(os.replace, partial, destination)
+        return BackendResponse(200, None, "", headers=headers)
+
+    @staticmethod
+    def _remove_partial(partial: str):
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    async def cached_get(self, cache_key: str, path: str, params: Optional[Dict] = None,
+                         timeout: float = 5.0, persist: bool = True) -> BackendResponse:
+        """
+        GET that falls back to the last good response (marked stale) on failure
+
+        Args:
+            persist: Also keep the last good body in the local snapshot
+                     (the roster has its own table, so it passes False)
+        """
+        try:
+            response = await self.get(path, params=params, timeout=timeout)
+            if response.status_code == 200:
+                with self._lock:
+                    previous = self._last_good.get(cache_key)
+                    self._last_good[cache_key] = response
+                if persist and self.snapshot is not None and (previous is None or previous.text != response.text):
+                    # SQLite write + commit: off the loop, like the roster's snapshot writes
+                    await self._offload(self.snapshot.put_response, cache_key, response.text, response.fetched_at)
+                return response
+            if response.status_code < 500:
+                return response
+            failure = BackendUnavailable(f"GET {path}: HTTP {response.status_code}")
+        except BackendUnavailable as e:
+            failure = e
+
+        with self._lock:
+            cached = self._last_good.get(cache_key)
+        if cached is None and persist and self.snapshot is not None:
+            cached = await self._offload(self._load_persisted, cache_key)
+        if cached is None:
+            raise failure
+        logger.debug(f"Serving stale {cache_key} ({time.time() - cached.fetched_at:.0f}s old): {failure}")
+        return BackendResponse(200, cached.data, cached.text, stale=True, fetched_at=cached.fetched_at)
+
+    @staticmethod
+    async def _offload(func, *args):
+        """Run blocking I/O (local snapshot, files) in the loop's executor"""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _load_persisted(self, cache_key: str) -> Optional[BackendResponse]:
+        """Last good response from the local snapshot (cold start during an outage)"""
+        stored = self.snapshot.get_response(cache_key)
+        if stored is None:
+            return None
+        body, fetched_at = stored
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None
+        response = BackendResponse(200, data, body, fetched_at=fetched_at)
+        with self._lock:
+            self._last_good.setdefault(cache_key, response)
+        logger.warning(f"💾 Using {cache_key} from local snapshot ({time.time() - fetched_at:.0f}s old)")
+        return response
+
+    async def get(self, path: str, params: Optional[Dict] = None, timeout: float = 5.0) -> BackendResponse:
+        return await self.request("GET", path, params=params, timeout=timeout)
+
+    async def post(self, path: str, payload: Dict, timeout: float = 5.0) -> BackendResponse:
+        return await self.request("POST", path, json=payload, timeout=timeout)
+
+    async def fetch_students(self, timeout: float = 5.0) -> BackendResponse:
+        return await self.cached_get("students", "/students", params={"fields": "all"}, timeout=timeout, persist=False)
+
+    async def fetch_student_snapshot_index(self, etag: Optional[str] = None, timeout: float = 10.0) -> BackendResponse:
+        """Binary roster snapshot index; 304 if `etag` (a previous ETag) is still current"""
+        headers = {"If-None-Match": etag} if etag else None
+        return await self.request("GET", "/students/snapshot/index", timeout=timeout, headers=headers)
+
+    async def download_student_embeddings(self, version: int, destination: str, timeout: float = 60.0) -> BackendResponse:
+        return await self.download("/students/snapshot/embeddings", destination, params={"version": version},
+                                   timeout=timeout)
+
+    async def fetch_student_changes(self, since: int, limit: int = 500, timeout: float = 10.0) -> BackendResponse:
+        # base64 float32 embeddings: about a third of the JSON of a list of doubles
+        return await self.get("/students/changes", params={"since": since, "limit": limit, "embeddings": "base64"},
+                              timeout=timeout)
+
+    async def fetch_cameras(self, timeout: float = 5.0) -> BackendResponse:
+        return await self.cached_get("cameras", "/cameras", timeout=timeout)
+
+    async def fetch_camera_mode(self, camera_id: str, timeout: float = 3.0) -> BackendResponse:
+        return await self.get(f"/camera-mode/{camera_id}", timeout=timeout)
+
+    async def fetch_schedule_sources(self, camera_id: str, timeout: float = 5.0) -> List[BackendResponse]:
+        """Timetable and camera schedules, fetched concurrently"""
+        return await asyncio.gather(
+            self.cached_get("timetable", "/timetable", timeout=timeout),
+            self.cached_get(f"camera-schedule:{camera_id}", f"/camera-schedule/{camera_id}", timeout=timeout)
+        )
+
+    async def check_attendance(self, params: Dict, timeout: float = 5.0) -> BackendResponse:
+        return await self.get("/attendance-check", params=params, timeout=timeout)
+
+    async def post_attendance(self, record: Dict, timeout: float = 5.0) -> BackendResponse:
+        return await self.post("/attendance", record, timeout=timeout)
+
+    async def _drain_outbox(self):
+        while True:
+            path, payload, timeout = await self._outbox.get()
+            try:
+                response = await self.post(path, payload, timeout=timeout)
+                if response.ok:
+                    logger.info(f"✅ Posted to backend: {path}")
+                else:
+                    logger.warning(f"⚠️ Backend rejected POST {path}: {response.status_code}")
+            except BackendUnavailable as e:
+                logger.error(f"Error posting to backend: {e}")
+            finally:
+                self._outbox.task_done()
+
+    async def _poll_modes(self):
+        while True:
+            with self._lock:
+                camera_ids = list(self._watched_modes)
+            if camera_ids:
+                results = await asyncio.gather(
+                    *(self.fetch_camera_mode(camera_id) for camera_id in camera_ids),
+                    return_exceptions=True
+                )
+                for camera_id, result in zip(camera_ids, results):
+                    if isinstance(result, BackendResponse) and result.ok and isinstance(result.data, dict):
+                        mode = result.data.get("mode", "NORMAL")
+                        with self._lock:
+                            changed = self._watched_modes.get(camera_id) != mode or camera_id in self._stale_modes
+                            self._watched_modes[camera_id] = mode
+                            self._stale_modes.discard(camera_id)
+                        if changed and self.snapshot is not None:
+                            await self._offload(self.snapshot.put_json, f"camera-mode:{camera_id}", mode)
+                    elif isinstance(result, Exception):
+                        # Keep the last good mode, flag it stale
+                        with self._lock:
+                            newly_stale = camera_id not in self._stale_modes
+                            self._stale_modes.add(camera_id)
+                        if newly_stale and not isinstance(result, CircuitOpen):
+                            logger.warning(f"Could not fetch camera mode for {camera_id}: {result}")
+            await asyncio.sleep(self.mode_poll_interval)
+
+
+# ============================================================================
+# GLOBAL CLIENT INSTANCE
+# ============================================================================
+
+_client_instance = None
+_client_lock = threading.Lock()
+
+
+def get_backend_client(base_url: str = "http://localhost:8000/api", **kwargs) -> BackendClient:
+    """Get the process-wide backend client (singleton pattern)"""
+    global _client_instance
+    with _client_lock:
+        if _client_instance is None:
+            _client_instance = BackendClient(base_url, **kwargs).start()
+        return _client_instance
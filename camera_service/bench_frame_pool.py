@@ -0,0 +1,145 @@
+"""
+Allocation benchmark: legacy copy-per-stage frame path vs pooled zero-copy path
+Run: python bench_frame_pool.py [--frames 300] [--width 1280] [--height 720]
+
+Legacy path (per frame):  decode -> new array, frame.copy() for AI, cv2.flip
+                          -> new array, overlays at full resolution, cv2.resize
+                          -> new array, detector upscale -> new array
+Pooled path (per frame):  decode into pool buffer, retain() for AI, resize into
+                          display buffer, in-place mirror, overlays at display
+                          resolution, detector upscale into pool buffer
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from frame_pool import FramePool, ensure_pool
+
+DISPLAY_WIDTH = 960
+DISPLAY_HEIGHT = 540
+PROCESS_EVERY_N_FRAMES = 30
+FACE_DET_UPSCALE = 1.5
+BOXES = [(200, 150, 120, 140), (640, 200, 110, 130), (900, 300, 90, 100)]
+
+
+def fake_decode(dst, index):
+    """Stand-in for cap.retrieve(): writes every pixel of dst"""
+    dst[:] = index & 0xFF
+    return dst
+
+
+def draw(frame, scale_x=1.0, scale_y=1.0, mirror=False):
+    width = frame.shape[1]
+    for (x, y, w, h) in BOXES:
+        x, y, w, h = int(x * scale_x), int(y * scale_y), int(w * scale_x), int(h * scale_y)
+        if mirror:
+            x = width - x - w
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 1)
+        cv2.putText(frame, "Student (0.72)", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7 * scale_y, (0, 0, 0), 2)
+
+
+def legacy_frame(shape, index, ai_jobs):
+    frame = fake_decode(np.empty(shape, np.uint8), index)
+    if index % PROCESS_EVERY_N_FRAMES == 0:
+        job = frame.copy()
+        upscaled = cv2.resize(job, None, fx=FACE_DET_UPSCALE, fy=FACE_DET_UPSCALE)
+        ai_jobs.append((job, upscaled))
+    frame = cv2.flip(frame, 1)
+    draw(frame)
+    return cv2.resize(frame, (DISPLAY_WIDTH, DISPLAY_HEIGHT))
+
+
+class PooledPath:
+    def __init__(self, shape):
+        self.pool = FramePool(shape, size=4, name="bench")
+        self.upscale_pool = None
+        self.display = np.empty((DISPLAY_HEIGHT, DISPLAY_WIDTH, 3), np.uint8)
+        self.latest = None
+
+    def frame(self, shape, index, ai_jobs):
+        buffer = self.pool.acquire()
+        fake_decode(buffer.array, index)
+        previous, self.latest = self.latest, buffer  # Grabber keeps the newest frame
+        if previous is not None:
+            previous.release()
+
+        consumer = buffer.retain()
+        try:
+            if index % PROCESS_EVERY_N_FRAMES == 0:
+                job = consumer.retain()
+                h, w = shape[:2]
+                up_shape = (int(round(h * FACE_DET_UPSCALE)), int(round(w * FACE_DET_UPSCALE)), shape[2])
+                self.upscale_pool = ensure_pool(self.upscale_pool, up_shape, size=2, name="bench-upscale")
+                upscaled = self.upscale_pool.acquire()
+                cv2.resize(job.array, (up_shape[1], up_shape[0]), dst=upscaled.array)
+                ai_jobs.append((job, upscaled))
+
+            cv2.resize(consumer.array, (DISPLAY_WIDTH, DISPLAY_HEIGHT), dst=self.display)
+            cv2.flip(self.display, 1, dst=self.display)
+            draw(self.display, DISPLAY_WIDTH / shape[1], DISPLAY_HEIGHT / shape[0], mirror=True)
+            return self.display
+        finally:
+            consumer.release()
+
+
+def finish_ai_jobs(ai_jobs, pooled):
+    """AI workers finish: legacy drops its copies, pooled path releases references"""
+    if pooled:
+        for job, upscaled in ai_jobs:
+            job.release()
+            upscaled.release()
+    ai_jobs.clear()
+
+
+def run(label, frames, shape, step):
+    ai_jobs = []
+    allocated = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    for index in range(1, frames + 1):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        step(shape, index, ai_jobs)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+        if len(ai_jobs) >= 2:
+            finish_ai_jobs(ai_jobs, pooled=(label == "pooled"))
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    finish_ai_jobs(ai_jobs, pooled=(label == "pooled"))
+    return {
+        "label": label,
+        "ms_per_frame": elapsed * 1000 / frames,
+        "mb_per_frame": allocated / frames / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    args = parser.parse_args()
+
+    shape = (args.height, args.width, 3)
+    pooled = PooledPath(shape)
+
+    print(f"🧪 Frame hand-off benchmark: {args.frames} frames at {args.width}x{args.height}")
+    print("=" * 60)
+    results = [
+        run("legacy", args.frames, shape, legacy_frame),
+        run("pooled", args.frames, shape, pooled.frame),
+    ]
+    for r in results:
+        print(f"   {r['label']:<7} {r['ms_per_frame']:7.2f} ms/frame   {r['mb_per_frame']:7.2f} MB allocated/frame")
+    print("=" * 60)
+    stats = pooled.pool.stats()
+    print(f"   Pool: {stats['allocations']} buffers for {stats['acquires']} frames "
+          f"(reuse {stats['reuse_ratio']:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Roster index benchmark: float32 exact matching vs prefilter scans + float32 re-rank
+(float16 / int8 compact copies, PCA projections, PCA + int8)
+Run: python bench_roster_index.py [--students 20000] [--templates 4] [--queries 1000] [--pca 64,96,128]
+     python bench_roster_index.py --export ../data/embedding_snapshot   # the node's cached roster
+
+Reports per mode: build time (including any PCA fit), memory per 10k
+students (float32 rows and prefilter copy), rank-1 agreement with the exact
+float32 search, and whole-roster query time.
+Queries are enrolled templates plus Gaussian noise (a new capture of the
+same face).
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Shared backend modules (face_templates, embedding_export) live in ../backend
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from embedding_cache import EmbeddingCache
+from roster_snapshot import QUANTIZE_MODES, RosterSnapshot
+
+
+def synthetic_roster(students, templates, dim, seed):
+    rng = np.random.default_rng(seed)
+    identities = rng.standard_normal((students, dim)).astype(np.float32)
+    documents = []
+    for i in range(students):
+        views = identities[i] + 0.7 * rng.standard_normal((templates, dim)).astype(np.float32)
+        documents.append({
+            "roll_number": f"S{i:06d}",
+            "batch_id": f"B{i % max(1, students // 60)}",
+            "templates": views,
+            "template_labels": ["front", "left", "right", "far"][:templates] or None
+        })
+    return documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roster prefilter memory / agreement / latency")
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--templates", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--noise", type=float, default=0.8, help="Query noise relative to unit-variance embeddings")
+    parser.add_argument("--rerank", type=int, default=16)
+    parser.add_argument("--pca", default="64,96,128", help="Comma-separated PCA prefilter dims to compare")
+    parser.add_argument("--export", help="Embedding snapshot directory to load instead of a synthetic roster")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.export:
+        cached = EmbeddingCache(None, args.export).cached()
+        if cached is None:
+            print(f"❌ No usable embedding snapshot in {args.export}")
+            return 1
+        build = lambda options: RosterSnapshot.from_export(*cached, rerank=args.rerank, **options)
+    else:
+        documents = synthetic_roster(args.students, args.templates, args.dim, args.seed)
+        build = lambda options: RosterSnapshot.from_documents(documents, rerank=args.rerank, **options)
+
+    modes = {mode: {"quantize": mode} for mode in QUANTIZE_MODES}
+    pca_dims = [int(dims) for dims in args.pca.split(",") if dims.strip()]
+    for dims in pca_dims:
+        modes[f"pca{dims}"] = {"pca_dims": dims}
+    if pca_dims:
+        modes[f"pca{max(pca_dims)}+int8"] = {"pca_dims": max(pca_dims), "quantize": "int8"}
+
+    snapshots = {}
+    build_seconds = {}
+    for name, options in modes.items():
+        start = time.perf_counter()
+        snapshots[name] = build(options)
+        build_seconds[name] = time.perf_counter() - start
+    exact = snapshots["float32"]
+    students = len(exact.rolls)
+    print(f"Roster: {students} students, {exact.matrix.shape[0]} templates (dim {exact.dim}), rerank={args.rerank}")
+
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, exact.matrix.shape[0], args.queries)
+    queries = exact.matrix[picks] + args.noise / np.sqrt(exact.dim) * rng.standard_normal((args.queries, exact.dim))
+    queries = queries.astype(np.float32)
+    reference = [exact.best_match(query)[0] for query in queries]
+
+    print(f"{'mode':<13} {'build s':>8} {'float32 MB/10k':>15} {'prefilter MB/10k':>17} {'rank-1 agree':>13} "
+          f"{'ms/query':>9}")
+    for mode, snapshot in snapshots.items():
+        memory = snapshot.memory()
+        per_10k = 10000 / max(1, students) / 2 ** 20
+        start = time.perf_counter()
+        results = [snapshot.best_match(query)[0] for query in queries]
+        elapsed = (time.perf_counter() - start) / len(queries) * 1000
+        agreement = np.mean([a == b for a, b in zip(results, reference)])
+        explained = f"  ({snapshot.projection.explained:.1%} variance)" if snapshot.projection is not None else ""
+        print(f"{mode:<13} {build_seconds[mode]:>8.2f} {memory['float32_bytes'] * per_10k:>15.2f} "
+              f"{memory['compact_bytes'] * per_10k:>17.2f} {agreement:>13.4f} {elapsed:>9.3f}{explained}")
+    print("Prefilter modes scan only their copy; float32 rows are read for the re-ranked students "
+          "(memory-mapped, so mostly left on disk, when loaded from the embedding snapshot).")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,120 @@
+"""
+Embedding Cache for Camera Service
+Downloads the backend's binary roster snapshot when its version changes and
+memory-maps it from disk
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from backend_client import BackendClient, BackendUnavailable
+from embedding_export import EXPORT_FORMAT_VERSION, check_export
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+
+
+class EmbeddingCache:
+    """
+    On-disk copy of /api/students/snapshot (index.json + embeddings-<version>.npy).
+
+    `refresh()` asks for the index with the cached version as ETag. When it
+    is unchanged (304) nothing is downloaded. The matrix is opened with
+    np.load(mmap_mode="r"): loading takes milliseconds whatever the roster
+    size, and the pages are shared with every other process on the node
+    that maps the same file.
+    """
+
+    def __init__(self, backend: BackendClient, directory: str):
+        self.backend = backend
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _matrix_path(self, version: int) -> str:
+        return os.path.join(self.directory, f"embeddings-{version}.npy")
+
+    def cached(self) -> Optional[Tuple[Dict, np.ndarray]]:
+        """(index, memory-mapped matrix) from disk, or None if there is no usable copy"""
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return None
+        try:
+            with open(index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            matrix = np.load(self._matrix_path(index["version"]), mmap_mode="r")
+            check_export(index, matrix)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring cached embedding snapshot: {e}")
+            return None
+        return index, matrix
+
+    def cached_version(self) -> Optional[int]:
+        """Version of the cached copy (None if missing or in an older export format)"""
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("format") != EXPORT_FORMAT_VERSION:
+                return None  # Download again even if the students version is unchanged
+            return int(index["version"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    async def refresh(self) -> Tuple[Optional[Tuple[Dict, np.ndarray]], bool]:
+        """
+        Bring the cache up to date with the backend
+
+        Returns:
+            ((index, matrix) or None, downloaded)
+
+        Raises:
+            BackendUnavailable: backend unreachable (use `cached()`)
+
+        Runs on the shared backend loop: file reads, the index write and
+        old-file cleanup go to the loop's executor.
+        """
+        loop = asyncio.get_running_loop()
+        version = await loop.run_in_executor(None, self.cached_version)
+        response = await self.backend.fetch_student_snapshot_index(f'"{version}"' if version is not None else None)
+        if response.status_code == 304:
+            return await loop.run_in_executor(None, self.cached), False
+        if response.status_code == 404:
+            logger.warning("⚠️ Backend has no /students/snapshot - roster loads as JSON")
+            return None, False
+        if not response.ok or not isinstance(response.data, dict):
+            raise BackendUnavailable(f"student snapshot index: HTTP {response.status_code}")
+
+        index = response.data
+        new_version = index["version"]
+        matrix_path = self._matrix_path(new_version)
+        download = await self.backend.download_student_embeddings(new_version, matrix_path)
+        if download.status_code != 200:
+            raise BackendUnavailable(f"student snapshot embeddings: HTTP {download.status_code}")
+        matrix = await loop.run_in_executor(None, self._install, index, matrix_path)
+        logger.warning(f"💾 Downloaded embedding snapshot v{new_version}: {index['count']} x {index['dim']}")
+        return (index, matrix), True
+
+    def _install(self, index: Dict, matrix_path: str) -> np.ndarray:
+        """Map and check a downloaded matrix, then make `index` the cached one (blocking)"""
+        matrix = np.load(matrix_path, mmap_mode="r")
+        check_export(index, matrix)
+
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(index_path + ".tmp", index_path)
+        self._remove_old(keep=os.path.basename(matrix_path))
+        return matrix
+
+    def _remove_old(self, keep: str):
+        for name in os.listdir(self.directory):
+            if name.startswith("embeddings-") and name.endswith(".npy") and name != keep:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass  # Still mapped on Windows; removed after a later download
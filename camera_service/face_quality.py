@@ -0,0 +1,120 @@
+"""
+Face Quality Gate for Camera Service
+Cheap checks on an aligned face crop that decide whether it is worth an
+ArcFace embedding now: sharpness, exposure, head yaw and eye distance
+"""
+
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+QUALITY_SIZE = 112  # Crops are compared at ArcFace's input size, whatever the detector returned
+DARK_LEVEL = 30  # Grey level at or below which a pixel counts as crushed shadow
+BRIGHT_LEVEL = 235  # ... and at or above which it counts as blown highlight
+
+REJECT_REASONS = ("blur", "underexposed", "overexposed", "yaw", "eye_distance")
+
+
+def _grey(face_img: np.ndarray) -> np.ndarray:
+    """uint8 QUALITY_SIZE x QUALITY_SIZE grey crop (DeepFace crops are RGB floats in [0, 1])"""
+    img = np.asarray(face_img)
+    if img.dtype != np.uint8:
+        scale = 255.0 if img.size and float(img.max()) <= 1.0 else 1.0
+        img = np.clip(img * scale, 0, 255).astype(np.uint8)
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    return cv2.resize(img, (QUALITY_SIZE, QUALITY_SIZE), interpolation=cv2.INTER_AREA)
+
+
+def sharpness(grey: np.ndarray) -> float:
+    """Variance of the Laplacian (low = blurred)"""
+    return float(cv2.Laplacian(grey, cv2.CV_64F).var())
+
+
+def exposure(grey: np.ndarray) -> Tuple[float, float, float]:
+    """(mean level, fraction of crushed shadows, fraction of blown highlights)"""
+    histogram = np.bincount(grey.ravel(), minlength=256) / grey.size
+    mean = float(np.dot(np.arange(256), histogram))
+    return mean, float(histogram[:DARK_LEVEL + 1].sum()), float(histogram[BRIGHT_LEVEL:].sum())
+
+
+def eye_geometry(landmarks: Optional[Dict]) -> Tuple[Optional[float], Optional[float]]:
+    """
+    (inter-ocular distance in source pixels, yaw ratio) from detector landmarks
+
+    The yaw ratio is the nose's horizontal offset from the eyes' midpoint
+    divided by the eye distance: about 0 for a frontal face and growing
+    towards 0.5 as the head turns to profile. Either value is None when the
+    detector gave no such landmarks.
+    """
+    if not landmarks:
+        return None, None
+    left, right = landmarks.get("left_eye"), landmarks.get("right_eye")
+    if left is None or right is None:
+        return None, None
+    distance = float(np.hypot(right[0] - left[0], right[1] - left[1]))
+    nose = landmarks.get("nose")
+    if nose is None or distance == 0.0:
+        return distance, None
+    midpoint = (left[0] + right[0]) / 2.0
+    return distance, abs(nose[0] - midpoint) / distance
+
+
+class FaceQualityGate:
+    """
+    Accepts or rejects face crops before they are embedded, and counts why
+
+    `assess()` returns (quality in [0, 1], reject reason or None). The quality
+    of an accepted crop grows with its sharpness and shrinks with its yaw, so
+    it can weight the crop's embedding. Checks whose inputs are missing (no
+    landmarks from the detector) pass.
+    """
+
+    def __init__(self, min_sharpness: float = 40.0, min_brightness: float = 50.0, max_brightness: float = 210.0,
+                 max_clipped: float = 0.35, max_yaw: float = 0.3, min_eye_distance: float = 12.0):
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped = max_clipped
+        self.max_yaw = max_yaw
+        self.min_eye_distance = min_eye_distance
+        self.passed = 0
+        self.rejected = Counter()
+
+    def assess(self, face_img: np.ndarray, landmarks: Optional[Dict] = None) -> Tuple[float, Optional[str]]:
+        reason, quality = None, 0.0
+        distance, yaw = eye_geometry(landmarks)
+        if distance is not None and distance < self.min_eye_distance:
+            reason = "eye_distance"
+        elif yaw is not None and yaw > self.max_yaw:
+            reason = "yaw"
+        else:
+            grey = _grey(face_img)
+            mean, dark, bright = exposure(grey)
+            blur = sharpness(grey)
+            if mean < self.min_brightness or dark > self.max_clipped:
+                reason = "underexposed"
+            elif mean > self.max_brightness or bright > self.max_clipped:
+                reason = "overexposed"
+            elif blur < self.min_sharpness:
+                reason = "blur"
+            else:
+                quality = min(1.0, blur / (2.0 * self.min_sharpness))
+                if yaw is not None:
+                    quality *= 1.0 - 0.5 * yaw / self.max_yaw
+
+        if reason:
+            self.rejected[reason] += 1
+        else:
+            self.passed += 1
+        return quality, reason
+
+    def stats(self) -> Dict:
+        total = self.passed + sum(self.rejected.values())
+        return {
+            "passed": self.passed,
+            "rejected": {reason: self.rejected[reason] for reason in REJECT_REASONS if self.rejected[reason]},
+            "reject_ratio": (total - self.passed) / total if total else 0.0
+        }
@@ -0,0 +1,122 @@
+"""
+Frame Pool for Camera Service
+Preallocated, reference-counted frame buffers shared by capture, AI and display
+"""
+
+import logging
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class PooledFrame:
+    """
+    A pool-owned frame buffer with a reference count.
+
+    The writer (grabber thread) fills `array` once; every reader that keeps
+    the frame beyond the current call takes a reference with `retain()` and
+    gives it back with `release()`. When the count drops to zero the buffer
+    returns to its pool and may be overwritten by the next capture, so
+    readers must never write into `array`.
+    """
+
+    __slots__ = ("array", "_pool", "_refs")
+
+    def __init__(self, array: np.ndarray, pool: "FramePool"):
+        self.array = array
+        self._pool = pool
+        self._refs = 0
+
+    @property
+    def refs(self) -> int:
+        return self._refs
+
+    def retain(self) -> "PooledFrame":
+        with self._pool._lock:
+            if self._refs <= 0:
+                raise RuntimeError("retain() on a released frame")
+            self._refs += 1
+        return self
+
+    def release(self):
+        with self._pool._lock:
+            if self._refs <= 0:
+                raise RuntimeError("release() called more times than retain()")
+            self._refs -= 1
+            if self._refs == 0:
+                self._pool._recycle(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class FramePool:
+    """
+    Small free-list of same-shaped frame buffers.
+
+    `acquire()` hands out a buffer with one reference. If every buffer is
+    still referenced the pool allocates a new one (counted in `stats()`), so
+    a slow consumer degrades to the old copy-per-frame cost instead of
+    blocking capture. Buffers whose shape no longer matches (camera
+    resolution change) are dropped rather than recycled.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], dtype=np.uint8, size: int = 4, name: str = "frames"):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.name = name
+        self._lock = threading.Lock()
+        self._free = [PooledFrame(np.empty(self.shape, self.dtype), self) for _ in range(size)]
+        self.allocations = size
+        self.acquires = 0
+
+    def acquire(self) -> PooledFrame:
+        """Take a free buffer (refcount 1), allocating only if the pool is exhausted"""
+        with self._lock:
+            self.acquires += 1
+            if self._free:
+                frame = self._free.pop()
+            else:
+                self.allocations += 1
+                if self.allocations % 8 == 0:
+                    logger.debug(f"Frame pool '{self.name}' grew to {self.allocations} buffers")
+                frame = PooledFrame(np.empty(self.shape, self.dtype), self)
+            frame._refs = 1
+        return frame
+
+    def adopt(self, array: np.ndarray) -> PooledFrame:
+        """Wrap an externally allocated array so it can join the pool on release"""
+        frame = PooledFrame(array, self)
+        with self._lock:
+            self.acquires += 1
+            self.allocations += 1
+            frame._refs = 1
+        return frame
+
+    def _recycle(self, frame: PooledFrame):
+        # Caller holds self._lock
+        if frame.array.shape == self.shape and frame.array.dtype == self.dtype:
+            self._free.append(frame)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "shape": self.shape,
+                "allocations": self.allocations,
+                "acquires": self.acquires,
+                "free": len(self._free),
+                "reuse_ratio": 1.0 - (self.allocations / self.acquires) if self.acquires else 0.0
+            }
+
+
+def ensure_pool(pool: Optional[FramePool], shape, dtype=np.uint8, size: int = 4, name: str = "frames") -> FramePool:
+    """Return pool if it matches shape/dtype, otherwise a fresh pool for the new shape"""
+    if pool is not None and pool.shape == tuple(shape) and pool.dtype == np.dtype(dtype):
+        return pool
+    return FramePool(shape, dtype=dtype, size=size, name=name)
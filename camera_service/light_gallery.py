@@ -0,0 +1,154 @@
+"""
+Light Gallery for Camera Service
+Embeddings of a small face model (SFace by default) for the students a
+camera has already recognized with ArcFace: the first stage of the
+recognition cascade
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class LightGallery:
+    """
+    Per-student light-model embeddings, filled from ArcFace-confirmed faces.
+
+    The enrolled templates are ArcFace embeddings, which a different model
+    cannot be compared with. This gallery is built on the camera instead:
+    when a track is confirmed by ArcFace, the light model embeds the track's
+    best crop and the vector is kept under the student's roll number, up to
+    `per_student` per student (oldest replaced).
+
+    `match()` accepts only a clear win: the best student must reach
+    `threshold` and beat the best other student by `margin`. Anything else
+    escalates to ArcFace. The gallery is saved to `path` (.npz) so it carries
+    over restarts and the next day's classes: `flush()` writes it at most
+    every `save_interval` seconds after a change (`flush(force=True)` when
+    the camera stops), never on the AI worker's `add()`.
+    """
+
+    def __init__(self, threshold: float = 0.6, margin: float = 0.15, per_student: int = 4,
+                 path: Optional[str] = None, save_interval: float = 60.0):
+        self.threshold = threshold
+        self.margin = margin
+        self.per_student = max(1, per_student)
+        self.path = path
+        self.save_interval = save_interval
+        self.dirty = False
+        self.saved_at = time.monotonic()
+        self._lock = threading.Lock()  # add/match on the AI worker, flush on the capture thread
+        self.vectors: Dict[str, List[np.ndarray]] = {}
+        self.similarities: Dict[str, float] = {}  # ArcFace similarity the student was confirmed with
+        self._matrix: Optional[np.ndarray] = None  # Stacked vectors, rebuilt after a change
+        self._owners: Optional[np.ndarray] = None
+        self._rolls: Tuple[str, ...] = ()
+        if path:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def _stack(self):
+        if self._matrix is None:
+            self._rolls = tuple(self.vectors)
+            rows = [vector for roll in self._rolls for vector in self.vectors[roll]]
+            self._owners = np.repeat(np.arange(len(self._rolls)), [len(self.vectors[roll]) for roll in self._rolls])
+            self._matrix = np.vstack(rows) if rows else None
+
+    def add(self, roll_number: str, embedding, similarity: float):
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return
+        with self._lock:
+            if self.vectors and next(iter(self.vectors.values()))[0].size != vector.size:
+                logger.warning(f"⚠️ Light gallery dim {vector.size} differs from stored vectors - starting over")
+                self.vectors.clear()
+                self.similarities.clear()
+            vectors = self.vectors.setdefault(roll_number, [])
+            vectors.append(vector / norm)
+            del vectors[:-self.per_student]
+            self.similarities[roll_number] = float(similarity)
+            self._matrix = None
+            self.dirty = True
+
+    def forget(self, roll_number: str):
+        with self._lock:
+            if self.vectors.pop(roll_number, None) is not None:
+                self.similarities.pop(roll_number, None)
+                self._matrix = None
+                self.dirty = True
+
+    def match(self, embedding) -> Optional[Tuple[str, float, float, float]]:
+        """
+        (roll_number, light similarity, margin over the runner-up student,
+        ArcFace similarity at confirmation) for a clear win, or None
+        """
+        with self._lock:
+            self._stack()
+            matrix, owners, rolls, similarities = self._matrix, self._owners, self._rolls, dict(self.similarities)
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        if matrix is None or norm == 0.0 or vector.size != matrix.shape[1]:
+            return None
+        scores = np.full(len(rolls), -1.0, np.float32)
+        np.maximum.at(scores, owners, matrix @ (vector / norm))
+        order = np.argsort(-scores)
+        best = float(scores[order[0]])
+        runner_up = float(scores[order[1]]) if len(order) > 1 else -1.0
+        if best < self.threshold or best - runner_up < self.margin:
+            return None
+        roll_number = rolls[order[0]]
+        return roll_number, best, best - runner_up, similarities.get(roll_number, best)
+
+    def flush(self, force: bool = False):
+        """Save if changed and `save_interval` has passed since the last save (or `force`)"""
+        if self.dirty and (force or time.monotonic() - self.saved_at >= self.save_interval):
+            self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            self._stack()
+            matrix, owners, rolls = self._matrix, self._owners, self._rolls
+            similarities = [self.similarities[roll] for roll in rolls]
+            self.dirty = False
+            self.saved_at = time.monotonic()
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path + ".tmp", "wb") as f:
+                np.savez(
+                    f,
+                    matrix=matrix if matrix is not None else np.empty((0, 0), np.float32),
+                    rolls=np.array([rolls[i] for i in owners], dtype=str),
+                    similarities=np.array(similarities, np.float32),
+                    students=np.array(rolls, dtype=str)
+                )
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not save light gallery {self.path}: {e}")
+            self.dirty = True  # Try again on the next flush
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                for roll, vector in zip(data["rolls"], data["matrix"]):
+                    self.vectors.setdefault(str(roll), []).append(vector.astype(np.float32))
+                for roll, similarity in zip(data["students"], data["similarities"]):
+                    self.similarities[str(roll)] = float(similarity)
+            self._matrix = None
+            logger.info(f"✅ Light gallery: {len(self.vectors)} students from {self.path}")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ Ignoring light gallery {self.path}: {e}")
+            self.vectors.clear()
+            self.similarities.clear()
@@ -0,0 +1,245 @@
+"""
+Local Snapshot for Camera Service
+SQLite copy of cameras, schedules, camera modes and student rosters so a node
+can cold-start and keep recognizing while the backend is unreachable
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    body TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS students (
+    roll_number TEXT PRIMARY KEY,
+    batch_id TEXT,
+    doc TEXT NOT NULL,
+    embedding BLOB,
+    embedding_dim INTEGER,
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS students_batch ON students (batch_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _encode_embedding(embedding) -> Tuple[Optional[bytes], Optional[int]]:
+    """float32 BLOB + row length of an embedding or a (templates x dim) matrix"""
+    if embedding is None:
+        return None, None
+    rows = np.atleast_2d(np.asarray(embedding, dtype=np.float32))
+    if rows.size == 0:
+        return None, None
+    return rows.tobytes(), int(rows.shape[1])
+
+
+def _decode_embedding(blob: Optional[bytes], dim: Optional[int]) -> Optional[np.ndarray]:
+    """(templates x dim) float32 rows of a stored BLOB"""
+    if blob is None or not dim:
+        return None
+    return np.frombuffer(blob, dtype=np.float32).reshape(-1, dim)
+
+
+class LocalSnapshot:
+    """
+    Node-local SQLite snapshot (WAL mode, one connection shared under a lock).
+
+    Tables:
+        responses - last good JSON body per backend read (cameras, timetable,
+                    camera-schedule:<id>, camera-mode:<id>)
+        students  - one row per student; the document without its embedding
+                    plus its face templates (or single embedding) as one
+                    float32 BLOB of `embedding_dim`-long rows
+        meta      - small key/value pairs (last roster sync time, cursors)
+
+    Writes are incremental: `put_response` skips unchanged bodies and
+    `save_students` only rewrites rows whose document or embedding changed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Backend responses (cameras, schedules, modes)
+    # ------------------------------------------------------------------
+
+    def put_response(self, key: str, body: str, fetched_at: Optional[float] = None) -> bool:
+        """Store a response body; returns False if it was unchanged"""
+        fetched_at = fetched_at if fetched_at is not None else time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[0] == body:
+                self._conn.execute("UPDATE responses SET fetched_at = ? WHERE key = ?", (fetched_at, key))
+                return False
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, body, fetched_at) VALUES (?, ?, ?)",
+                (key, body, fetched_at)
+            )
+        return True
+
+    def get_response(self, key: str) -> Optional[Tuple[str, float]]:
+        """(body, fetched_at) for a stored response, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT body, fetched_at FROM responses WHERE key = ?", (key,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put_json(self, key: str, data: Any) -> bool:
+        return self.put_response(key, json.dumps(data, sort_keys=True, default=str))
+
+    def get_json(self, key: str, default: Any = None) -> Any:
+        stored = self.get_response(key)
+        if stored is None:
+            return default
+        try:
+            return json.loads(stored[0])
+        except ValueError:
+            return default
+
+    # ------------------------------------------------------------------
+    # Student rosters
+    # ------------------------------------------------------------------
+
+    def save_students(self, students: Iterable[Dict], replace: bool = True) -> Dict[str, int]:
+        """
+        Upsert student documents (templates, else the embedding, stored as float32 BLOB)
+
+        Args:
+            students: Student documents as returned by /api/students
+            replace: Delete rows for students missing from `students`
+                     (True for a full roster, False for a partial update)
+
+        Returns:
+            {"upserted": n, "unchanged": n, "deleted": n}
+        """
+        now = time.time()
+        upserted = unchanged = deleted = 0
+        seen = set()
+        with self._lock:
+            existing = {
+                roll: (doc, blob)
+                for roll, doc, blob in self._conn.execute("SELECT roll_number, doc, embedding FROM students")
+            }
+            self._conn.execute("BEGIN")
+            try:
+                for student in students:
+                    roll = student.get("roll_number")
+                    if not roll:
+                        continue
+                    seen.add(roll)
+                    doc = {k: v for k, v in student.items() if k not in ("embedding", "templates")}
+                    doc_json = json.dumps(doc, sort_keys=True, default=str)
+                    templates = student.get("templates")
+                    blob, dim = _encode_embedding(templates if templates is not None else student.get("embedding"))
+                    if existing.get(roll) == (doc_json, blob):
+                        unchanged += 1
+                        continue
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO students (roll_number, batch_id, doc, embedding, embedding_dim, synced_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (roll, student.get("batch_id"), doc_json, blob, dim, now)
+                    )
+                    upserted += 1
+                if replace:
+                    for roll in set(existing) - seen:
+                        self._conn.execute("DELETE FROM students WHERE roll_number = ?", (roll,))
+                        deleted += 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('students_synced_at', ?)", (str(now),)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {"upserted": upserted, "unchanged": unchanged, "deleted": deleted}
+
+    def delete_students(self, roll_numbers: Iterable[str]) -> int:
+        with self._lock:
+            cursor = self._conn.executemany(
+                "DELETE FROM students WHERE roll_number = ?", [(roll,) for roll in roll_numbers]
+            )
+            return cursor.rowcount
+
+    def load_students(self, batch_ids: Optional[Iterable[str]] = None) -> List[Tuple[Dict, Optional[np.ndarray]]]:
+        """
+        Stored students as (document, templates) pairs - templates is a
+        (rows x dim) matrix, one row for students with a single embedding
+
+        Args:
+            batch_ids: Only these batches' rosters (all students if None)
+        """
+        query = "SELECT doc, embedding, embedding_dim FROM students"
+        params = ()
+        if batch_ids is not None:
+            batch_ids = list(batch_ids)
+            query += f" WHERE batch_id IN ({','.join('?' * len(batch_ids))})"
+            params = tuple(batch_ids)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [(json.loads(doc), _decode_embedding(blob, dim)) for doc, blob, dim in rows]
+
+    def students_synced_at(self) -> Optional[float]:
+        value = self.get_meta("students_synced_at")
+        return float(value) if value else None
+
+    # ------------------------------------------------------------------
+    # Meta
+    # ------------------------------------------------------------------
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            students = self._conn.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+            responses = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"path": self.path, "students": students, "responses": responses}
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_local_snapshot(path: str) -> Optional[LocalSnapshot]:
+    """Process-wide snapshot (None if the database cannot be opened)"""
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None:
+            try:
+                _snapshot = LocalSnapshot(path)
+                logger.warning(f"💾 Local snapshot: {path}")
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"❌ Could not open local snapshot {path}: {e}")
+                return None
+        return _snapshot
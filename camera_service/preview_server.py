@@ -0,0 +1,213 @@
+"""
+MJPEG Preview Server for Camera Service
+Serves an annotated live preview of one camera over HTTP (no display needed)
+"""
+
+import cv2
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BOUNDARY = "frame"
+
+INDEX_HTML = """<!doctype html>
+<html>
+<head><title>{title}</title></head>
+<body style="margin:0;background:#111;color:#eee;font-family:sans-serif">
+<h3 style="margin:8px">{title}</h3>
+<img src="/stream.mjpg" style="max-width:100%">
+</body>
+</html>
+"""
+
+
+class PreviewServer:
+    """
+    Local HTTP preview endpoint for a single camera.
+
+    The camera loop asks `wants_frame()` before drawing anything; it only
+    returns True while at least one viewer is connected and the FPS cap
+    allows a new frame. `publish()` JPEG-encodes the frame exactly once and
+    every connected viewer is sent the same bytes.
+
+    Endpoints:
+        /              - minimal HTML page embedding the stream
+        /stream.mjpg   - multipart MJPEG stream
+        /snapshot.jpg  - single JPEG of the next rendered frame
+    """
+
+    def __init__(self, camera_name: str, port: int, host: str = "0.0.0.0",
+                 max_fps: float = 10.0, jpeg_quality: int = 70):
+        self.camera_name = camera_name
+        self.host = host
+        self.port = port
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), int(jpeg_quality)]
+
+        self._cond = threading.Condition()
+        self._jpeg = None  # Latest encoded frame (shared by all viewers)
+        self._seq = 0  # Incremented on every publish
+        self._viewers = 0  # Connected /stream.mjpg clients + pending snapshots
+        self._last_publish = 0.0
+        self._running = False
+        self._httpd = None
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Camera-side API
+    # ------------------------------------------------------------------
+
+    @property
+    def viewer_count(self) -> int:
+        with self._cond:
+            return self._viewers
+
+    def wants_frame(self) -> bool:
+        """True if someone is watching and the FPS cap allows a new frame"""
+        with self._cond:
+            if self._viewers <= 0:
+                return False
+        return (time.monotonic() - self._last_publish) >= self.min_interval
+
+    def publish(self, frame: np.ndarray) -> bool:
+        """Encode frame once and hand the bytes to all viewers"""
+        ok, buffer = cv2.imencode(".jpg", frame, self.encode_params)
+        if not ok:
+            logger.debug(f"Preview encode failed for {self.camera_name}")
+            return False
+
+        with self._cond:
+            self._jpeg = buffer.tobytes()
+            self._seq += 1
+            self._last_publish = time.monotonic()
+            self._cond.notify_all()
+        return True
+
+    # ------------------------------------------------------------------
+    # Viewer-side API (used by the HTTP handler)
+    # ------------------------------------------------------------------
+
+    def _wait_for_frame(self, last_seq: int, timeout: float = 5.0):
+        """Block until a frame newer than last_seq is published"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._seq != last_seq or not self._running,
+                timeout=timeout
+            )
+            return self._seq, self._jpeg
+
+    def _add_viewer(self):
+        with self._cond:
+            self._viewers += 1
+            count = self._viewers
+        logger.info(f"👀 Preview viewer connected to {self.camera_name} ({count} watching)")
+
+    def _remove_viewer(self):
+        with self._cond:
+            self._viewers = max(0, self._viewers - 1)
+            count = self._viewers
+        logger.info(f"👋 Preview viewer left {self.camera_name} ({count} watching)")
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self) -> bool:
+        """Start HTTP server in a daemon thread"""
+        server = self
+        title = f"Camera - {self.camera_name}"
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug("Preview %s: %s", server.camera_name, format % args)
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/":
+                    body = INDEX_HTML.format(title=title).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif path == "/stream.mjpg":
+                    self._stream()
+                elif path == "/snapshot.jpg":
+                    self._snapshot()
+                else:
+                    self.send_error(404)
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header("Cache-Control", "no-cache, private")
+                self.send_header("Pragma", "no-cache")
+                self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+                self.end_headers()
+
+                server._add_viewer()
+                last_seq = -1
+                try:
+                    while server._running:
+                        seq, jpeg = server._wait_for_frame(last_seq)
+                        if jpeg is None or seq == last_seq:
+                            continue
+                        last_seq = seq
+                        self.wfile.write(
+                            f"--{BOUNDARY}\r\n"
+                            f"Content-Type: image/jpeg\r\n"
+                            f"Content-Length: {len(jpeg)}\r\n\r\n".encode("ascii")
+                        )
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    server._remove_viewer()
+
+            def _snapshot(self):
+                server._add_viewer()
+                try:
+                    with server._cond:
+                        last_seq = server._seq
+                    _, jpeg = server._wait_for_frame(last_seq, timeout=3.0)
+                finally:
+                    server._remove_viewer()
+
+                if jpeg is None:
+                    self.send_error(503, "No frame available yet")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(jpeg)))
+                self.end_headers()
+                self.wfile.write(jpeg)
+
+        try:
+            self._httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+            self._httpd.daemon_threads = True
+        except OSError as e:
+            logger.error(f"❌ Could not start preview server for {self.camera_name} on port {self.port}: {e}")
+            self._httpd = None
+            return False
+
+        self._running = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.warning(f"📺 Preview for {self.camera_name}: http://{self.host}:{self.port}/")
+        return True
+
+    def stop(self):
+        """Stop HTTP server and release waiting viewers"""
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
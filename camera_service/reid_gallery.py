@@ -0,0 +1,120 @@
+"""
+Re-identification Gallery for Camera Service
+Recently confirmed (embedding -> roll number) pairs of one camera, checked
+before the roster / vector store search
+"""
+
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+DUPLICATE_SIMILARITY = 0.9  # A new entry this close to one of the same student only refreshes it
+
+
+class ReIdGallery:
+    """
+    Ring buffer of the last `capacity` confirmed face embeddings of a camera.
+
+    When a track is confirmed its face embedding is added with the student's
+    roll number and roster similarity. A face seen afterwards, typically on
+    a new track after an occlusion or head turn re-created it, is compared
+    with these entries first: one (capacity x dim) product instead of a
+    roster or Pinecone search. Entries older than `ttl` seconds never match,
+    and a hit refreshes its entry, so a student who stays in view stays in
+    the gallery.
+
+    Faces of the same person a few minutes apart on the same camera are far
+    closer than a face and its enrollment photo, so `threshold` is set above
+    the roster's SIMILARITY_THRESHOLD.
+
+    Not thread-safe: each camera's gallery is used by its one AI worker.
+    """
+
+    def __init__(self, capacity: int = 256, ttl: float = 300.0, threshold: float = 0.6):
+        self.capacity = max(1, capacity)
+        self.ttl = ttl
+        self.threshold = threshold
+        self.matrix: Optional[np.ndarray] = None  # Allocated on the first add (dimension known)
+        self.rolls = [None] * self.capacity
+        self.similarities = np.zeros(self.capacity, np.float32)  # Roster similarity at confirmation
+        self.seen = np.full(self.capacity, -np.inf)  # time.monotonic() of the last add or hit
+        self.next_slot = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _live(self, now: float) -> np.ndarray:
+        return self.seen >= now - self.ttl
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def add(self, roll_number: str, embedding, similarity: float, now: Optional[float] = None):
+        """Remember a confirmed face (refreshes a near-identical entry of the same student instead)"""
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+        now = time.monotonic() if now is None else now
+        if self.matrix is None or self.matrix.shape[1] != vector.size:
+            self.matrix = np.zeros((self.capacity, vector.size), np.float32)
+            self.rolls = [None] * self.capacity
+            self.seen[:] = -np.inf
+
+        same = [i for i, roll in enumerate(self.rolls) if roll == roll_number]
+        if same:
+            scores = self.matrix[same] @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= DUPLICATE_SIMILARITY:
+                self.seen[same[best]] = now
+                return
+
+        slot = self.next_slot
+        self.next_slot = (slot + 1) % self.capacity
+        self.matrix[slot] = vector
+        self.rolls[slot] = roll_number
+        self.similarities[slot] = similarity
+        self.seen[slot] = now
+
+    def match(self, embedding, now: Optional[float] = None) -> Optional[Tuple[str, float, float]]:
+        """
+        (roll_number, gallery similarity, roster similarity) of the closest
+        live entry at or above `threshold`, or None
+        """
+        vector = self._normalize(embedding)
+        now = time.monotonic() if now is None else now
+        if vector is None or self.matrix is None or self.matrix.shape[1] != vector.size:
+            self.misses += 1
+            return None
+        live = self._live(now)
+        if not live.any():
+            self.misses += 1
+            return None
+
+        scores = np.where(live, self.matrix @ vector, -np.inf)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            self.misses += 1
+            return None
+        self.seen[best] = now
+        self.hits += 1
+        return self.rolls[best], float(scores[best]), float(self.similarities[best])
+
+    def forget(self, roll_number: str):
+        """Drop every entry of a student (e.g. removed from the roster)"""
+        for slot, roll in enumerate(self.rolls):
+            if roll == roll_number:
+                self.rolls[slot] = None
+                self.seen[slot] = -np.inf
+
+    def stats(self, now: Optional[float] = None) -> Dict:
+        now = time.monotonic() if now is None else now
+        lookups = self.hits + self.misses
+        return {
+            "entries": int(self._live(now).sum()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
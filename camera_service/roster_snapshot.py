@@ -0,0 +1,627 @@
+"""
+Roster Snapshot for Camera Service
+Immutable student map + normalized embedding matrix, swapped atomically on change
+"""
+
+import logging
+from collections import Counter
+from collections.abc import Mapping as MappingABC
+from types import MappingProxyType
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+import numpy as np
+
+from face_templates import MEAN_LABEL, student_templates
+
+logger = logging.getLogger(__name__)
+
+QUANTIZE_MODES = ("float32", "float16", "int8")
+SCAN_CHUNK_ROWS = 1024  # Compact rows widened to float32 per step of a scan
+PCA_FIT_ROWS = 20000  # Template rows (evenly spaced) a PCA projection is fitted on
+LAYER_LIMIT = 0.25  # Changed students (fraction of the base's) past which with_changes() flattens the layers
+
+
+def _quantize(matrix: np.ndarray, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(codes, per-row scales) of normalized rows: float16 codes, or int8 codes with row = codes * scale"""
+    if mode == "float16":
+        return matrix.astype(np.float16), None
+    codes = np.empty(matrix.shape, np.int8)
+    scales = np.empty(matrix.shape[0], np.float32)
+    for start in range(0, matrix.shape[0], SCAN_CHUNK_ROWS):
+        rows = matrix[start:start + SCAN_CHUNK_ROWS]
+        scale = np.abs(rows).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        codes[start:start + len(rows)] = np.rint(rows / scale[:, None])
+        scales[start:start + len(rows)] = scale
+    return codes, scales
+
+
+class PCAProjection:
+    """
+    Top principal components of the roster's template rows, for a prefilter.
+
+    For normalized rows x, query q and gallery mean m,
+        x . q = (x - m) . (q - m) + x . m + (constant for q)
+    and (x - m) . (q - m) is approximated in the component space, so
+    `project(x) . project(q) + x . m` ranks the rows like x . q minus the
+    variance the components leave out.
+
+    `changed` counts students upserted or deleted since the fit; a snapshot
+    refits once it passes `refit` x the students the projection was fitted on.
+    """
+
+    __slots__ = ("mean", "components", "explained", "fitted_students", "changed")
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, explained: float, fitted_students: int,
+                 changed: int = 0):
+        self.mean = mean
+        self.components = components
+        self.explained = explained
+        self.fitted_students = fitted_students
+        self.changed = changed
+
+    @classmethod
+    def fit(cls, matrix: np.ndarray, dims: int, students: int) -> "PCAProjection":
+        rows = matrix
+        if rows.shape[0] > PCA_FIT_ROWS:
+            rows = matrix[np.linspace(0, rows.shape[0] - 1, PCA_FIT_ROWS).astype(np.intp)]
+        rows = np.asarray(rows, dtype=np.float32)
+        mean = rows.mean(axis=0)
+        centered = rows - mean
+        eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered)  # Ascending
+        top = eigenvectors[:, ::-1][:, :dims]
+        explained = float(eigenvalues[::-1][:dims].sum() / max(eigenvalues.sum(), 1e-12))
+        return cls(mean.astype(np.float32), np.ascontiguousarray(top, dtype=np.float32), explained, students)
+
+    @property
+    def dims(self) -> int:
+        return self.components.shape[1]
+
+    def project(self, rows: np.ndarray) -> np.ndarray:
+        """(rows x dims) coordinates of (rows x dim) vectors, centered on the mean"""
+        projected = np.empty((rows.shape[0], self.dims), np.float32)
+        for start in range(0, rows.shape[0], SCAN_CHUNK_ROWS):
+            np.dot(rows[start:start + SCAN_CHUNK_ROWS] - self.mean, self.components,
+                   out=projected[start:start + SCAN_CHUNK_ROWS])
+        return projected
+
+    def after(self, changed: int) -> "PCAProjection":
+        """Same projection, `changed` more students changed since the fit"""
+        return PCAProjection(self.mean, self.components, self.explained, self.fitted_students, self.changed + changed)
+
+    def stale(self, refit: float) -> bool:
+        return self.changed > refit * max(1, self.fitted_students)
+
+
+def _compact_scores(codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+    """Approximate cosine of every compact row with a normalized float32 query"""
+    if codes.dtype == np.float32:
+        return codes @ query
+    scores = np.empty(codes.shape[0], np.float32)
+    buffer = np.empty((min(SCAN_CHUNK_ROWS, codes.shape[0]), codes.shape[1]), np.float32)
+    for start in range(0, codes.shape[0], SCAN_CHUNK_ROWS):
+        block = codes[start:start + SCAN_CHUNK_ROWS]
+        rows = buffer[:len(block)]
+        np.copyto(rows, block, casting="unsafe")  # Widen in cache-sized steps, never the whole matrix
+        np.dot(rows, query, out=scores[start:start + len(block)])
+    if scales is not None:
+        scores *= scales
+    return scores
+
+
+def _labels_for(student: Optional[Dict], rows: int) -> Tuple[str, ...]:
+    """Template labels of a student's `rows` templates (from its document when they fit)"""
+    labels = tuple((student or {}).get("template_labels") or ())
+    if len(labels) == rows:
+        return labels
+    return (MEAN_LABEL,) if rows == 1 else tuple(f"t{i}" for i in range(rows))
+
+
+class _RowSlices(MappingABC):
+    """{roll_number: rows[start:end]} without materializing a slice per student"""
+
+    __slots__ = ("_index", "_rows")
+
+    def __init__(self, index: Mapping[str, Tuple[int, int]], rows):
+        self._index = index
+        self._rows = rows
+
+    def __getitem__(self, roll: str):
+        start, end = self._index[roll]
+        return self._rows[start:end]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class _Layered(MappingABC):
+    """{roll_number: value} of a layered snapshot: its own rows first, then the base's unless masked"""
+
+    __slots__ = ("_top", "_base", "_masked", "_len")
+
+    def __init__(self, top: Mapping, base: Mapping, masked: frozenset):
+        self._top = top
+        self._base = base
+        self._masked = masked
+        self._len = len(top) + len(base) - sum(1 for roll in masked if roll in base)
+
+    def __getitem__(self, roll: str):
+        if roll in self._top:
+            return self._top[roll]
+        if roll in self._masked:
+            raise KeyError(roll)
+        return self._base[roll]
+
+    def __contains__(self, roll) -> bool:
+        return roll in self._top or (roll not in self._masked and roll in self._base)
+
+    def __iter__(self):
+        yield from self._top
+        for roll in self._base:
+            if roll not in self._masked:
+                yield roll
+
+    def __len__(self) -> int:
+        return self._len
+
+
+class RosterSnapshot:
+    """
+    One consistent, read-only version of the student roster.
+
+    `matrix` holds every usable face template L2-normalized as float32 rows
+    (several per student: front / left / right / far, or the single
+    `embedding` for older enrollments, see face_templates). A student's rows
+    are adjacent: `rolls[i]` owns rows `starts[i]` up to `starts[i + 1]` and
+    `owners[row]` is the index into `rolls` of a row's student. A local
+    match is one matrix-vector product followed by a max per student
+    (`np.maximum.reduceat` over `starts`).
+
+    Snapshots are never modified: `with_changes()` builds the next version
+    and the owner publishes it by rebinding one attribute. A reader that
+    takes a reference at the start of a match uses the same version for the
+    scores and the student lookup, without locks.
+
+    The next version is layered rather than copied: its own `matrix` holds
+    only the rows of the students changed since a flat `base` snapshot,
+    whose rows (and prefilter) are shared as they are, and `masked` hides
+    the base students deleted or replaced since. A memory-mapped export
+    therefore stays mapped across deltas. Past LAYER_LIMIT x the base's
+    students changed, `with_changes()` flattens everything into one new
+    matrix in RAM (RosterSync re-maps a fresh export before that).
+
+    Templates that are zero or of a different dimension than the rest of the
+    roster are left out of the matrix (the student still is in `students`).
+
+    `batches` maps each batch_id to its own (rolls, starts, matrix) slice so
+    a camera can match against its batch's rows before the whole roster.
+    Students are laid out batch by batch, so every batch slice is a view.
+    `vectors` and `labels` are per-student views of `matrix` and the row
+    labels (and of the base's, when layered): the normalized rows are the
+    only float32 copy of the roster.
+
+    Whole-roster searches can use a prefilter: a scan copy of the rows
+    (`codes`, `scales`) finds the `rerank` best students and only those are
+    re-scored against the float32 rows; batch searches stay exact. The scan
+    copy is the matrix compressed with `quantize` = "float16" or "int8"
+    (per-row scale), and/or projected on `pca_dims` principal components
+    (PCAProjection, plus a per-row `bias`). The projection is carried over
+    by `with_changes()` and refitted once `pca_refit` x its students have
+    changed. When `matrix` is the memory-mapped embedding export the float32
+    rows stay on disk apart from the re-ranked ones.
+    """
+
+    __slots__ = ("version", "students", "vectors", "labels", "rolls", "starts", "owners", "roll_index",
+                 "matrix", "dim", "batches", "quantize", "rerank", "pca_dims", "pca_refit", "projection",
+                 "codes", "scales", "bias", "base", "masked", "hidden")
+
+    def __init__(self, students: Mapping[str, Dict], vectors: Mapping[str, np.ndarray], version: int = 0,
+                 labels: Optional[Mapping[str, Tuple[str, ...]]] = None, quantize: str = "float32",
+                 rerank: int = 16, pca_dims: int = 0, pca_refit: float = 0.1,
+                 projection: Optional[PCAProjection] = None, base: Optional["RosterSnapshot"] = None,
+                 masked: Iterable[str] = ()):
+        """
+        Args:
+            vectors: {roll_number: (templates x dim) float32} - a 1-D
+                     vector is one template
+            labels: {roll_number: template labels} (default: the document's
+                    `template_labels`, or "mean" for a single template)
+            quantize: Compact scan copy: "float32" (none), "float16" or "int8"
+            rerank: Students re-scored in float32 after a prefilter scan
+            pca_dims: Principal components of the PCA prefilter (0 = off)
+            pca_refit: Fraction of students changed that triggers a refit
+            projection: Projection to reuse (from the previous snapshot)
+            base: Flat snapshot under `vectors` (which are then only the
+                  changed students, see with_changes)
+            masked: Students of `base` hidden by this snapshot
+        """
+        self.version = version
+        self.students = MappingProxyType(dict(students))
+        self._set_mode(quantize, rerank, pca_dims, pca_refit, projection)
+        vectors = {roll: np.atleast_2d(v) for roll, v in vectors.items()}
+        labels = labels or {}
+
+        dims = Counter(v.shape[1] for v in vectors.values())
+        self.dim = dims.most_common(1)[0][0] if dims else 0
+        if base is not None and base.dim:
+            self.dim = base.dim
+        rolls = []
+        blocks = []
+        row_labels = []
+        # Batch by batch (then roll) so each batch's rows are one contiguous slice
+        ordered = sorted(vectors, key=lambda roll: (str(self.students.get(roll, {}).get("batch_id") or ""), roll))
+        for roll in ordered:
+            templates = vectors[roll]
+            if templates.shape[1] != self.dim:
+                logger.warning(f"Skipping embedding for {roll}: dim {templates.shape[1]} != {self.dim}")
+                continue
+            norms = np.linalg.norm(templates, axis=1)
+            keep = norms > 0
+            if not keep.any():
+                continue
+            student_labels = tuple(labels.get(roll) or _labels_for(self.students.get(roll), templates.shape[0]))
+            blocks.append(templates[keep] / norms[keep, None])
+            row_labels += [label for label, kept in zip(student_labels, keep) if kept]
+            rolls.append(roll)
+
+        matrix = np.vstack(blocks).astype(np.float32, copy=False) if blocks else np.empty((0, self.dim), np.float32)
+        matrix.setflags(write=False)
+        self._set_matrix(matrix, rolls, [block.shape[0] for block in blocks])
+        self._set_layers(base, masked, _RowSlices(self.roll_index, matrix),
+                         _RowSlices(self.roll_index, tuple(row_labels)))
+
+    def _set_mode(self, quantize: str, rerank: int, pca_dims: int, pca_refit: float,
+                  projection: Optional[PCAProjection]):
+        if quantize not in QUANTIZE_MODES:
+            raise ValueError(f"quantize must be one of {QUANTIZE_MODES}, got '{quantize}'")
+        self.quantize = quantize
+        self.rerank = max(1, int(rerank))
+        self.pca_dims = max(0, int(pca_dims))
+        self.pca_refit = pca_refit
+        self.projection = projection if self.pca_dims else None
+
+    def options(self) -> Dict:
+        """Prefilter settings, to build the next snapshot the same way"""
+        return {"quantize": self.quantize, "rerank": self.rerank, "pca_dims": self.pca_dims,
+                "pca_refit": self.pca_refit}
+
+    def _set_matrix(self, matrix: np.ndarray, rolls, counts):
+        self.matrix = matrix
+        self.rolls = tuple(rolls)
+        counts = np.asarray(counts, dtype=np.intp)
+        self.starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp) if len(counts) \
+            else np.empty(0, np.intp)
+        self.owners = np.repeat(np.arange(len(self.rolls)), counts)  # Template row -> index into rolls
+        ends = self.starts + counts
+        self.roll_index = MappingProxyType({
+            roll: (int(start), int(end)) for roll, start, end in zip(self.rolls, self.starts, ends)
+        })
+
+        batch_students = {}
+        for i, roll in enumerate(self.rolls):
+            batch_students.setdefault(self.students.get(roll, {}).get("batch_id"), []).append(i)
+        batches = {}
+        for batch_id, members in batch_students.items():
+            if batch_id is None:
+                continue
+            first, last = members[0], members[-1]
+            member_counts = counts[members]
+            if last - first + 1 == len(members):
+                batch_matrix = matrix[self.starts[first]:ends[last]]  # Already contiguous: a view, no copy
+            else:
+                rows = np.concatenate([np.arange(self.starts[i], ends[i]) for i in members])
+                batch_matrix = matrix[rows]  # Fancy indexing copies: contiguous per-batch block
+                batch_matrix.setflags(write=False)
+            batch_starts = np.concatenate(([0], np.cumsum(member_counts)[:-1])).astype(np.intp)
+            batches[batch_id] = (tuple(self.rolls[i] for i in members), batch_starts, batch_matrix)
+        self.batches = MappingProxyType(batches)
+
+        self._set_prefilter(matrix)
+
+    def _set_layers(self, base: Optional["RosterSnapshot"], masked: Iterable[str], vectors: Mapping,
+                    labels: Mapping):
+        self.base = base
+        self.masked = frozenset(masked) if base is not None else frozenset()
+        if base is None:
+            self.hidden = MappingProxyType({})
+            self.vectors = vectors
+            self.labels = labels
+            return
+
+        # Index of every masked base student, in the whole roster (None) and in its batch
+        hidden = {}
+        for roll in self.masked:
+            rows = base.roll_index.get(roll)
+            if rows is None:
+                continue
+            hidden.setdefault(None, []).append(int(np.searchsorted(base.starts, rows[0])))
+            batch_id = base.students.get(roll, {}).get("batch_id")
+            entry = base.batches.get(batch_id)
+            if entry is not None:
+                hidden.setdefault(batch_id, []).append(entry[0].index(roll))
+        self.hidden = MappingProxyType({key: np.array(sorted(indices), np.intp) for key, indices in hidden.items()})
+        self.vectors = _Layered(vectors, base.vectors, self.masked)
+        self.labels = _Layered(labels, base.labels, self.masked)
+
+    def _set_prefilter(self, matrix: np.ndarray):
+        self.codes = self.scales = self.bias = None
+        if len(self.rolls) <= self.rerank or (self.quantize == "float32" and not self.pca_dims):
+            return
+        scan = matrix
+        if self.pca_dims:
+            projection = self.projection
+            dims = min(self.pca_dims, self.dim)
+            if projection is None or projection.stale(self.pca_refit) or projection.dims != dims \
+                    or projection.mean.shape[0] != self.dim:
+                projection = PCAProjection.fit(matrix, dims, len(self.rolls))
+                logger.info(f"PCA prefilter fitted: {self.dim} -> {dims} dims, "
+                            f"{projection.explained:.1%} of variance ({len(self.rolls)} students)")
+            self.projection = projection
+            scan = projection.project(matrix)
+            self.bias = matrix @ projection.mean
+        if self.quantize != "float32":
+            self.codes, self.scales = _quantize(scan, self.quantize)
+        else:
+            self.codes = scan
+
+    @classmethod
+    def empty(cls, **options) -> "RosterSnapshot":
+        return cls({}, {}, version=0, **options)
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict], version: int = 0, **options) -> "RosterSnapshot":
+        """Build from student documents carrying `templates` and/or an `embedding`"""
+        students = {}
+        vectors = {}
+        labels = {}
+        for doc in documents:
+            roll = doc.get("roll_number")
+            if not roll:
+                continue
+            students[roll] = doc
+            student_labels, templates = student_templates(doc)
+            if templates is not None:
+                vectors[roll] = templates
+                labels[roll] = student_labels
+        return cls(students, vectors, version, labels, **options)
+
+    @classmethod
+    def from_export(cls, index: Dict, matrix: np.ndarray, quantize: str = "float32", rerank: int = 16,
+                    pca_dims: int = 0, pca_refit: float = 0.1) -> "RosterSnapshot":
+        """
+        Wrap a backend embedding export (see backend/embedding_export.py)
+
+        The export's rows are already normalized and grouped by student and
+        batch, so `matrix` (usually a read-only memory map) is used as-is: no
+        copy of the embeddings is made, and every batch slice is a view into it.
+        """
+        students = index["students"]
+        counts = index["templates"]
+        rolls = [doc["roll_number"] for doc in students[:len(counts)]]
+        matrix = np.asarray(matrix)  # Plain ndarray view of the map: cheaper row slicing than np.memmap
+        snapshot = cls.__new__(cls)
+        snapshot.version = index["version"]
+        snapshot.students = MappingProxyType({doc["roll_number"]: doc for doc in students})
+        snapshot.dim = index["dim"]
+        snapshot._set_mode(quantize, rerank, pca_dims, pca_refit, None)
+        snapshot._set_matrix(matrix, rolls, counts)
+        snapshot._set_layers(None, (), _RowSlices(snapshot.roll_index, matrix),
+                             _RowSlices(snapshot.roll_index, tuple(index["labels"])))
+        return snapshot
+
+    def with_changes(self, upserts: Iterable[Dict] = (), deletes: Iterable[str] = (),
+                     version: Optional[int] = None) -> "RosterSnapshot":
+        """
+        New snapshot with deletes then upserts applied (self is unchanged)
+
+        Only the changed students' rows are built: they are layered over the
+        flat base (self, or self's base) with the base's students they
+        delete or replace masked. Past LAYER_LIMIT x the base's students
+        changed the result is one flat snapshot again.
+        """
+        base = self if self.base is None else self.base
+        students = dict(self.students)
+        vectors = {roll: self.matrix[start:end] for roll, (start, end) in self.roll_index.items()} \
+            if self.base is not None else {}
+        labels = {roll: self.labels[roll] for roll in vectors}
+        masked = set(self.masked)
+        deletes = list(deletes)
+        upserts = list(upserts)
+        for roll in deletes:
+            students.pop(roll, None)
+            vectors.pop(roll, None)
+            labels.pop(roll, None)
+            if roll in base.roll_index:
+                masked.add(roll)
+        for doc in upserts:
+            roll = doc.get("roll_number")
+            if not roll:
+                continue
+            students[roll] = doc
+            if roll in base.roll_index:
+                masked.add(roll)
+            student_labels, templates = student_templates(doc)
+            if templates is not None:
+                vectors[roll] = templates
+                labels[roll] = student_labels
+            else:
+                vectors.pop(roll, None)
+                labels.pop(roll, None)
+        version = self.version if version is None else version
+
+        changed = len(masked.union(vectors))
+        if changed <= LAYER_LIMIT * len(base.rolls):
+            return RosterSnapshot(students, vectors, version, labels, projection=base.projection, base=base,
+                                  masked=masked, **self.options())
+
+        for roll in base.roll_index:
+            if roll not in masked:
+                vectors[roll] = base.vectors[roll]
+                labels[roll] = base.labels[roll]
+        if base.rolls:
+            logger.info(f"Roster snapshot flattened: {changed} of {len(base.rolls)} students changed")
+        projection = base.projection.after(changed) if base.projection is not None else None
+        return RosterSnapshot(students, vectors, version, labels, projection=projection, **self.options())
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.students)
+
+    def get(self, roll_number: str) -> Optional[Dict]:
+        return self.students.get(roll_number)
+
+    def embedding(self, roll_number: str) -> Optional[np.ndarray]:
+        """Normalized template rows of a student (read-only view)"""
+        rows = self.roll_index.get(roll_number)
+        if rows is None:
+            return self.base.embedding(roll_number) if self._in_base(roll_number) else None
+        return self.matrix[rows[0]:rows[1]]
+
+    def _in_base(self, roll_number: str) -> bool:
+        """A student whose rows this snapshot takes from its base"""
+        return self.base is not None and roll_number not in self.masked and roll_number in self.base.roll_index
+
+    @property
+    def embeddings(self) -> Mapping[str, np.ndarray]:
+        """{roll_number: normalized templates} for callers that predate the matrix"""
+        return self.vectors
+
+    def delta(self) -> int:
+        """Students changed since the base (0 for a flat snapshot)"""
+        return len(self.masked.union(self.roll_index)) if self.base is not None else 0
+
+    def batch_size(self, batch_id: str) -> int:
+        """Number of matchable students in a batch"""
+        entry = self.batches.get(batch_id)
+        size = len(entry[0]) if entry else 0
+        if self.base is not None:
+            size += self.base.batch_size(batch_id) - len(self.hidden.get(batch_id, ()))
+        return size
+
+    def memory(self) -> Dict[str, int]:
+        """Bytes held by the float32 rows (possibly memory-mapped) and the prefilter scan copy
+
+        A layered snapshot reports its own rows plus its base's (masked ones
+        included: they stay in the base matrix until it is flattened).
+        """
+        compact = 0
+        if self.codes is not None:
+            compact = self.codes.nbytes + sum(a.nbytes for a in (self.scales, self.bias) if a is not None)
+            if self.projection is not None:
+                compact += self.projection.components.nbytes + self.projection.mean.nbytes
+        memory = {
+            "students": len(self.vectors),
+            "templates": self.matrix.shape[0],
+            "float32_bytes": self.matrix.nbytes,
+            "float32_mapped": isinstance(self.matrix.base, np.memmap) or isinstance(self.matrix, np.memmap),
+            "compact_bytes": compact,
+            "delta_students": self.delta()
+        }
+        if self.base is not None:
+            below = self.base.memory()
+            memory["templates"] += below["templates"]
+            memory["float32_bytes"] += below["float32_bytes"]
+            memory["float32_mapped"] = below["float32_mapped"]
+            memory["compact_bytes"] += below["compact_bytes"]
+        return memory
+
+    def student_scores(self, query: np.ndarray, batch_id: Optional[str] = None) -> Optional[Tuple[Tuple[str, ...], np.ndarray]]:
+        """(rolls, best cosine similarity of each student over its templates), or None
+
+        With a prefilter a whole-roster search returns only the `rerank`
+        candidate students (of each layer), scored exactly. Base students a
+        layered snapshot masks score -inf.
+
+        Args:
+            batch_id: Only consider this batch's students (None = everyone)
+        """
+        layers = self._layer_scores(query, batch_id)
+        if not layers:
+            return None
+        if len(layers) == 1:
+            return layers[0]
+        return sum((rolls for rolls, _ in layers), ()), np.concatenate([scores for _, scores in layers])
+
+    def _layer_scores(self, query: np.ndarray, batch_id: Optional[str]) -> list:
+        """[(rolls, scores)] of this snapshot's own rows, then of its base's"""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        if query.shape[0] != self.dim:
+            if self.dim:
+                logger.warning(f"Query embedding dim {query.shape[0]} != roster dim {self.dim}")
+            return []
+        norm = float(np.linalg.norm(query))
+        if norm == 0.0:
+            return []
+        query = query / norm
+        layers = [self._scores(query, batch_id, None)]
+        if self.base is not None:
+            layers.append(self.base._scores(query, batch_id, self.hidden.get(batch_id)))
+        return [layer for layer in layers if layer is not None]
+
+    def _scores(self, query: np.ndarray, batch_id: Optional[str],
+                hidden: Optional[np.ndarray]) -> Optional[Tuple[Tuple[str, ...], np.ndarray]]:
+        """Student scores of this snapshot's own rows for a normalized query, the `hidden` indices excluded"""
+        rolls, starts, matrix = self.rolls, self.starts, self.matrix
+        if batch_id is not None:
+            entry = self.batches.get(batch_id)
+            if entry is None:
+                return None
+            rolls, starts, matrix = entry
+        if not len(rolls):
+            return None
+        if batch_id is None and self.codes is not None:
+            return self._rerank(query, hidden)
+        scores = np.maximum.reduceat(matrix @ query, starts)  # Max over each student's adjacent template rows
+        if hidden is not None:
+            scores[hidden] = -np.inf
+        return rolls, scores
+
+    def _rerank(self, query: np.ndarray, hidden: Optional[np.ndarray] = None) -> Tuple[Tuple[str, ...], np.ndarray]:
+        """Top `rerank` students by prefilter scan (plus the `hidden` ones, then dropped), re-scored on their float32 rows"""
+        if self.projection is None:
+            row_scores = _compact_scores(self.codes, self.scales, query)
+        else:
+            row_scores = _compact_scores(self.codes, self.scales, self.projection.project(query[None])[0])
+            row_scores += self.bias
+        approximate = np.maximum.reduceat(row_scores, self.starts)
+        extra = 0 if hidden is None else len(hidden)
+        candidates = np.argpartition(-approximate, min(self.rerank + extra, len(self.rolls)) - 1)
+        candidates = candidates[:self.rerank + extra]
+        if extra:
+            candidates = candidates[~np.isin(candidates, hidden)]
+        exact = np.empty(len(candidates), np.float32)
+        for i, student in enumerate(candidates):
+            start, end = self.roll_index[self.rolls[student]]
+            exact[i] = (self.matrix[start:end] @ query).max()
+        return tuple(self.rolls[i] for i in candidates), exact
+
+    def similarity(self, roll_number: str, query: np.ndarray) -> Optional[float]:
+        """Cosine similarity of `query` to one student (best template), or None if the student has no rows"""
+        entry = self.roll_index.get(roll_number)
+        if entry is None and self._in_base(roll_number):
+            return self.base.similarity(roll_number, query)
+        query = np.asarray(query, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(query))
+        if entry is None or query.shape[0] != self.dim or norm == 0.0:
+            return None
+        start, end = entry
+        return float((self.matrix[start:end] @ query).max() / norm)
+
+    def best_match(self, query: np.ndarray, batch_id: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """(roll_number, cosine similarity) of the closest student (best template), or None
+
+        Args:
+            batch_id: Only consider this batch's students (None = everyone)
+        """
+        best = None
+        for rolls, scores in self._layer_scores(query, batch_id):  # No concatenation of the layers
+            i = int(np.argmax(scores))
+            if np.isfinite(scores[i]) and (best is None or scores[i] > best[1]):
+                best = (rolls[i], float(scores[i]))
+        return best
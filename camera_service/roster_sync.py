@@ -0,0 +1,387 @@
+"""
+Roster Sync for Camera Service
+Keeps the in-memory student roster current with /api/students/changes deltas
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from backend_client import BackendClient, BackendUnavailable
+from embedding_codec import to_array
+from face_templates import decode_templates
+from roster_snapshot import RosterSnapshot
+
+logger = logging.getLogger(__name__)
+
+CURSOR_META_KEY = "students_cursor"
+
+
+def _decode_embedding(doc: Dict) -> Dict:
+    """Student document with its embedding and templates (base64 float32 or lists) as float32 arrays"""
+    fmt = doc.pop("embedding_format", None)
+    if doc.get("embedding") is not None:
+        doc["embedding"] = to_array(doc["embedding"], fmt)
+    if doc.get("templates") is not None:
+        doc["templates"] = decode_templates(doc["templates"], doc.get("template_labels"), fmt)
+    return doc
+
+
+class RosterSync:
+    """
+    Process-wide student roster shared by every camera's FaceDatabase.
+
+    The roster is pulled with a version cursor: `since=0` returns the whole
+    roster plus the current cursor, later pulls return only students
+    upserted or deleted after it. A loop task on the backend event loop
+    pulls every `interval` seconds. Each change builds a new RosterSnapshot
+    and publishes it by rebinding `current`, so readers never see a
+    half-applied update and never wait on a lock.
+
+    With a LocalSnapshot the roster and cursor are persisted: a restart
+    loads the snapshot and only asks the backend for what changed since,
+    and a node that cannot reach the backend starts from the snapshot.
+    Backends without /students/changes (404) get a full /students pull.
+
+    With an EmbeddingCache the initial roster comes from the backend's binary
+    snapshot instead of JSON: it is downloaded only when its version changed,
+    memory-mapped, and the delta pull then starts from its version. Offline,
+    the cached copy is used unless the local snapshot is newer.
+
+    `snapshot_options` (quantize, rerank) are passed to every RosterSnapshot
+    built, see RosterSnapshot for the compact index modes.
+
+    Deltas are layered over the roster they start from (see RosterSnapshot),
+    so the export stays memory-mapped. Once more than `remap` x its students
+    changed, the next pull re-maps a fresh export of the same version instead.
+
+    The backend allocates a version just before each write, so a write can
+    land after a higher version was already pulled. Each pull therefore
+    starts `overlap` versions below the cursor and skips the students whose
+    stored version it already has.
+
+    Listeners added with `add_listener(callback)` are called in an executor
+    thread after each publish as `callback(upserts, deletes, previous)`, with
+    the RosterSnapshot that was replaced; a full reload reports students
+    that disappeared as deletes.
+    """
+
+    def __init__(self, backend: BackendClient, snapshot=None, interval: float = 30.0,
+                 page_size: int = 500, embedding_cache=None, snapshot_options: Optional[Dict] = None,
+                 overlap: int = 100, remap: float = 0.05):
+        self.backend = backend
+        self.snapshot = snapshot
+        self.embedding_cache = embedding_cache
+        self.interval = interval
+        self.page_size = page_size
+        self.overlap = max(0, overlap)
+        self.remap = remap
+        self.snapshot_options = dict(snapshot_options or {})
+        self.cursor = 0
+        self.current = RosterSnapshot.empty(**self.snapshot_options)  # Replaced on every change, never mutated
+        self.loaded = False
+        self.last_sync = None
+        self.delta_supported = True
+        self._load_lock = threading.Lock()
+        self._pull_lock = None  # asyncio.Lock, created on the backend loop
+        self._task = None
+        self._listeners = []
+
+    # ------------------------------------------------------------------
+    # Thread-facing API
+    # ------------------------------------------------------------------
+
+    def load(self, timeout: float = 30.0):
+        """
+        Initial load (idempotent; later callers get the already-loaded roster)
+
+        Raises:
+            BackendUnavailable: backend unreachable and no local snapshot
+        """
+        with self._load_lock:
+            if self.loaded:
+                return
+            from_export, downloaded = self._load_export(timeout)
+            from_snapshot = from_export or self._load_snapshot()
+            try:
+                self.backend.call(self.pull(), timeout=timeout)
+            except BackendUnavailable as e:
+                if not from_snapshot:
+                    raise
+                logger.warning(f"💾 Backend unreachable - using roster snapshot ({e})")
+            self.loaded = True
+            if downloaded and self.snapshot is not None:
+                # Keep the SQLite roster complete for offline starts, off the startup path
+                self.backend.submit(self._persist_current())
+
+    @property
+    def students(self):
+        return self.current.students
+
+    @property
+    def embeddings(self):
+        return self.current.embeddings
+
+    def add_listener(self, callback):
+        """Call `callback(upserts, deletes, previous)` after every published change"""
+        self._listeners.append(callback)
+
+    def start(self):
+        """Start periodic delta pulls on the backend loop"""
+        if self._task is None and self.interval > 0:
+            self._task = self.backend.submit(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # ------------------------------------------------------------------
+    # Backend loop
+    # ------------------------------------------------------------------
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.pull()
+            except BackendUnavailable as e:
+                logger.debug(f"Roster sync skipped: {e}")
+            except Exception as e:
+                logger.error(f"Roster sync failed: {e}")
+
+    async def pull(self) -> int:
+        """Fetch and apply all changes after the current cursor; returns number applied"""
+        if self._pull_lock is None:
+            self._pull_lock = asyncio.Lock()
+        async with self._pull_lock:
+            if not self.delta_supported:
+                return await self._pull_full()
+
+            applied = 0
+            # since=0 is a full pull, so the overlap stops at 1
+            since = max(1, self.cursor - self.overlap) if self.cursor > 0 else 0
+            while True:
+                response = await self.backend.fetch_student_changes(since, self.page_size)
+                if response.status_code == 404:
+                    logger.warning("⚠️ Backend has no /students/changes - falling back to full roster pulls")
+                    self.delta_supported = False
+                    return await self._pull_full()
+                if not response.ok or not isinstance(response.data, dict):
+                    raise BackendUnavailable(f"roster changes: HTTP {response.status_code}")
+
+                page = response.data
+                full = page.get("full", False)
+                since = page.get("cursor", since)
+                upserts, deletes = page.get("upserts", []), page.get("deletes", [])
+                if not full:
+                    upserts, deletes = self._unseen(upserts, deletes, page.get("delete_versions"))
+                await self._apply(upserts, deletes, full=full, cursor=since if full else max(since, self.cursor))
+                applied += len(upserts) + len(deletes)
+                if not page.get("has_more"):
+                    break
+            self.last_sync = time.time()
+            current = self.current
+            if self.embedding_cache is not None and current.base is not None \
+                    and current.delta() > self.remap * len(current.base.rolls):
+                await self._remap_export()
+            return applied
+
+    def _unseen(self, upserts, deletes, delete_versions: Optional[Dict]):
+        """Changes not yet applied: the overlap re-reads versions the roster may already have"""
+        current = self.current.students
+
+        def version(roll):
+            return (current.get(roll) or {}).get("version") or 0
+
+        upserts = [doc for doc in upserts if doc.get("version") is None or doc["version"] > version(doc.get("roll_number"))]
+        deletes = [
+            roll for roll in deletes
+            if roll in current and (delete_versions is None or delete_versions.get(roll, 0) > version(roll))
+        ]
+        return upserts, deletes
+
+    async def _pull_full(self) -> int:
+        response = await self.backend.get("/students", params={"fields": "all", "embeddings": "base64"}, timeout=10)
+        if not response.ok or not isinstance(response.data, list):
+            raise BackendUnavailable(f"roster: HTTP {response.status_code}")
+        await self._apply(response.data, [], full=True, cursor=0)
+        self.last_sync = time.time()
+        return len(response.data)
+
+    async def _apply(self, upserts: Iterable[Dict], deletes: Iterable[str], full: bool, cursor: int):
+        upserts = list(upserts)
+        deletes = list(deletes)
+        loop = asyncio.get_running_loop()
+        if not full and not upserts and not deletes:
+            await loop.run_in_executor(None, self._set_cursor, cursor)  # SQLite write
+            return
+
+        # Build the next version off to the side (and off the loop: layout, PCA refit,
+        # quantization), then publish it in one assignment
+        previous = self.current
+        upserts, current = await loop.run_in_executor(None, self._build, previous, upserts, deletes, full, cursor)
+        self.current = current
+        if full:
+            deletes = [roll for roll in previous.students if roll not in current.students]
+        if self._listeners:
+            # Listeners may write to disk (vector store mirror): keep them off the loop too
+            await loop.run_in_executor(None, self._notify, upserts, deletes, previous)
+
+        if full:
+            logger.info(f"✅ Loaded {len(self.current)} students from MongoDB (cursor {cursor})")
+        else:
+            logger.warning(f"🔄 Roster sync: {len(upserts)} upserted, {len(deletes)} deleted (cursor {cursor})")
+
+        if self.snapshot is not None:
+            try:
+                await loop.run_in_executor(None, self._persist, upserts, deletes, full, cursor)
+            except Exception as e:
+                logger.warning(f"Could not update roster snapshot: {e}")
+        self.cursor = cursor
+
+    def _build(self, previous: RosterSnapshot, upserts, deletes, full: bool, cursor: int):
+        upserts = [_decode_embedding(doc) for doc in upserts]
+        base = RosterSnapshot.empty(**self.snapshot_options) if full else previous
+        return upserts, base.with_changes(upserts, deletes, version=cursor)
+
+    def _notify(self, upserts, deletes, previous: RosterSnapshot):
+        for callback in self._listeners:
+            try:
+                callback(upserts, deletes, previous)
+            except Exception as e:
+                logger.warning(f"Roster listener failed: {e}")
+
+    def _set_cursor(self, cursor: int):
+        if cursor != self.cursor:
+            self.cursor = cursor
+            if self.snapshot is not None:
+                self.snapshot.set_meta(CURSOR_META_KEY, str(cursor))
+
+    def _persist(self, upserts, deletes, full: bool, cursor: int):
+        if deletes:
+            self.snapshot.delete_students(deletes)
+        counts = self.snapshot.save_students(upserts, replace=full)
+        self.snapshot.set_meta(CURSOR_META_KEY, str(cursor))
+        if counts["upserted"] or counts["deleted"]:
+            logger.info(f"💾 Roster snapshot updated: {counts}")
+
+    # ------------------------------------------------------------------
+    # Local snapshot
+    # ------------------------------------------------------------------
+
+    def _load_export(self, timeout: float):
+        """Seed roster + cursor from the binary embedding snapshot; (seeded, downloaded)"""
+        if self.embedding_cache is None:
+            return False, False
+        try:
+            cached, downloaded = self.backend.call(self.embedding_cache.refresh(), timeout=timeout)
+        except BackendUnavailable as e:
+            cached, downloaded = self.embedding_cache.cached(), False
+            local_cursor = self.snapshot.get_meta(CURSOR_META_KEY) if self.snapshot is not None else None
+            if cached is not None and local_cursor and int(local_cursor) > cached[0]["version"]:
+                logger.warning(f"💾 Embedding snapshot v{cached[0]['version']} is older than the local roster ({e})")
+                return False, False
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"❌ Embedding snapshot unusable: {e}")
+            return False, False
+        if cached is None:
+            return False, False
+
+        index, matrix = cached
+        self.current = RosterSnapshot.from_export(index, matrix, **self.snapshot_options)
+        self.cursor = index["version"]
+        logger.warning(f"💾 Loaded {len(self.current)} students from embedding snapshot v{self.cursor} "
+                       f"({'downloaded' if downloaded else 'cached'}, memory-mapped)")
+        return True, downloaded
+
+    async def _remap_export(self):
+        """Replace a layered roster with the export of the same version (its delta folded into the map)"""
+        try:
+            cached, _ = await self.embedding_cache.refresh()
+        except (BackendUnavailable, OSError, ValueError, KeyError) as e:
+            logger.debug(f"Embedding snapshot re-map skipped: {e}")
+            return
+        if cached is None or cached[0]["version"] != self.cursor:
+            return  # Export behind or past the applied changes: keep layering, retry after the next pull
+
+        index, matrix = cached
+        delta = self.current.delta()
+        loop = asyncio.get_running_loop()
+        self.current = await loop.run_in_executor(
+            None, lambda: RosterSnapshot.from_export(index, matrix, **self.snapshot_options)
+        )
+        logger.info(f"💾 Roster re-mapped from embedding snapshot v{self.cursor} ({delta} changed students folded in)")
+
+    async def _persist_current(self):
+        if self._pull_lock is None:
+            self._pull_lock = asyncio.Lock()
+        async with self._pull_lock:  # Deltas persisted after this one must land on top of it
+            current, cursor = self.current, self.cursor
+            students = [
+                dict(doc, templates=current.vectors.get(roll), template_labels=current.labels.get(roll))
+                for roll, doc in current.students.items()
+            ]
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, self._persist, students, [], True, cursor)
+            except Exception as e:
+                logger.warning(f"Could not update roster snapshot: {e}")
+
+    def _load_snapshot(self) -> bool:
+        """Seed roster + cursor from the local snapshot; True if any students were found"""
+        if self.snapshot is None:
+            return False
+        try:
+            rows = self.snapshot.load_students()
+            cursor = self.snapshot.get_meta(CURSOR_META_KEY)
+        except Exception as e:
+            logger.error(f"❌ Could not read roster snapshot: {e}")
+            return False
+        if not rows:
+            return False
+
+        students = {}
+        vectors = {}
+        for student, embedding in rows:
+            roll = student["roll_number"]
+            students[roll] = student
+            if embedding is not None:
+                vectors[roll] = embedding
+        # No cursor (snapshot written by a full /students pull): the first pull is a full one
+        self.cursor = int(cursor) if cursor else 0
+        self.current = RosterSnapshot(students, vectors, version=self.cursor, **self.snapshot_options)
+
+        synced_at = self.snapshot.students_synced_at()
+        age = f"{time.time() - synced_at:.0f}s old" if synced_at else "age unknown"
+        logger.warning(f"💾 Loaded {len(students)} students from local snapshot ({age}, cursor {self.cursor})")
+        return True
+
+    def stats(self) -> Dict:
+        current = self.current
+        memory = current.memory()
+        return {
+            "students": len(current),
+            "embeddings": memory["students"],
+            "templates": memory["templates"],
+            "delta_students": memory["delta_students"],
+            "version": current.version,
+            "cursor": self.cursor,
+            "last_sync": self.last_sync,
+            "delta_supported": self.delta_supported
+        }
+
+
+_roster_sync = None
+_roster_sync_lock = threading.Lock()
+
+
+def get_roster_sync(backend: BackendClient, snapshot=None, **kwargs) -> RosterSync:
+    """Process-wide roster (singleton pattern)"""
+    global _roster_sync
+    with _roster_sync_lock:
+        if _roster_sync is None:
+            _roster_sync = RosterSync(backend, snapshot, **kwargs)
+        return _roster_sync
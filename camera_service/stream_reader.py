@@ -0,0 +1,382 @@
+"""
+Stream Reader for Camera Service
+Opens RTSP/HTTP/file/local camera sources on a dedicated grabber thread
+"""
+
+import cv2
+import logging
+import os
+import platform
+import threading
+import time
+from typing import Callable, NamedTuple, Optional, Union
+
+import numpy as np
+
+from frame_pool import FramePool, PooledFrame, ensure_pool
+
+logger = logging.getLogger(__name__)
+
+# Bare IPs/hostnames (no scheme) are expanded with this template
+CAMERA_URL_TEMPLATE = os.getenv("CAMERA_URL_TEMPLATE", "rtsp://{ip}/")
+RTSP_TRANSPORT = os.getenv("RTSP_TRANSPORT", "tcp")
+
+# Prefer TCP for RTSP: UDP drops packets on busy campus networks -> smeared frames
+if RTSP_TRANSPORT and "OPENCV_FFMPEG_CAPTURE_OPTIONS" not in os.environ:
+    os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = f"rtsp_transport;{RTSP_TRANSPORT}"
+
+VIDEO_FILE_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".m4v", ".mpg", ".mpeg", ".webm")
+
+# Capture modes
+CAPTURE_MODE_READ = "read"  # cap.read() every frame (decode everything)
+CAPTURE_MODE_GRAB = "grab"  # cap.grab() every frame, cap.retrieve() only for frames someone will use
+CAPTURE_MODES = (CAPTURE_MODE_READ, CAPTURE_MODE_GRAB)
+
+
+class CapturedFrame(NamedTuple):
+    """
+    A decoded frame handed from the grabber thread to the camera loop.
+
+    The caller owns one reference to `buffer` and must `release()` it; pass
+    `buffer.retain()` to anything (e.g. the AI worker) that outlives the call.
+    `frame` is read-only - it is the pool buffer itself, not a copy.
+    """
+    seq: int  # Publish sequence (changes on every published frame)
+    frame: np.ndarray
+    index: int  # Grabbed-frame counter at capture time
+    infer: bool  # True if this frame (or a skipped one before it) is due for AI
+    buffer: PooledFrame
+
+    def release(self):
+        self.buffer.release()
+
+
+def resolve_source(address) -> Optional[Union[int, str]]:
+    """
+    Turn a camera's configured address into something cv2.VideoCapture accepts
+
+    Args:
+        address: Camera `ip_address` field - an RTSP/HTTP URL, file path or
+                 file:// URL, a local device index ("0"), or a bare IP/host
+
+    Returns:
+        Device index (int), URL/path (str), or None if nothing is configured
+    """
+    if address is None:
+        return None
+    if isinstance(address, int):
+        return address
+
+    address = str(address).strip()
+    if not address:
+        return None
+    if address.isdigit():
+        return int(address)
+    if address.startswith("file://"):
+        return address[len("file://"):]
+    if "://" in address:
+        return address
+    if os.path.exists(address) or address.lower().endswith(VIDEO_FILE_EXTENSIONS):
+        return address
+    return CAMERA_URL_TEMPLATE.format(ip=address)
+
+
+def is_file_source(source) -> bool:
+    """True if source is a local video file (paced to its native FPS and looped)"""
+    return isinstance(source, str) and "://" not in source
+
+
+def describe_source(source) -> str:
+    """Source string safe for logs (strips user:password from URLs)"""
+    if isinstance(source, str) and "://" in source and "@" in source:
+        scheme, rest = source.split("://", 1)
+        return f"{scheme}://***@{rest.split('@', 1)[1]}"
+    return str(source)
+
+
+class StreamReader:
+    """
+    Background grabber that always holds only the newest decoded frame.
+
+    A slow consumer (display, AI hand-off) never builds up a backlog: older
+    frames are overwritten. When the stream drops, the grabber releases the
+    capture and reconnects with exponential backoff. Video files are paced
+    at their native FPS and looped so they behave like a live camera.
+
+    In "grab" mode every frame is only grabbed (advancing the stream without
+    decoding) and retrieved when it is due for inference (every
+    `infer_every_n` grabbed frames) or for display (at most `display_fps`,
+    and only while `display_wanted()` returns True). "read" mode decodes
+    every frame, as the original capture loop did.
+    """
+
+    def __init__(self, source, name: str = "camera",
+                 width: Optional[int] = None, height: Optional[int] = None,
+                 reconnect_min: float = 1.0, reconnect_max: float = 30.0,
+                 max_read_failures: int = 30, loop_files: bool = True,
+                 mode: str = CAPTURE_MODE_GRAB, infer_every_n: int = 30,
+                 display_fps: float = 15.0,
+                 display_wanted: Optional[Callable[[], bool]] = None):
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode '{mode}' (expected one of {CAPTURE_MODES})")
+
+        self.source = source
+        self.name = name
+        self.width = width
+        self.height = height
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.max_read_failures = max_read_failures
+        self.loop_files = loop_files
+        self.is_file = is_file_source(source)
+        self.mode = mode
+        self.infer_every_n = max(1, int(infer_every_n))
+        self.display_interval = 1.0 / display_fps if display_fps > 0 else 0.0
+        self.display_wanted = display_wanted or (lambda: True)
+
+        self._cond = threading.Condition()
+        self._frame = None  # PooledFrame; the reader holds one reference to it
+        self._pool = None  # Created on the first frame (resolution is known only then)
+        self._index = 0
+        self._seq = 0
+        self._infer_pending = False  # Sticky until the consumer takes the frame
+        self._last_display_decode = 0.0
+        self._running = False
+        self._finished = False
+        self._connected = False
+        self._thread = None
+        self.reconnects = 0
+        self.grabbed = 0
+        self.decoded = 0
+
+    # ------------------------------------------------------------------
+    # Consumer API
+    # ------------------------------------------------------------------
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    @property
+    def finished(self) -> bool:
+        """True once a non-looping file has ended or the reader was stopped"""
+        return self._finished
+
+    def read(self, last_seq: int = -1, timeout: float = 1.0) -> Optional[CapturedFrame]:
+        """
+        Wait for a frame newer than last_seq
+
+        Returns:
+            CapturedFrame, or None on timeout
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._seq != last_seq or not self._running,
+                timeout=timeout
+            )
+            if self._seq == last_seq or self._frame is None:
+                return None
+            infer = self._infer_pending
+            self._infer_pending = False
+            buffer = self._frame.retain()
+            return CapturedFrame(self._seq, buffer.array, self._index, infer, buffer)
+
+    def stats(self) -> dict:
+        """Decoded-vs-grabbed frame counters"""
+        grabbed = self.grabbed
+        decoded = self.decoded
+        return {
+            "mode": self.mode,
+            "grabbed": grabbed,
+            "decoded": decoded,
+            "decode_ratio": (decoded / grabbed) if grabbed else 0.0,
+            "reconnects": self.reconnects,
+            "connected": self._connected,
+            "pool": self._pool.stats() if self._pool else None
+        }
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        self._running = True
+        self._finished = False
+        self._thread = threading.Thread(target=self._run, name=f"grabber-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5.0)
+        self._thread = None
+        with self._cond:
+            if self._frame is not None:
+                self._frame.release()
+                self._frame = None
+
+    # ------------------------------------------------------------------
+    # Grabber thread
+    # ------------------------------------------------------------------
+
+    def _open(self):
+        if isinstance(self.source, int):
+            # DirectShow on Windows for better compatibility with USB webcams
+            api = cv2.CAP_DSHOW if platform.system() == "Windows" else cv2.CAP_ANY
+            cap = cv2.VideoCapture(self.source, api)
+        else:
+            cap = cv2.VideoCapture(self.source, cv2.CAP_FFMPEG)
+
+        if not cap.isOpened():
+            cap.release()
+            return None
+
+        if self.width:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height:
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def _publish(self, buffer: PooledFrame, infer):
+        with self._cond:
+            previous = self._frame
+            self._frame = buffer  # Reference acquired in _decode_into_pool passes to the reader
+            self._index = self.grabbed
+            self._seq += 1
+            self._infer_pending = self._infer_pending or infer
+            self._cond.notify_all()
+        if previous is not None:
+            previous.release()
+
+    def _decode_into_pool(self, decode) -> Optional[PooledFrame]:
+        """
+        Decode straight into a free pool buffer (no per-frame allocation)
+
+        Args:
+            decode: cap.read or cap.retrieve
+        """
+        buffer = self._pool.acquire() if self._pool else None
+        ok, frame = decode(buffer.array) if buffer else decode()
+        if not ok or frame is None:
+            if buffer:
+                buffer.release()
+            return None
+        if buffer is not None and frame is buffer.array:
+            return buffer
+
+        # First frame, or the stream changed resolution: rebuild the pool around it
+        if buffer:
+            buffer.release()
+        self._pool = ensure_pool(self._pool, frame.shape, frame.dtype, name=self.name)
+        return self._pool.adopt(frame)
+
+    def _next_frame(self, cap):
+        """
+        Advance the stream by one frame, decoding only if someone will use it
+
+        Returns:
+            (ok, buffer, infer) - buffer is None when the frame was skipped
+        """
+        if self.mode == CAPTURE_MODE_READ:
+            buffer = self._decode_into_pool(cap.read)
+            if buffer is None:
+                return False, None, False
+            self.grabbed += 1
+            self.decoded += 1
+            return True, buffer, self.grabbed % self.infer_every_n == 0
+
+        if not cap.grab():
+            return False, None, False
+        self.grabbed += 1
+
+        infer = self.grabbed % self.infer_every_n == 0
+        now = time.monotonic()
+        display = (
+            now - self._last_display_decode >= self.display_interval
+            and self.display_wanted()
+        )
+        if not infer and not display:
+            return True, None, False
+
+        buffer = self._decode_into_pool(cap.retrieve)
+        if buffer is None:
+            return True, None, False
+        self.decoded += 1
+        if display:
+            self._last_display_decode = now
+        return True, buffer, infer
+
+    def _run(self):
+        backoff = self.reconnect_min
+        label = describe_source(self.source)
+
+        while self._running:
+            cap = self._open()
+            if cap is None:
+                logger.warning(f"⚠️ {self.name}: could not open {label}, retrying in {backoff:.1f}s")
+                self._sleep(backoff)
+                backoff = min(backoff * 2, self.reconnect_max)
+                self.reconnects += 1
+                continue
+
+            logger.warning(f"✅ {self.name}: stream opened ({label})")
+            self._connected = True
+            backoff = self.reconnect_min
+            frame_interval = 0.0
+            if self.is_file:
+                fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+                frame_interval = 1.0 / fps if fps > 0 else 1.0 / 30
+
+            failures = 0
+            next_due = time.monotonic()
+            try:
+                while self._running:
+                    ok, buffer, infer = self._next_frame(cap)
+                    if not ok:
+                        if self.is_file:
+                            if not self.loop_files:
+                                logger.warning(f"🏁 {self.name}: end of file {label}")
+                                self._running = False
+                                break
+                            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                            continue
+                        failures += 1
+                        if failures >= self.max_read_failures:
+                            logger.warning(f"⚠️ {self.name}: stream dropped after {failures} failed reads")
+                            break
+                        continue
+
+                    failures = 0
+                    if buffer is not None:
+                        self._publish(buffer, infer)
+
+                    if frame_interval:
+                        next_due += frame_interval
+                        delay = next_due - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                        else:
+                            next_due = time.monotonic()
+            finally:
+                cap.release()
+                self._connected = False
+
+            if self._running:
+                self.reconnects += 1
+                logger.warning(f"🔄 {self.name}: reconnecting in {backoff:.1f}s")
+                self._sleep(backoff)
+                backoff = min(backoff * 2, self.reconnect_max)
+
+        self._finished = True
+        with self._cond:
+            self._cond.notify_all()
+
+    def _sleep(self, seconds: float):
+        """Sleep that wakes early when stop() is called"""
+        deadline = time.monotonic() + seconds
+        while self._running and time.monotonic() < deadline:
+            time.sleep(min(0.2, deadline - time.monotonic()))
@@ -0,0 +1,103 @@
+"""
+recall@1 check for the on-disk ANN (IVF) vector store
+Compares approximate search against exact search over the same embeddings
+
+Usage:
+    python check_ann_recall.py                      # enrolled students from MongoDB
+    python check_ann_recall.py --synthetic 50000    # clustered random embeddings
+    python check_ann_recall.py --index data/ann     # also check an existing index directory
+
+Queries are enrolled embeddings plus Gaussian noise (a new capture of the
+same face). Exits with status 1 if recall@1 is below --min-recall.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+from vector_store import IVFVectorStore, NumpyVectorStore, evaluate_recall
+
+
+def load_items(args):
+    if args.synthetic:
+        rng = np.random.default_rng(args.seed)
+        centers = rng.standard_normal((max(1, args.synthetic // 125), args.dim))
+        vectors = centers[rng.integers(0, centers.shape[0], args.synthetic)] * 0.6 \
+            + rng.standard_normal((args.synthetic, args.dim))
+        return [
+            (f"S{i:06d}", vectors[i].astype(np.float32), {"batch_id": f"B{i % max(1, args.synthetic // 40)}"})
+            for i in range(args.synthetic)
+        ]
+
+    from dotenv import load_dotenv
+    load_dotenv('backend/.env')
+    import db
+    students = db.get_all_students()
+    return [
+        (s["roll_number"], np.asarray(s["embedding"], dtype=np.float32), {"batch_id": s.get("batch_id", "")})
+        for s in students if s.get("roll_number") and s.get("embedding")
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check ANN recall@1 against exact search")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N synthetic embeddings instead of MongoDB")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--noise", type=float, default=0.8, help="Query noise relative to unit-variance embeddings")
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--index", help="Existing ANN index directory to check as well")
+    parser.add_argument("--min-recall", type=float, default=0.98)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("🚀 ANN recall@1 check")
+    print("=" * 60)
+    items = load_items(args)
+    if not items:
+        print("❌ No embeddings to check")
+        return 1
+    dim = items[0][1].shape[0]
+    print(f"✅ {len(items)} embeddings (dim {dim})")
+
+    exact = NumpyVectorStore(dim)
+    exact.upsert(items)
+
+    stores = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        fresh = IVFVectorStore(dim, os.path.join(tmp, "ann"), nprobe=args.nprobe)
+        start = time.time()
+        fresh.build(items)
+        print(f"✅ Built IVF index in {time.time() - start:.1f}s: {fresh.stats()['nlist']} lists")
+        stores["fresh build"] = fresh
+        if args.index:
+            stores[args.index] = IVFVectorStore(dim, args.index, nprobe=args.nprobe)
+
+        rng = np.random.default_rng(args.seed + 1)
+        picks = rng.integers(0, len(items), min(args.queries, len(items)))
+        vectors = np.vstack([items[i][1] for i in picks])
+        scale = np.linalg.norm(vectors, axis=1, keepdims=True) / np.sqrt(dim)
+        queries = vectors + args.noise * scale * rng.standard_normal(vectors.shape).astype(np.float32)
+        batch_id = items[picks[0]][2]["batch_id"]
+
+        failed = False
+        for name, store in stores.items():
+            overall = evaluate_recall(store, exact, queries)
+            in_batch = evaluate_recall(store, exact, queries[:100], filter={"batch_id": {"$eq": batch_id}})
+            print(f"\n📍 {name} (nprobe={args.nprobe})")
+            print(f"   recall@1:          {overall['recall_at_1']:.4f} over {overall['queries']} queries")
+            print(f"   recall@1 (batch):  {in_batch['recall_at_1']:.4f}")
+            print(f"   ANN / exact:       {overall['approximate_ms']:.3f} ms / {overall['exact_ms']:.3f} ms per query (batched)")
+            failed |= overall["recall_at_1"] < args.min_recall
+
+    print("\n" + "=" * 60)
+    print("❌ Recall below threshold" if failed else f"✅ Recall >= {args.min_recall}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
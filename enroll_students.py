@@ -39,7 +39,7 @@ def main():
     # 1. Fetch students from MongoDB
     print("\n📍 Step 1: Fetch students from MongoDB...")
     try:
-        response = requests.get(f"{BACKEND_API}/students")
+        response = requests.get(f"{BACKEND_API}/students", params={"fields": "all"})
         if response.status_code != 200:
             print(f"❌ Failed to fetch students: {response.status_code}")
             return
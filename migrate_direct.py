@@ -6,11 +6,15 @@ Direct MongoDB → Pinecone migration (SERVERLESS – WORKING VERSION)
 """
 
 import os
+import sys
 import time
 from pymongo import MongoClient
 from dotenv import load_dotenv
 from pinecone import Pinecone
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+from embedding_codec import to_list
+
 # ============================================================
 # LOAD ENV
 # ============================================================
@@ -81,9 +85,10 @@ def main():
         student_id = str(student.get("_id"))
         roll_number = student.get("roll_number", "")
         name = student.get("name", "Unknown")
-        embedding = student.get("embedding")
+        # Binary float32 (tagged) or a legacy list of doubles
+        embedding = to_list(student.get("embedding"))
 
-        if not embedding or not isinstance(embedding, list):
+        if not embedding:
             print(f"⚠️  Skipped {name}: no embedding")
             skipped += 1
             continue
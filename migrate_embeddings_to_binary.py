@@ -0,0 +1,49 @@
+"""
+Convert stored student embeddings to compact binary float32
+Run this once after upgrading; documents already converted are skipped
+
+Each list-of-doubles embedding (about 6.5 KB of BSON for 512 dimensions)
+becomes BSON binary float32 (2 KB) tagged with embedding_format
+"float32le-v1". The backend reads both forms, so the migration can run
+while it is serving.
+
+Usage:
+    python migrate_embeddings_to_binary.py [--dry-run] [--batch-size 500]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+from dotenv import load_dotenv
+
+load_dotenv('backend/.env')
+import db
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert student embeddings to binary float32")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    print("🚀 Converting embeddings: BSON double arrays → binary float32")
+    print("=" * 60)
+    try:
+        stats = db.migrate_embeddings_to_binary(batch_size=args.batch_size, dry_run=args.dry_run)
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        return 1
+
+    print(f"   {'Would convert' if args.dry_run else 'Converted'}: {stats['converted']}")
+    print(f"   Already binary: {stats['already_binary']}")
+    if stats["converted"]:
+        before, after = stats["bytes_before"], stats["bytes_after"]
+        print(f"   Embedding bytes: {before / 1024:.0f} KB → {after / 1024:.0f} KB ({after / before:.0%})")
+    print("=" * 60)
+    print("✅ DRY RUN COMPLETE" if args.dry_run else "✅ MIGRATION COMPLETE")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,10 +3,14 @@ Migrate student embeddings from MongoDB to Pinecone
 Run this once to populate Pinecone index with existing students
 """
 import os
+import sys
 import requests
-import pinecone
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+from vector_store import create_vector_store
+from face_templates import student_templates, template_ids, template_items
+
 # Load environment variables
 load_dotenv('backend/.env')
 
@@ -23,16 +27,13 @@ def main():
     # 1. Initialize Pinecone
     print("\n📍 Step 1: Initialize Pinecone...")
     try:
-        pinecone.init(
+        # Same store + namespace the backend and camera service use
+        store = create_vector_store(
+            "pinecone",
             api_key=PINECONE_API_KEY,
+            index_name=PINECONE_INDEX_NAME,
             environment=PINECONE_ENVIRONMENT
         )
-        
-        # For serverless indexes, skip stats check initially
-        print(f"✅ Pinecone initialized")
-        
-        # Connect to index (will fail if index doesn't exist)
-        index = pinecone.Index(PINECONE_INDEX_NAME)
         print(f"✅ Connected to index: {PINECONE_INDEX_NAME}")
     except Exception as e:
         print(f"❌ Failed to connect to Pinecone: {e}")
@@ -45,7 +46,7 @@ def main():
     # 3. Fetch students from MongoDB via backend API
     print("\n📍 Step 2: Fetch students from MongoDB...")
     try:
-        response = requests.get(f"{MONGODB_API}/students")
+        response = requests.get(f"{MONGODB_API}/students", params={"fields": "all"})
         if response.status_code != 200:
             print(f"❌ Failed to fetch students: {response.status_code}")
             return
@@ -65,31 +66,24 @@ def main():
     for student in students:
         roll_number = student.get("roll_number")
         name = student.get("name")
-        embedding = student.get("embedding")
+        labels, templates = student_templates(student)
         
-        if not embedding:
+        if templates is None:
             print(f"⚠️  Skipping {name} ({roll_number}): No embedding")
             skip_count += 1
             continue
         
         try:
-            # Upsert to Pinecone
-            index.upsert(
-                vectors=[
-                    {
-                        "id": roll_number,
-                        "values": embedding,
-                        "metadata": {
-                            "roll_number": roll_number,
-                            "name": name,
-                            "batch_id": student.get("batch_id", ""),
-                            "branch": student.get("branch", "")
-                        }
-                    }
-                ],
-                namespace="face-recognition"
-            )
-            print(f"✅ Pushed: {name} ({roll_number})")
+            # One upsert with every face template of the student
+            items = template_items(roll_number, labels, templates, {
+                "name": name,
+                "batch_id": student.get("batch_id", ""),
+                "branch": student.get("branch", "")
+            })
+            store.upsert(items)
+            pushed = {vector_id for vector_id, _, _ in items}
+            store.delete([vector_id for vector_id in template_ids(roll_number) if vector_id not in pushed])
+            print(f"✅ Pushed: {name} ({roll_number}) - {len(items)} template(s)")
             success_count += 1
         except Exception as e:
             print(f"❌ Failed to push {name} ({roll_number}): {e}")